@@ -0,0 +1,289 @@
+# !/usr/bin/env python
+# title           : BambooAgents.py
+# description     : In memory inverted index from agent capabilities to the agents having them, so job
+#                   requirements are matched against all agents locally instead of with one ACLI call per agent.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : index = BambooCapabilityIndex(bamboo); index.refresh(); index.capable_agents(requirements)
+# notes           : agent sets are python ints used as bitsets, bit n standing for the agent in slot n.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import concurrent.futures
+import functools
+import re
+import threading
+
+from .BambooCLI import BambooException
+from .BambooParser import CapabilityRecord, FULL_LIST_LIMIT, check_full_list, first_value, parse_list_output, \
+    read_all_records
+
+REQUIREMENT_EXISTS = 'exists'
+REQUIREMENT_EQUAL = 'equal'
+REQUIREMENT_REGEX = 'regex'
+# requirement types the index does not know, like ones of newer Bamboo versions, they do not narrow down the agents
+REQUIREMENT_UNKNOWN = 'unknown'
+
+# spellings of the requirement types used by add_requirement and the getRequirementList output
+REQUIREMENT_TYPES = {'exists': REQUIREMENT_EXISTS, 'exist': REQUIREMENT_EXISTS,
+                     'equal': REQUIREMENT_EQUAL, 'equals': REQUIREMENT_EQUAL, 'eq': REQUIREMENT_EQUAL,
+                     'regex': REQUIREMENT_REGEX, 'match': REQUIREMENT_REGEX, 'matches': REQUIREMENT_REGEX}
+
+
+def requirement_type(req_type):
+    """Normalizes a requirement type like EXISTS, equals or matches, a missing type means exists and a type which
+    is not known REQUIREMENT_UNKNOWN"""
+    if not req_type:
+        return REQUIREMENT_EXISTS
+    return REQUIREMENT_TYPES.get(str(req_type).strip().lower(), REQUIREMENT_UNKNOWN)
+
+
+def _requirement_fields(requirement):
+    # requirements come as add_requirement arguments, fetch_plan_state dicts or (key, type, value) tuples
+    if isinstance(requirement, dict):
+        return (requirement.get('requirement', requirement.get('key')),
+                requirement.get('req_type', requirement.get('type')), requirement.get('value'))
+    return (tuple(requirement) + (None, None))[:3]
+
+
+def _requirement(requirement):
+    key, req_type, value = _requirement_fields(requirement)
+    return key, requirement_type(req_type), value
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern):
+    return re.compile(pattern)
+
+
+def iter_bits(agents):
+    """Yields the slot numbers of the agents in a bitset"""
+    while agents:
+        low_bit = agents & -agents
+        yield low_bit.bit_length() - 1
+        agents ^= low_bit
+
+
+class BambooCapabilityIndex(object):
+    """
+    Index of the capabilities of all agents. Every agent gets a slot, and each capability key and each key/value
+    pair maps to the bitset of the slots of the agents having it. A requirement then costs one dict lookup, or
+    one regex match per distinct value of its key, and the requirements of a job are combined with a bitwise and.
+    refresh reads the agent list and the capabilities of the agents concurrently, later refreshes only read the
+    agents which are new or asked for.
+    Arguments:
+        actions: BambooActions instance used for sending the actions.
+        max_workers: number of run actions reading capabilities at the same time. (Optional)
+        chunk_size: number of agents whose capabilities are read with one run action. (Optional)
+    Examples:
+        index = BambooCapabilityIndex(bamboo, max_workers=16)
+        index.refresh()
+        index.capable_agents([{"requirement": "system.jdk.JDK 11"},
+                              {"requirement": "os", "req_type": "equal", "value": "linux"}])
+        index.unmatched_jobs(BambooSnapshot("topology.jsonl").load(plan) for plan in plans)
+    """
+    def __init__(self, actions, max_workers=8, chunk_size=25):
+        self.actions = actions
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.slots = dict()
+        self.names = list()
+        self.agents = dict()
+        self.capabilities = dict()
+        self.keys = dict()
+        self.values = dict()
+        self.known = 0
+        self.enabled = 0
+        self.regex_matches = dict()
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            # slots of removed agents are reused, so the bitsets stay as short as the agent list
+            slot = self.names.index(None) if None in self.names else len(self.names)
+            if slot == len(self.names):
+                self.names.append(name)
+            else:
+                self.names[slot] = name
+            self.slots[name] = slot
+            self.known |= 1 << slot
+        return slot
+
+    def _unindex(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            return
+        self.regex_matches.clear()
+        mask = ~(1 << slot)
+        for key, value in self.capabilities.pop(name, dict()).items():
+            self.keys[key] &= mask
+            if not self.keys[key]:
+                del self.keys[key]
+            values = self.values[key]
+            values[value] &= mask
+            if not values[value]:
+                del values[value]
+                if not values:
+                    del self.values[key]
+        self.enabled &= mask
+
+    def _remove(self, name):
+        self._unindex(name)
+        slot = self.slots.pop(name, None)
+        if slot is not None:
+            self.names[slot] = None
+            self.known &= ~(1 << slot)
+        self.agents.pop(name, None)
+
+    def set_capabilities(self, name, capabilities, enabled=True):
+        """Replaces the capabilities of an agent, a dict of capability key to value, in the index"""
+        with self.lock:
+            self._unindex(name)
+            self.regex_matches.clear()
+            bit = 1 << self._slot(name)
+            self.capabilities[name] = dict(capabilities)
+            for key, value in self.capabilities[name].items():
+                self.keys[key] = self.keys.get(key, 0) | bit
+                values = self.values.setdefault(key, dict())
+                values[value] = values.get(value, 0) | bit
+            if enabled:
+                self.enabled |= bit
+
+    def _read_chunk(self, names):
+        with self.actions.batch(max_size=len(names), continues=True):
+            results = [(name, self.actions.send_command(self.actions.get_agent_capability, agent_name=name,
+                                                        output_type='csv', limit=FULL_LIST_LIMIT + 1))
+                       for name in names]
+        capabilities, errors = dict(), dict()
+        for name, batch_result in results:
+            try:
+                records = check_full_list(list(parse_list_output(batch_result.result().splitlines(),
+                                                                 CapabilityRecord)), 'get_agent_capability')
+            except BambooException as capability_exception:
+                errors[name] = capability_exception
+                continue
+            capabilities[name] = dict((first_value(record, 'key', 'capability'), first_value(record, 'value'))
+                                      for record in records if first_value(record, 'key', 'capability') is not None)
+        return capabilities, errors
+
+    def _read_capabilities(self, names):
+        capabilities, errors = dict(), dict()
+        chunks = [names[start:start + self.chunk_size] for start in range(0, len(names), self.chunk_size)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = dict((executor.submit(self._read_chunk, chunk), chunk) for chunk in chunks)
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                if error is not None:
+                    errors.update((name, error) for name in futures[future])
+                    continue
+                chunk_capabilities, chunk_errors = future.result()
+                capabilities.update(chunk_capabilities)
+                errors.update(chunk_errors)
+        return capabilities, errors
+
+    def refresh(self, agent_names=None, full=False):
+        """
+        Reads the agent list, drops the agents which are gone and reads the capabilities of the new agents, of the
+        given agent_names, or of all agents when full is set. Returns a dict of agent name to the exception its
+        capabilities could not be read with.
+        """
+        agents = dict()
+        for record in read_all_records(self.actions, self.actions.get_agent_info):
+            name = first_value(record, 'name', 'agent')
+            if name is not None:
+                agents[name] = record
+        with self.lock:
+            for name in [name for name in self.slots if name not in agents]:
+                self._remove(name)
+            stale = [name for name in agents
+                     if full or name not in self.capabilities or (agent_names and name in agent_names)]
+            for name, record in agents.items():
+                self.agents[name] = record
+                # an agent without an enabled column counts as enabled
+                if name in self.slots and getattr(record, 'enabled', True) is not False:
+                    self.enabled |= 1 << self.slots[name]
+                elif name in self.slots:
+                    self.enabled &= ~(1 << self.slots[name])
+        capabilities, errors = self._read_capabilities(stale)
+        for name, agent_capabilities in capabilities.items():
+            self.set_capabilities(name, agent_capabilities,
+                                  enabled=getattr(agents[name], 'enabled', True) is not False)
+        return errors
+
+    def matching(self, requirement):
+        """Returns the bitset of the agents satisfying one requirement, all agents for a requirement of an unknown
+        type"""
+        key, req_type, value = _requirement(requirement)
+        with self.lock:
+            if req_type == REQUIREMENT_EXISTS:
+                return self.keys.get(key, 0)
+            if req_type == REQUIREMENT_UNKNOWN:
+                return self.known
+            values = self.values.get(key, dict())
+            if req_type == REQUIREMENT_EQUAL:
+                return values.get(None if value is None else str(value), 0)
+            agents = self.regex_matches.get((key, value))
+            if agents is None:
+                pattern = _compile(str(value))
+                agents = 0
+                for agent_value, value_agents in values.items():
+                    if agent_value is not None and pattern.fullmatch(agent_value):
+                        agents |= value_agents
+                self.regex_matches[(key, value)] = agents
+            return agents
+
+    def capable(self, requirements, include_disabled=False):
+        """Returns the bitset of the agents satisfying all the requirements"""
+        with self.lock:
+            agents = self.known if include_disabled else self.enabled
+            for requirement in requirements:
+                agents &= self.matching(requirement)
+                if not agents:
+                    break
+            return agents
+
+    def agent_names(self, agents):
+        """Returns the names of the agents in a bitset"""
+        with self.lock:
+            return [self.names[slot] for slot in iter_bits(agents)]
+
+    def capable_agents(self, requirements, include_disabled=False):
+        """
+        Returns the names of the enabled agents satisfying all the requirements of a job.
+        Arguments:
+            requirements: add_requirement argument dicts, getRequirementList dicts or (key, type, value) tuples.
+            include_disabled: also return disabled agents. (Optional)
+        """
+        return self.agent_names(self.capable(requirements, include_disabled=include_disabled))
+
+    def unmatched_jobs(self, plan_states, include_disabled=False, unknown=None):
+        """
+        Returns the (plan, job) pairs no agent can run, out of plan states as fetch_plan_state returns them or as
+        loaded from a BambooSnapshot. Requirements of an unknown type can not be checked, they are skipped.
+        Arguments:
+            plan_states: iterable of plan state dicts. (Mandatory)
+            include_disabled: also count disabled agents as able to run a job. (Optional)
+            unknown: list the (plan, job, requirement, type) tuples of the skipped requirements are appended
+                     to. (Optional)
+        Examples:
+            unknown = list()
+            unmatched = index.unmatched_jobs(states, unknown=unknown)
+        """
+        unmatched = list()
+        for state in plan_states:
+            for job, job_state in sorted(state.get('jobs', dict()).items()):
+                requirements = job_state.get('requirements', list())
+                if unknown is not None:
+                    for requirement in requirements:
+                        key, req_type, _ = _requirement_fields(requirement)
+                        if requirement_type(req_type) == REQUIREMENT_UNKNOWN:
+                            unknown.append((state['plan'], job, key, req_type))
+                if not self.capable(requirements, include_disabled=include_disabled):
+                    unmatched.append((state['plan'], job))
+        return unmatched
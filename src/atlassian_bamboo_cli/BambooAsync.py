@@ -0,0 +1,131 @@
+# !/usr/bin/env python
+# title           : BambooAsync.py
+# description     : asyncio counterpart of BambooActions. Every action is an awaitable which starts acli with
+#                   asyncio.create_subprocess_exec, so one event loop can keep many ACLI calls in flight.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : instantiate AsyncBambooActions and await its actions, e.g. await bamboo.get_plan_list()
+# notes           : the commands are rendered by BambooActions and run without a shell.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import asyncio
+import os
+import signal
+import subprocess
+
+from .BambooCLI import ACTION_NAMES, BambooActions, BambooException, KILL_GRACE_PERIOD, process_group_options
+
+
+class AsyncBambooActions(object):
+    """
+    Awaitable versions of all the BambooActions actions. An action renders its command with BambooActions, runs
+    acli and returns the reply. At most concurrency acli processes run at the same time, a cancelled action
+    kills the process group of its acli process before the cancellation is passed on, so asyncio.wait_for gives
+    an action a deadline.
+    Arguments:
+        bamboo_project_name: Name of the bamboo project where you want to create your plans.
+        acli_directory_path: Path to the ACLI directory (after unzipping)
+        acli_bamboo_server_name: Name of the bamboo server mentioned in the 'ACLI.properties'
+            file within the ACLI directory
+        concurrency: maximum number of acli processes running at the same time. (Optional)
+    Examples:
+        bamboo = AsyncBambooActions('project_name', '/opt/acli', 'realbamboo', concurrency=16)
+        plans = await bamboo.get_plan_list()
+        replies = await asyncio.gather(*[bamboo.get_build_list(plan_name=plan) for plan in plan_names])
+    """
+    def __init__(self, bamboo_project_name, acli_directory_path, acli_bamboo_server_name, concurrency=8):
+        self.actions = BambooActions(bamboo_project_name, acli_directory_path, acli_bamboo_server_name,
+                                     use_shell=False)
+        self.concurrency = concurrency
+        self.processes = set()
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # created on first use so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def send_command(self, function_name, **kwargs):
+        """
+        Renders the action with the given arguments and sends it to the bamboo server.
+        Examples:
+            await send_command(bamboo.actions.get_plan_list, project_name="@all")
+        """
+        if not os.path.exists(self.actions.acli_directory_path):
+            raise BambooException(FileNotFoundError("{0} folder does not exist!".format(
+                self.actions.acli_directory_path)))
+        try:
+            command = function_name(**kwargs)
+        except Exception as render_exception:
+            raise BambooException(render_exception)
+        async with self.semaphore:
+            return await self.execute_command(command)
+
+    async def execute_command(self, command):
+        """Runs an action command through acli and returns the reply"""
+        argv = self.actions.render_argv(command)
+        try:
+            process = await asyncio.create_subprocess_exec(*argv, stdout=subprocess.PIPE,
+                                                           cwd=self.actions.acli_directory_path,
+                                                           env=self.actions.acli_environment,
+                                                           **process_group_options())
+        except OSError as start_exception:
+            raise BambooException(start_exception)
+        self.processes.add(process)
+        try:
+            reply, _ = await process.communicate()
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+        finally:
+            self.processes.discard(process)
+        if process.returncode != 0:
+            raise BambooException(subprocess.CalledProcessError(process.returncode, argv, output=reply))
+        return reply
+
+    @staticmethod
+    async def _kill(process, grace=KILL_GRACE_PERIOD):
+        # the acli script and the JVM it started share the process group, which is stopped like
+        # kill_process_group does: SIGTERM first so acli can clean up, SIGKILL for what is left after grace seconds
+        if os.name != 'posix':
+            killer = await asyncio.create_subprocess_exec('taskkill', '/F', '/T', '/PID', str(process.pid),
+                                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            await killer.wait()
+            await process.wait()
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            await process.wait()
+            return
+        try:
+            await asyncio.wait_for(process.wait(), grace)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+    async def close(self):
+        """Kills all acli processes which are still running"""
+        await asyncio.gather(*[self._kill(process) for process in list(self.processes)])
+
+
+def _async_action(name):
+    async def action(self, **kwargs):
+        return await self.send_command(getattr(self.actions, name), **kwargs)
+    action.__name__ = name
+    action.__qualname__ = str.format('AsyncBambooActions.{0}', name)
+    action.__doc__ = getattr(BambooActions, name).__doc__
+    return action
+
+
+for _action_name in ACTION_NAMES:
+    setattr(AsyncBambooActions, _action_name, _async_action(_action_name))
@@ -0,0 +1,360 @@
+# !/usr/bin/env python
+# title           : BambooBenchmark.py
+# description     : Benchmarks of the command rendering, the task key lookup, the acli execution against a stub
+#                   acli, the output parsing and the end to end throughput against the emulated acli. No bamboo
+#                   server or ACLI installation is needed. Results are written as json and two runs compared.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : python -m atlassian_bamboo_cli.BambooBenchmark --repeat 200 --output release.json
+#                   python -m atlassian_bamboo_cli.BambooBenchmark --compare previous.json release.json
+# notes           : the stub acli is a shell script, so the benchmarks need a POSIX platform. Timings are the
+#                   best of BENCHMARK_ROUNDS rounds, so a busy machine shows less in the comparison.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import argparse
+import csv
+import datetime
+import inspect
+import io
+import json
+import os
+import platform
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .BambooCLI import ACTION_NAMES, BambooActions, BambooTasks, BambooTimeoutError
+from .BambooEmulator import BambooEmulator, write_emulator_acli
+from .BambooLog import parse_log_line
+from .BambooParser import DEFAULT_DATE_FORMAT, BuildRecord, format_timestamp, parse_list_output
+
+# version of the json result file
+RESULT_VERSION = 1
+# number of rounds a timing is taken in, the best round counts
+BENCHMARK_ROUNDS = 3
+# relative change of a metric reported as a regression by compare_results
+DEFAULT_THRESHOLD = 0.1
+# units of the metrics, seconds are better lower and rates better higher
+SECONDS = 's'
+PER_SECOND = '1/s'
+
+
+def write_stub_acli(directory, body='exit 0'):
+    """Writes an executable acli shell script into the directory and returns its path"""
+    path = os.path.join(directory, 'acli')
+    with open(path, 'w') as stub_file:
+        stub_file.write(str.format('#!/bin/sh\n{0}\n', body))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def time_calls(function, repeat):
+    """Calls the function repeat times and returns the mean seconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def best_time(function, repeat, rounds=BENCHMARK_ROUNDS):
+    """Returns the mean seconds per call of the fastest of the rounds of repeat calls"""
+    return min(time_calls(function, repeat) for _ in range(rounds))
+
+
+def sample_arguments(actions, action_name):
+    """
+    Returns arguments for every parameter of an action method, so the rendering goes through all of its
+    optional arguments: flags are set, lists get two entries and the other parameters a plan key.
+    """
+    kwargs = dict()
+    for parameter in inspect.signature(getattr(actions, action_name)).parameters.values():
+        if parameter.name == 'task_key':
+            kwargs[parameter.name] = 'SCRIPT'
+        elif parameter.name == 'inputs':
+            kwargs[parameter.name] = ['--action getPlan --plan "BENCH-PLAN"', '--action getJob --plan @plan@ --job J1']
+        elif parameter.name == 'field':
+            kwargs[parameter.name] = ['state=FAILED', 'reason=manual']
+        elif parameter.default is False:
+            kwargs[parameter.name] = True
+        else:
+            kwargs[parameter.name] = 'BENCH-PLAN'
+    return kwargs
+
+
+def benchmark_rendering(repeat):
+    """
+    Measures the rendering of every action of ACTION_NAMES with all its arguments, which ends in
+    add_optional_arguments, and add_optional_arguments on its own. Returns a dict of action name to the
+    seconds per rendered command.
+    """
+    bamboo = BambooActions('BENCH', os.curdir, 'benchbamboo', use_shell=False)
+    results = dict()
+    for action_name in ACTION_NAMES:
+        function, kwargs = getattr(bamboo, action_name), sample_arguments(bamboo, action_name)
+        results[action_name] = best_time(lambda: function(**kwargs), repeat)
+    kwargs = dict(plan='"BENCH-PLAN"', limit=100, columns='build,state,completed', field=['a=b', 'c=d'],
+                  continues=True, date_format=DEFAULT_DATE_FORMAT)
+    results['add_optional_arguments'] = best_time(
+        lambda: bamboo.add_optional_arguments('--action getBuildList', **kwargs), repeat)
+    return results
+
+
+def benchmark_task_key(repeat):
+    """
+    Measures BambooTasks.get_task_key for the first and the last task key, in lower case, and for an unknown
+    one. Returns a dict with the seconds per lookup of each.
+    """
+    tasks = BambooTasks()
+    keys = list(tasks.task_dict)
+
+    def missing():
+        try:
+            tasks.get_task_key('NO_SUCH_TASK')
+        except KeyError:
+            pass
+
+    return dict(first=best_time(lambda: tasks.get_task_key(keys[0].lower()), repeat),
+                last=best_time(lambda: tasks.get_task_key(keys[-1].lower()), repeat),
+                missing=best_time(missing, repeat))
+
+
+def benchmark_spawn(directory, repeat):
+    """
+    Measures the per call overhead of send_command through the shell against the direct argument list
+    execution, and against starting the stub without send_command. Returns a dict with the mean seconds per
+    call of the modes.
+    """
+    results = dict()
+    for mode, use_shell in (('shell', True), ('argv', False)):
+        bamboo = BambooActions('BENCH', directory, 'benchbamboo', use_shell=use_shell)
+        results[mode] = time_calls(lambda: bamboo.send_command(bamboo.get_plan, plan_name='BENCH-PLAN'), repeat)
+    argv = bamboo.render_argv(bamboo.get_plan(plan_name='BENCH-PLAN'))
+    results['direct'] = time_calls(lambda: subprocess.check_output(argv, cwd=directory), repeat)
+    return results
+
+
+def benchmark_deadline(directory, repeat):
+    """
+    Measures the per call overhead of watching acli under a deadline, and under a deadline with a cancel event
+    which is polled, against the unwatched execution. Returns a dict with the mean seconds per call of each mode.
+    """
+    bamboo = BambooActions('BENCH', directory, 'benchbamboo', use_shell=False)
+
+    def send(**deadline):
+        if not deadline:
+            return bamboo.send_command(bamboo.get_plan, plan_name='BENCH-PLAN')
+        with bamboo.deadline(**deadline):
+            return bamboo.send_command(bamboo.get_plan, plan_name='BENCH-PLAN')
+
+    return dict(unwatched=time_calls(send, repeat),
+                deadline=time_calls(lambda: send(timeout=60), repeat),
+                cancel=time_calls(lambda: send(timeout=60, cancel=threading.Event()), repeat))
+
+
+def benchmark_kill(directory, timeout=0.2):
+    """
+    Measures how long after its deadline a hung acli, which started a child process, is stopped and the
+    BambooTimeoutError is raised. Returns the seconds past the deadline.
+    """
+    bamboo = BambooActions('BENCH', directory, 'benchbamboo', use_shell=False)
+    start = time.perf_counter()
+    try:
+        with bamboo.deadline(timeout):
+            bamboo.send_command(bamboo.get_plan, plan_name='BENCH-PLAN')
+    except BambooTimeoutError:
+        pass
+    return time.perf_counter() - start - timeout
+
+
+def build_list_payload(rows):
+    """Returns a getBuildList csv reply of rows builds, with the columns and date format iter_builds reads"""
+    output = io.StringIO()
+    output.write(str.format('{0} builds in list\n', rows))
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow(['Build', 'Number', 'State', 'Started', 'Completed', 'Duration', 'Agent'])
+    start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    for number in range(rows, 0, -1):
+        started = start + datetime.timedelta(minutes=number)
+        writer.writerow([str.format('BENCH-PLAN-{0}', number), number, 'Failed' if number % 7 == 0 else 'Successful',
+                         format_timestamp(started), format_timestamp(started + datetime.timedelta(seconds=42)), 42,
+                         str.format('agent-{0}', number % 16)])
+    return output.getvalue().encode('utf-8')
+
+
+def build_log_payload(lines):
+    """Returns a getBuildLog reply of lines log entries"""
+    entries = [str.format('simple\t18-Oct-2026 10:{0:02d}:{1:02d}\t[JOB1] step {2}: compiling sources of module {3}',
+                          (index // 60) % 60, index % 60, index, index % 97) for index in range(lines)]
+    return ('\n'.join(entries) + '\n').encode('utf-8')
+
+
+def benchmark_parsing(rows):
+    """
+    Measures the parsing of a getBuildList reply of rows builds into BuildRecord, like iter_builds does, and of
+    a getBuildLog reply of ten times as many lines with parse_log_line. Returns a dict with the rows and lines
+    parsed per second.
+    """
+    build_list, build_log = build_list_payload(rows), build_log_payload(rows * 10)
+
+    def parse_build_list():
+        for _ in parse_list_output(build_list.splitlines(), BuildRecord, date_format=DEFAULT_DATE_FORMAT):
+            pass
+
+    def parse_build_log():
+        for line in build_log.splitlines():
+            parse_log_line(line)
+
+    return dict(build_list=rows / best_time(parse_build_list, 1), build_log=rows * 10 / best_time(parse_build_log, 1))
+
+
+def benchmark_throughput(directory, count, max_workers=8, max_size=50):
+    """
+    Measures the end to end actions per second of getPlan actions sent one after the other, on max_workers
+    threads with map, and as run actions of max_size actions. The actions run through the emulated acli of
+    write_emulator_acli, every acli process is a python process of the emulator. Returns a dict with the
+    actions per second of each mode.
+    """
+    write_emulator_acli(directory, os.path.join(directory, 'bamboo.db'))
+    BambooEmulator(os.path.join(directory, 'bamboo.db')).populate(plans=count, builds=1, agents=1, prefix='BENCH')
+    bamboo = BambooActions('BENCH0', directory, 'emulator', use_shell=False)
+    arguments = [dict(plan_name=str.format('BENCH0-P{0}', index)) for index in range(count)]
+
+    def serial():
+        for kwargs in arguments:
+            bamboo.send_command(bamboo.get_plan, **kwargs)
+
+    def threaded():
+        for map_result in bamboo.map(bamboo.get_plan, arguments, max_workers=max_workers):
+            if map_result.error is not None:
+                raise map_result.error
+
+    def batched():
+        with bamboo.batch(max_size=max_size):
+            results = [bamboo.send_command(bamboo.get_plan, **kwargs) for kwargs in arguments]
+        for batch_result in results:
+            batch_result.result()
+
+    return dict(serial=count / time_calls(serial, 1), threaded=count / time_calls(threaded, 1),
+                batched=count / time_calls(batched, 1))
+
+
+def run_benchmarks(repeat=100, rows=20000, count=40, max_workers=8, max_size=50):
+    """
+    Runs all benchmarks and returns the result dict written as json: the version, the environment and the
+    metrics, each a dict with its value and unit.
+    """
+    metrics = dict()
+
+    def record(prefix, values, unit):
+        for name, value in values.items():
+            metrics[str.format('{0}.{1}', prefix, name)] = dict(value=value, unit=unit)
+
+    record('render', benchmark_rendering(repeat * 10), SECONDS)
+    record('task_key', benchmark_task_key(repeat * 10), SECONDS)
+    with tempfile.TemporaryDirectory() as directory:
+        write_stub_acli(directory)
+        spawn = benchmark_spawn(directory, repeat)
+        deadline = benchmark_deadline(directory, repeat)
+    record('send_command', spawn, SECONDS)
+    record('overhead', dict(shell=spawn['shell'] - spawn['argv'], send_command=spawn['argv'] - spawn['direct'],
+                            deadline=deadline['deadline'] - deadline['unwatched'],
+                            cancel=deadline['cancel'] - deadline['unwatched']), SECONDS)
+    with tempfile.TemporaryDirectory() as directory:
+        write_stub_acli(directory, body='sleep 30 &\nwait')
+        record('kill', dict(after_deadline=benchmark_kill(directory)), SECONDS)
+    record('parse', benchmark_parsing(rows), PER_SECOND)
+    with tempfile.TemporaryDirectory() as directory:
+        record('throughput', benchmark_throughput(directory, count, max_workers=max_workers, max_size=max_size),
+               PER_SECOND)
+    return dict(version=RESULT_VERSION, time=time.time(), python=platform.python_version(),
+                platform=platform.platform(), cpus=os.cpu_count(),
+                arguments=dict(repeat=repeat, rows=rows, count=count, max_workers=max_workers, max_size=max_size),
+                metrics=metrics)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares the metrics of two result dicts of run_benchmarks. Returns a list of (name, baseline value,
+    current value, relative change, regressed) for the metrics of both, where the change is positive when the
+    metric got worse and regressed is True when it got worse by more than threshold.
+    Examples:
+        regressions = [row for row in compare_results(previous, current, threshold=0.2) if row[4]]
+    """
+    rows = list()
+    for name, metric in sorted(current['metrics'].items()):
+        previous = baseline['metrics'].get(name)
+        if previous is None or not previous['value']:
+            continue
+        change = (metric['value'] - previous['value']) / abs(previous['value'])
+        if metric['unit'] == PER_SECOND:
+            change = -change
+        rows.append((name, previous['value'], metric['value'], change, change > threshold))
+    return rows
+
+
+def format_metric(value, unit):
+    if unit == SECONDS:
+        return str.format('{0:12.4f} ms', value * 1000)
+    return str.format('{0:12.1f} /s', value)
+
+
+def print_results(results):
+    for name, metric in sorted(results['metrics'].items()):
+        print(str.format('{0:<40} {1}', name, format_metric(metric['value'], metric['unit'])))
+
+
+def print_comparison(baseline, current, threshold):
+    """Prints the comparison of two results and returns the number of regressions"""
+    regressions = 0
+    for name, previous, value, change, regressed in compare_results(baseline, current, threshold):
+        unit = current['metrics'][name]['unit']
+        print(str.format('{0:<40} {1} {2} {3:+8.1%}{4}', name, format_metric(previous, unit),
+                         format_metric(value, unit), change, '  REGRESSION' if regressed else ''))
+        regressions += regressed
+    return regressions
+
+
+def _load_results(path):
+    with open(path, 'r', encoding='utf-8') as result_file:
+        return json.load(result_file)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the BambooActions command execution.')
+    parser.add_argument('--repeat', type=int, default=100, help='number of calls per measurement')
+    parser.add_argument('--rows', type=int, default=20000, help='number of builds of the parsed build list')
+    parser.add_argument('--count', type=int, default=40, help='number of actions of the throughput benchmarks')
+    parser.add_argument('--workers', type=int, default=8, help='number of threads of the threaded throughput')
+    parser.add_argument('--max-size', type=int, default=50, help='number of actions per run action when batched')
+    parser.add_argument('--output', help='json file the results are written to')
+    parser.add_argument('--compare', nargs='+', metavar='RESULT',
+                        help='baseline json file, and the json file compared with it instead of a new run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative change of a metric reported as a regression')
+    options = parser.parse_args(args)
+
+    if options.compare and len(options.compare) > 2:
+        parser.error('--compare takes a baseline and at most one result')
+    if options.compare and len(options.compare) == 2:
+        results = _load_results(options.compare[1])
+    else:
+        results = run_benchmarks(options.repeat, options.rows, options.count, options.workers, options.max_size)
+        print_results(results)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as result_file:
+            json.dump(results, result_file, indent=2, sort_keys=True)
+    if options.compare:
+        regressions = print_comparison(_load_results(options.compare[0]), results, options.threshold)
+        print(str.format('{0} regressions over {1:.0%}', regressions, options.threshold))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,10 +13,34 @@
 # python_version  : 3.9.2
 # ==============================================================================
 
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import shlex
+import signal
 import subprocess
+import threading
+import time
 import os
 
 
+# ACLI echoes every action of a run with a line starting with this prefix before printing the action output
+RUN_ENTRY_PREFIX = b'Run: '
+RUN_SUMMARY_PREFIX = b'Run completed'
+RUN_ERROR_PREFIXES = (b'Error', b'Remote error', b'Client error')
+
+# names of the BambooActions methods which render an action command
+ACTION_NAMES = ('create_plan', 'add_stage', 'add_job', 'add_task', 'add_requirement', 'add_repository', 'add_branch',
+                'queue_build', 'get_build', 'get_build_log', 'get_branch_list', 'get_build_list', 'get_job',
+                'get_job_list', 'get_plan', 'get_plan_list', 'get_project', 'get_stage', 'get_stage_list',
+                'get_task', 'run', 'restart_build', 'stop_build', 'disable_job', 'disable_plan', 'enable_job',
+                'enable_plan', 'delete_plan', 'remove_job', 'remove_stage', 'remove_task', 'remove_requirement',
+                'update_branching_options', 'enable_agent', 'disable_agent', 'get_agent_info',
+                'get_agent_assignment_list', 'get_agent_capability', 'get_task_list', 'get_requirement_list',
+                'get_repository_list')
+
+
 class BambooTasks(object):
     """"""
     def __init__(self):
@@ -57,13 +81,13 @@ class BambooTasks(object):
 
     def get_task_key(self, task_key):
         """Verifies the task key and returns the task parameters"""
-        for key, value in self.task_dict.iteritems():
+        for key, value in list(self.task_dict.items()):
             if str(key).upper() == str(task_key).upper():
                 return key
         raise KeyError(str.format('{0} task key not found', task_key))
 
     def get_task_value(self, task_key):
-        for key, value in self.task_dict.iteritems():
+        for key, value in list(self.task_dict.items()):
             if str(key).upper() == str(task_key).upper():
                 return value
         raise KeyError(str.format('{0} task key not found', task_key))
@@ -74,6 +98,497 @@ class BambooException(Exception):
     pass
 
 
+# seconds a stopped acli process group gets to exit after SIGTERM before the rest of it is killed with SIGKILL
+KILL_GRACE_PERIOD = 2.0
+# seconds between two checks of the cancel event of a deadline
+CANCEL_POLL_INTERVAL = 0.05
+
+
+class BambooCancelledError(BambooException):
+    """
+    Raised when an acli process was stopped before it finished. The process is killed together with the processes
+    it started, like the acli JVM.
+    Arguments:
+        command: action command which was stopped.
+        output: reply acli had written until it was stopped. (Optional)
+        reason: why the action was stopped. (Optional)
+        retryable: sending the action again can still succeed within the deadline of the caller. (Optional)
+    """
+    def __init__(self, command, output=None, reason='was cancelled', retryable=False):
+        super(BambooCancelledError, self).__init__(str.format('{0} {1}', command, reason))
+        self.command = command
+        self.output = output or b''
+        self.retryable = retryable
+
+
+class BambooTimeoutError(BambooCancelledError):
+    """Raised when an acli process was stopped at its deadline, see BambooCancelledError"""
+    def __init__(self, command, timeout, output=None, retryable=False):
+        super(BambooTimeoutError, self).__init__(command, output, str.format('timed out after {0:g} seconds', timeout),
+                                                 retryable)
+        self.timeout = timeout
+
+
+class BambooDeadline(object):
+    """
+    Deadline and cancel event of the acli processes started by a thread, see BambooActions.deadline.
+    Arguments:
+        timeout: seconds from now until the deadline, None for no deadline.
+        cancel: threading.Event stopping the acli processes once it is set. (Optional)
+        retryable: the deadline is the one of a single acli process rather than the one of the caller. (Optional)
+    """
+    def __init__(self, timeout=None, cancel=None, retryable=False):
+        self.timeout = timeout
+        self.expires = time.monotonic() + timeout if timeout is not None else None
+        self.cancel = cancel
+        self.retryable = retryable
+
+    def remaining(self):
+        """Returns the seconds left until the deadline or None"""
+        if self.expires is None:
+            return None
+        return self.expires - time.monotonic()
+
+    def wait_interval(self):
+        """Returns the seconds until the deadline should be checked again, None to wait without limit"""
+        remaining = self.remaining()
+        if self.cancel is None:
+            return None if remaining is None else max(remaining, 0)
+        return CANCEL_POLL_INTERVAL if remaining is None else max(min(remaining, CANCEL_POLL_INTERVAL), 0)
+
+    def stopped(self):
+        """Returns True once the cancel event is set or the deadline passed"""
+        if self.cancel is not None and self.cancel.is_set():
+            return True
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def error(self, command, output=None):
+        """Returns the BambooCancelledError or BambooTimeoutError for an action stopped by this deadline"""
+        if self.cancel is not None and self.cancel.is_set():
+            return BambooCancelledError(command, output)
+        return BambooTimeoutError(command, self.timeout, output, retryable=self.retryable)
+
+    def check(self, command):
+        """Raises the error of the deadline when it stopped already, so no acli process is started"""
+        if self.stopped():
+            raise self.error(command)
+
+
+def process_group_options():
+    """Returns the subprocess.Popen arguments starting a process in a process group of its own"""
+    if os.name == 'posix':
+        return dict(start_new_session=True)
+    return dict(creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+
+
+def kill_process_group(process, grace=KILL_GRACE_PERIOD):
+    """
+    Stops a process started with process_group_options together with all processes it started. The group gets
+    SIGTERM, what is left of it once the process exited, or after grace seconds, gets SIGKILL.
+    """
+    if os.name != 'posix':
+        subprocess.call(['taskkill', '/F', '/T', '/PID', str(process.pid)], stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL)
+        process.wait()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        process.wait()
+        return
+    try:
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+class BambooWatchdog(object):
+    """
+    Thread killing the process group of an acli process once its deadline stops it, which also unblocks the
+    threads reading its output. stopped tells whether it did.
+    Arguments:
+        process: subprocess.Popen started with process_group_options.
+        deadline: BambooDeadline of the process.
+    """
+    def __init__(self, process, deadline):
+        self.process = process
+        self.deadline = deadline
+        self.stopped = False
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='bamboo-watchdog')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while not self.finished.wait(self.deadline.wait_interval()):
+            if self.deadline.stopped():
+                self.stopped = True
+                kill_process_group(self.process)
+                return
+
+    def close(self):
+        """Ends the watch once the process finished"""
+        self.finished.set()
+        self.thread.join()
+
+
+# seconds the replies of the read actions are cached for by default, other actions are not cached
+DEFAULT_CACHE_TTLS = {'get_plan': 300, 'get_project': 600, 'get_plan_list': 120, 'get_stage': 300,
+                      'get_stage_list': 300, 'get_job': 300, 'get_job_list': 300, 'get_task': 300,
+                      'get_branch_list': 120, 'get_agent_info': 60, 'get_agent_capability': 300,
+                      'get_agent_assignment_list': 300, 'get_task_list': 300, 'get_requirement_list': 300,
+                      'get_repository_list': 300}
+
+# actions changing the content of a plan, the plans of a project, the agents or the builds of a plan
+PLAN_MUTATIONS = frozenset(['add_stage', 'add_job', 'add_task', 'add_requirement', 'add_repository', 'disable_job',
+                            'enable_job', 'remove_job', 'remove_stage', 'remove_task', 'remove_requirement',
+                            'update_branching_options'])
+PROJECT_MUTATIONS = frozenset(['create_plan', 'delete_plan', 'enable_plan', 'disable_plan', 'add_branch'])
+AGENT_MUTATIONS = frozenset(['enable_agent', 'disable_agent'])
+BUILD_MUTATIONS = frozenset(['queue_build', 'restart_build', 'stop_build'])
+# the run action counts as mutating, it can carry any action
+MUTATING_ACTION_NAMES = PLAN_MUTATIONS | PROJECT_MUTATIONS | AGENT_MUTATIONS | BUILD_MUTATIONS | frozenset(['run'])
+
+# read actions merged with an identical action in flight by default
+COALESCED_ACTIONS = frozenset(DEFAULT_CACHE_TTLS) | frozenset(['get_build', 'get_build_list', 'get_build_log'])
+
+BambooMapResult = collections.namedtuple('BambooMapResult', ['index', 'kwargs', 'reply', 'error'])
+
+
+class BambooCommand(str):
+    """
+    Rendered action command. It is the command string sent through the shell and carries the same command
+    as an argument list in argv, where every value is kept verbatim so it can be run without a shell.
+    Arguments:
+        command: command string with the values quoted for the shell.
+        argv: list of command arguments.
+    """
+    def __new__(cls, command, argv):
+        instance = super(BambooCommand, cls).__new__(cls, command)
+        instance.argv = argv
+        return instance
+
+
+class BambooBatchResult(object):
+    """
+    Result of a single action queued in a batch. The reply and error are filled in when the batch is flushed.
+    Arguments:
+        command: rendered action command which was queued.
+        action_name: name of the action method, used for invalidating the cache once it ran. (Optional)
+        kwargs: arguments the action was rendered with. (Optional)
+    """
+    def __init__(self, command, action_name=None, kwargs=None):
+        self.command = command
+        self.action_name = action_name
+        self.kwargs = kwargs or dict()
+        self.reply = None
+        self.error = None
+        self.done = False
+
+    def result(self):
+        """Returns the reply of the action or raises the BambooException the action failed with"""
+        if not self.done:
+            raise BambooException(str.format('{0} has not been flushed yet', self.command))
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+
+class BambooBatch(object):
+    """
+    Collects action commands and sends them to ACLI as a single run action, so a whole batch costs one
+    JVM startup instead of one per action. Replacement variables like @plan@ and @stage@ are only carried
+    between the actions of the same run, so keep max_size above the number of dependent actions.
+    Arguments:
+        actions: BambooActions instance used for sending the run action.
+        max_size: number of queued actions after which the batch is flushed automatically. (Optional)
+        continues: keep running the remaining actions after an action failed. (Optional)
+        timeout: seconds every run action of the batch may take, the actions it did not finish fail with its
+                 BambooTimeoutError. (Optional)
+    Examples:
+        with bamboo.batch() as batch:
+            plan = bamboo.send_command(bamboo.create_plan, plan_name="ZCLI-TASKS")
+            stage = bamboo.send_command(bamboo.add_stage, stage="FIRST")
+        plan.result()
+    """
+    def __init__(self, actions, max_size=50, continues=True, timeout=None):
+        self.actions = actions
+        self.max_size = max_size
+        self.continues = continues
+        self.timeout = timeout
+        self.pending = list()
+
+    def queue(self, command, action_name=None, kwargs=None):
+        """Queues a rendered action command and returns its BambooBatchResult"""
+        batch_result = BambooBatchResult(command, action_name, kwargs)
+        self.pending.append(batch_result)
+        if self.max_size and len(self.pending) >= self.max_size:
+            self.flush()
+        return batch_result
+
+    def abort(self, reason):
+        """Drops all queued actions without running them"""
+        pending, self.pending = self.pending, list()
+        for batch_result in pending:
+            batch_result.error = BambooException(str.format('{0} was not run: {1}', batch_result.command, reason))
+            batch_result.done = True
+        return pending
+
+    def flush(self):
+        """Runs all queued actions through one run action and splits the reply back out per action"""
+        pending, self.pending = self.pending, list()
+        if not pending:
+            return pending
+        command = self.actions.run(inputs=[batch_result.command for batch_result in pending],
+                                   continues=self.continues)
+        if self.actions.coalescer is not None:
+            for batch_result in pending:
+                self.actions.coalescer.detach(batch_result.action_name)
+        try:
+            return self._run(pending, command)
+        finally:
+            # the queued mutations are done once the run returned, a read cached while it ran is stale
+            if self.actions.cache is not None:
+                for batch_result in pending:
+                    if batch_result.action_name is not None:
+                        self.actions.cache.invalidate(batch_result.action_name, batch_result.kwargs)
+
+    def _run(self, pending, command):
+        failure = None
+        try:
+            with (self.actions.deadline(self.timeout) if self.timeout is not None else contextlib.nullcontext()):
+                if self.actions.policy is not None:
+                    reply = self.actions.policy.call('run', self.actions.execute_command, command,
+                                                     stderr=subprocess.STDOUT)
+                else:
+                    reply = self.actions.execute_command(command, stderr=subprocess.STDOUT)
+        except Exception as sender_exception:
+            # the actions a failed or stopped run finished keep their replies, the policy wraps the error of the
+            # last attempt as its cause
+            cause = getattr(sender_exception, 'cause', None) or sender_exception
+            if isinstance(cause, subprocess.CalledProcessError):
+                reply = cause.output or b''
+                failure = sender_exception
+            elif isinstance(cause, BambooCancelledError):
+                reply = cause.output
+                failure = cause
+            else:
+                self.pending = pending
+                return self.abort(sender_exception)
+
+        segments = self.actions.split_run_reply(reply, len(pending))
+        errors = [self.actions.find_reply_error(segment) for segment in segments]
+        if failure is not None and segments and not any(errors):
+            errors[-1] = str(failure)
+        elif isinstance(failure, BambooCancelledError) and segments and not errors[-1]:
+            # the action running when acli was stopped did not finish its output
+            errors[-1] = str(failure)
+        for index, batch_result in enumerate(pending):
+            if index < len(segments):
+                batch_result.reply = segments[index]
+                if errors[index]:
+                    batch_result.error = BambooException(errors[index])
+            elif failure is not None:
+                batch_result.error = BambooException(str.format('{0} was not run: {1}', batch_result.command,
+                                                                failure))
+            else:
+                batch_result.error = BambooException(str.format('no output found for {0} in the run reply',
+                                                                batch_result.command))
+            batch_result.done = True
+        return pending
+
+
+class BambooResultCache(object):
+    """
+    Size bounded LRU cache for the replies of read actions, keyed on the rendered command. Every entry expires
+    after the TTL of its action and is tagged with the plan, project, agent or builds it was read from, so a
+    mutating action only drops the entries it affects. Counters for hits, misses, evictions and invalidations
+    are kept in stats().
+    Arguments:
+        action_ttls: dict of action name to seconds the replies are cached, actions not listed are not
+                     cached. Defaults to DEFAULT_CACHE_TTLS. (Optional)
+        max_entries: number of replies kept before the least recently used one is evicted. (Optional)
+    """
+    def __init__(self, action_ttls=None, max_entries=1024):
+        self.action_ttls = dict(DEFAULT_CACHE_TTLS if action_ttls is None else action_ttls)
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def plan_key(kwargs):
+        """Returns the plan key of the action arguments, a build key like XXX-DEF-232 gives XXX-DEF"""
+        plan = kwargs.get('plan_name')
+        if plan is None and kwargs.get('build') is not None:
+            parts = str(kwargs['build']).split('-')
+            plan = '-'.join(parts[:2])
+        return plan
+
+    def read_tags(self, action_name, kwargs):
+        """Returns the tags an entry of the read action is dropped by"""
+        if action_name in ('get_plan_list', 'get_project'):
+            return ('projects',)
+        if action_name in ('get_agent_info', 'get_agent_capability', 'get_agent_assignment_list'):
+            return ('agents',)
+        if action_name in ('get_build', 'get_build_list', 'get_build_log'):
+            return (str.format('builds:{0}', self.plan_key(kwargs)),)
+        return (str.format('plan:{0}', self.plan_key(kwargs)),)
+
+    def mutation_tags(self, action_name, kwargs):
+        """
+        Returns the tags the mutating action invalidates, None for the actions which do not mutate. A tag
+        ending with * drops all tags starting with it, which is used when the plan is not known like for @plan@.
+        """
+        plan = self.plan_key(kwargs)
+        if plan is not None and plan.startswith('@'):
+            plan = None
+        if action_name in PLAN_MUTATIONS:
+            return ('plan:*',) if plan is None else (str.format('plan:{0}', plan),)
+        if action_name in PROJECT_MUTATIONS:
+            return ('projects', 'plan:*') if plan is None else ('projects', str.format('plan:{0}', plan))
+        if action_name in AGENT_MUTATIONS:
+            return ('agents',)
+        if action_name in BUILD_MUTATIONS:
+            return ('builds:*',) if plan is None else (str.format('builds:{0}', plan),)
+        if action_name == 'run':
+            return ('*',)
+        return None
+
+    def get(self, action_name, command):
+        """Returns the cached reply of the command or None"""
+        if action_name not in self.action_ttls:
+            return None
+        with self.lock:
+            entry = self.entries.get(command)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self.entries[command]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(command)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, action_name, command, kwargs, reply, generation):
+        """Stores the reply unless an invalidation happened since the read started at generation"""
+        ttl = self.action_ttls.get(action_name)
+        if ttl is None:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[command] = (time.time() + ttl, reply, self.read_tags(action_name, kwargs))
+            self.entries.move_to_end(command)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, action_name, kwargs):
+        """Drops the entries affected by a mutating action. Returns the number of dropped entries"""
+        tags = self.mutation_tags(action_name, kwargs)
+        if tags is None:
+            return 0
+        with self.lock:
+            self.generation += 1
+            prefixes = tuple(tag[:-1] for tag in tags if tag.endswith('*'))
+            dropped = [command for command, entry in self.entries.items()
+                       if any(tag in tags or tag.startswith(prefixes) for tag in entry[2])]
+            for command in dropped:
+                del self.entries[command]
+            self.invalidations += len(dropped)
+            return len(dropped)
+
+    def clear(self):
+        """Drops all entries"""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        """Returns the cache counters as a dict"""
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+class BambooCoalescer(object):
+    """
+    Merges identical read actions running at the same time. The first caller of a rendered command sends it, the
+    callers asking for the same command while it is in flight wait for that reply instead of starting their own
+    acli process. Nothing is kept once the reply is there, see BambooResultCache for reusing replies over time.
+    A mutating action detaches the reads in flight, so later callers do not get a reply read before it.
+    Arguments:
+        action_names: names of the actions which are merged. Defaults to COALESCED_ACTIONS. (Optional)
+    """
+    def __init__(self, action_names=None):
+        self.action_names = frozenset(COALESCED_ACTIONS if action_names is None else action_names)
+        self.flights = dict()
+        self.sent = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+
+    def send(self, action_name, command, send, deadline=None):
+        """
+        Returns the reply of send(command), shared with the identical calls in flight. A caller waiting for the
+        flight of another one stops at its own deadline or cancel event with the error of the deadline.
+        """
+        if action_name not in self.action_names:
+            return send(command)
+        with self.lock:
+            flight = self.flights.get(command)
+            leader = flight is None
+            if leader:
+                flight = concurrent.futures.Future()
+                self.flights[command] = flight
+                self.sent += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return self._wait(flight, command, deadline)
+        try:
+            flight.set_result(send(command))
+        except BaseException as send_exception:
+            flight.set_exception(send_exception)
+        finally:
+            with self.lock:
+                if self.flights.get(command) is flight:
+                    del self.flights[command]
+        return flight.result()
+
+    @staticmethod
+    def _wait(flight, command, deadline):
+        if deadline is None:
+            return flight.result()
+        while True:
+            deadline.check(command)
+            try:
+                return flight.result(timeout=deadline.wait_interval())
+            except concurrent.futures.TimeoutError:
+                continue
+
+    def detach(self, action_name):
+        """Lets the next reads start anew after a mutating action, the callers already waiting keep their flight"""
+        if action_name not in MUTATING_ACTION_NAMES:
+            return
+        with self.lock:
+            self.flights.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'sent': self.sent, 'coalesced': self.coalesced, 'in_flight': len(self.flights)}
+
+
 class BambooActions(object):
     """
     These are the keywords that tell the CLI what action to take. The actions listed correspond to nearly
@@ -88,43 +603,187 @@ class BambooActions(object):
         acli_directory_path: Path to the ACLI directory (after unzipping)
         acli_bamboo_server_name: Name of the bamboo server mentioned in the 'ACLI.properties'
             file within the ACLI directory
+        use_shell: send the commands through the shell as one string, with every argument quoted on its own.
+            Set it to False to start acli directly with an argument list, which saves the shell process.
+    The call_timeout attribute limits every acli process to that many seconds, see also deadline.
     Examples:
     """
-    def __init__(self, bamboo_project_name, acli_directory_path, acli_bamboo_server_name):
+    def __init__(self, bamboo_project_name, acli_directory_path, acli_bamboo_server_name, use_shell=True):
         """"""
         self.project = bamboo_project_name
         self.acli_directory_path = acli_directory_path
         self.bamboo_server_name = acli_bamboo_server_name
+        self.use_shell = use_shell
+        if os.sys.platform.startswith("win"):
+            self.acli_executable = os.path.join(acli_directory_path, 'acli.bat')
+        else:
+            self.acli_executable = os.path.join(acli_directory_path, 'acli')
+        self.acli_environment = dict(os.environ)
+        self.acli_environment['PATH'] = os.pathsep.join([acli_directory_path, os.environ.get('PATH', '')])
         self.bamboo_tasks = BambooTasks()
+        self.session_pool = None
+        self.policy = None
+        self.cache = None
+        self.coalescer = None
+        self.call_timeout = None
+        self._local = threading.local()
 
     @staticmethod
     def add_optional_arguments(command, **kwargs):
-        """"""
+        """
+        Appends the given parameters to the action command and returns it as a BambooCommand. List values repeat
+        the parameter for every entry. Values are double quoted with their embedded double quotes escaped, the
+        argv of the command keeps them verbatim.
+        """
         command_list = list()
         command_list.append(command)
+        argv = shlex.split(command)
         for key, value in kwargs.items():
             if (value is None) or (value is False):
                 continue
-            elif value is True:
-                command_list.append(str.format('--{0}', key))
             elif key.upper() == 'CONTINUES':
-                command_list.append(str.format('--continue'))
+                flag = '--continue'
             elif key.upper() == 'FAVORITE':
-                command_list.append(str.format('--favorite'))
+                flag = '--favorite'
             elif key.upper() == 'EXCLUDE_DISABLED':
-                command_list.append(str.format('--exclude_disabled'))
+                flag = '--exclude_disabled'
             elif key.upper() == 'EXCLUDE_ENABLED':
-                command_list.append(str.format('--exclude_enabled'))
+                flag = '--exclude_enabled'
+            elif value is True:
+                flag = str.format('--{0}', key)
+            elif isinstance(value, (list, tuple)):
+                for entry in value:
+                    command_list.append(str.format('--{0} "{1}"', key, str(entry).replace('"', '\\"')))
+                    argv.extend([str.format('--{0}', key), str(entry)])
+                continue
             else:
-                command_list.append(str.format('--{0} "{1}"', key, value))
+                command_list.append(str.format('--{0} "{1}"', key, str(value).replace('"', '\\"')))
+                argv.extend([str.format('--{0}', key), str(value)])
+                continue
+            command_list.append(flag)
+            argv.append(flag)
 
-        return ' '.join(command_list)
+        return BambooCommand(' '.join(command_list), argv)
+
+    @staticmethod
+    def run_reference(value, placeholder):
+        """
+        Returns the quoted value for a plan, stage or job parameter, or the run replacement variable like @plan@
+        when no value is given, which ACLI fills in from the previous action of a run.
+        """
+        if value is None:
+            return placeholder
+        return str.format('"{0}"', str(value).replace('"', '\\"'))
 
     @staticmethod
     def create_run_input_from_list(input_list):
-        """"""
-        input_string = ""
-        return input_string
+        """
+        Turns a list of action commands into the values of the run input parameter. Every command becomes its
+        own --input entry, add_optional_arguments escapes the embedded quotes for the shell.
+        Examples:
+            create_run_input_from_list(['--action addStage --plan @plan@ --stage "FIRST"',
+                                        '--action addJob --plan @plan@ --stage @stage@ --job "JOB"'])
+        """
+        return [str(entry) for entry in input_list]
+
+    @staticmethod
+    def split_run_reply(reply, count):
+        """
+        Splits the reply of a run action into the output of every action it ran. ACLI prints a 'Run: ' line
+        before the output of each action, which is used as the delimiter, and the run summary line is dropped.
+        Arguments:
+            reply: bytes returned by the run action. (Mandatory)
+            count: number of actions in the run. At most this many segments are returned. (Mandatory)
+        """
+        segments = list()
+        for line in reply.splitlines(True):
+            if line.startswith(RUN_ENTRY_PREFIX):
+                segments.append(list())
+            elif segments and not line.startswith(RUN_SUMMARY_PREFIX):
+                segments[-1].append(line)
+        return [b''.join(segment) for segment in segments[:count]]
+
+    @staticmethod
+    def find_reply_error(reply):
+        """Returns the first error line ACLI printed in the reply of an action or None"""
+        for line in reply.splitlines():
+            if line.startswith(RUN_ERROR_PREFIXES):
+                return line.decode('utf-8', 'replace').strip()
+        return None
+
+    @contextlib.contextmanager
+    def batch(self, max_size=50, continues=True, timeout=None):
+        """
+        Queues every send_command of the current thread into a BambooBatch instead of running it. The queued
+        actions are sent as one run action when the block exits, or earlier once max_size actions are queued.
+        send_command returns a BambooBatchResult for each queued action.
+        Arguments:
+            max_size: number of queued actions after which the batch is flushed automatically. (Optional)
+            continues: keep running the remaining actions after an action failed. (Optional)
+            timeout: seconds every run action of the batch may take. (Optional)
+        Examples:
+            with bamboo.batch() as batch:
+                bamboo.send_command(bamboo.create_plan, plan_name="ZCLI-TASKS")
+                bamboo.send_command(bamboo.add_stage, stage="FIRST")
+                bamboo.send_command(bamboo.add_job, stage="FIRST", job="JOB")
+        """
+        previous_batch = self.current_batch()
+        batch = BambooBatch(self, max_size=max_size, continues=continues, timeout=timeout)
+        self._local.batch = batch
+        try:
+            yield batch
+        except BaseException as batch_exception:
+            batch.abort(repr(batch_exception))
+            raise
+        finally:
+            self._local.batch = previous_batch
+        batch.flush()
+
+    def current_batch(self):
+        """Returns the BambooBatch active for the current thread or None"""
+        return getattr(self._local, 'batch', None)
+
+    @contextlib.contextmanager
+    def deadline(self, timeout=None, cancel=None):
+        """
+        Limits the acli processes the current thread starts within the block, for send_command, batches,
+        stream_command, map and the session pool, to timeout seconds from now in total, and stops them once the
+        cancel event is set. A stopped acli process is killed together with the processes it started, and
+        BambooTimeoutError or BambooCancelledError is raised carrying the reply read until then. A nested block
+        keeps the earlier deadline and the cancel event of the outer block when it has none.
+        Arguments:
+            timeout: seconds until the deadline. (Optional)
+            cancel: threading.Event stopping the acli processes once it is set. (Optional)
+        Examples:
+            cancel = threading.Event()
+            with bamboo.deadline(60, cancel=cancel):
+                log = bamboo.send_command(bamboo.get_build_log, build="XXX-DEF-232", job="JOB1")
+        """
+        previous_deadline = getattr(self._local, 'deadline', None)
+        deadline = BambooDeadline(timeout, cancel=cancel)
+        if previous_deadline is not None:
+            if deadline.cancel is None:
+                deadline.cancel = previous_deadline.cancel
+            if previous_deadline.expires is not None and (deadline.expires is None or
+                                                          previous_deadline.expires < deadline.expires):
+                deadline.expires, deadline.timeout = previous_deadline.expires, previous_deadline.timeout
+        self._local.deadline = deadline
+        try:
+            yield deadline
+        finally:
+            self._local.deadline = previous_deadline
+
+    def call_deadline(self):
+        """Returns the BambooDeadline of an acli process the current thread starts now, or None"""
+        deadline = getattr(self._local, 'deadline', None)
+        if self.call_timeout is None:
+            return deadline
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and remaining <= self.call_timeout:
+            return deadline
+        # the process times out before the caller does, so the action can be sent again
+        return BambooDeadline(self.call_timeout, cancel=deadline.cancel if deadline is not None else None,
+                              retryable=True)
 
     def create_plan(self, plan_name=None, project_name=None, name=None, description=None, repository=None,
                     disable=None, replace=False, continues=False, options=None):
@@ -156,7 +815,7 @@ class BambooActions(object):
 
         if project_name is None:
             project_name = self.project
-        command = str.format('--action createPlan --plan "{0}" --replace', plan_name)
+        command = str.format('--action createPlan --plan "{0}"', plan_name)
         return self.add_optional_arguments(command, projectName=project_name, name=name, description=description,
                                            repository=repository, disable=disable, replace=replace, continues=continues,
                                            options=options)
@@ -178,7 +837,8 @@ class BambooActions(object):
             add_stage(plan_name="ZCREATE4739509-AA", stage="My stage 1", description="My stage description")
             add_stage(plan_name="ZCREATE4739509-AA", stage="Stage 1")
         """
-        command = str.format('--action addStage --plan @plan@ --stage "{1}"', plan_name, stage)
+        command = str.format('--action addStage --plan {0} --stage "{1}"', self.run_reference(plan_name, '@plan@'),
+                             stage)
         return self.add_optional_arguments(command, name=name, description=description, manual=manual, final=final,
                                            continues=continues)
 
@@ -204,7 +864,8 @@ class BambooActions(object):
             add_job(plan_name="ZCREATE4739509-CC", stage="Default Stage", job="JOBDocker", type="Docker",
                                                                                         docker="myDocker")
         """
-        command = str.format('--action addJob --plan @plan@ --stage @stage@ --job "{2}"', plan_name, stage, job)
+        command = str.format('--action addJob --plan {0} --stage {1} --job "{2}"',
+                             self.run_reference(plan_name, '@plan@'), self.run_reference(stage, '@stage@'), job)
         return self.add_optional_arguments(command, name=name, description=description, type_name=type_name,
                                            docker=docker, disable=disable)
 
@@ -239,7 +900,8 @@ class BambooActions(object):
                     sourcePlanKey=ZEXPORT4891077-Export", field="artifactId_1=out.txt")
         """
         task_key = self.bamboo_tasks.get_task_key(task_key)
-        command = str.format('--action addTask --plan @plan@ --job @job@ --taskKey "{2}"', plan_name, job, task_key)
+        command = str.format('--action addTask --plan {0} --job {1} --taskKey "{2}"',
+                             self.run_reference(plan_name, '@plan@'), self.run_reference(job, '@job@'), task_key)
         return self.add_optional_arguments(command,  description=description, disable=disable, final=final, field=field,
                                            fields=fields, field1=field1, value1=value1, field2=field2, value2=value2)
 
@@ -259,8 +921,8 @@ class BambooActions(object):
                             req_type="equal", value="mine")
             add_requirement(plan_name="ZCLI-REQUIREMENTS", job="JOB1", requirement="system.builder.gant.Gant")
         """
-        command = str.format('--action addRequirement --plan @plan@ --job @job@ --requirement "{2}"', plan_name,
-                             job, requirement)
+        command = str.format('--action addRequirement --plan {0} --job {1} --requirement "{2}"',
+                             self.run_reference(plan_name, '@plan@'), self.run_reference(job, '@job@'), requirement)
         return self.add_optional_arguments(command, type=req_type, value=value)
 
     def add_repository(self, plan_name=None, name=None, repository_key=None, credentials=None, branch=None,
@@ -296,7 +958,8 @@ class BambooActions(object):
                             repository.git.commandTimeout:2,selectedWebRepositoryViewer:
                             'bamboo.webrepositoryviewer.provided:noRepositoryViewer")
         """
-        command = str.format('--action addRepository --plan @plan@ --name "{1}"', plan_name, name)
+        command = str.format('--action addRepository --plan {0} --name "{1}"', self.run_reference(plan_name, '@plan@'),
+                             name)
         return self.add_optional_arguments(command, branch=branch, repositoryKey=repository_key,
                                            credentials=credentials, replace=replace, continues=continues,
                                            field=field, fields=fields, field1=field1, value1=value1, field2=field2,
@@ -318,7 +981,8 @@ class BambooActions(object):
             add_branch(plan_name="ZCLI-REQUIREMENTS", branch="bugfix/YS-0101010-plan_branch")
             add_branch(plan_name="ZCLI-REQUIREMENTS", branch="bugfix/YS-0101010-plan_branch, name='mybranch'")
         """
-        command = str.format('--action addBranch --plan @plan@ --branch "{1}"', plan_name, branch)
+        command = str.format('--action addBranch --plan {0} --branch "{1}"', self.run_reference(plan_name, '@plan@'),
+                             branch)
         return self.add_optional_arguments(command, name=name, description=description,
                                            continues=continues, enable=enable)
 
@@ -428,7 +1092,7 @@ class BambooActions(object):
                                            findReplaceRegex=find_replace_regex)
 
     def get_branch_list(self, plan_name=None, limit=None, regex=None, columns=None, file_name=None,
-                        append=None, encoding=None):
+                        append=None, encoding=None, output_type=None):
         """
         Get a list of jobs for a plan with regex filtering on job key or name. Subset by stage if desired.
         Arguments:
@@ -439,6 +1103,7 @@ class BambooActions(object):
             append: append the columns to be included. (Optional)
             file_name: file path which contains the build data. (Optional)
             encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
         Examples:
             --action getBranchList --plan "ZCREATE4739509-CC"
             --action getBranchList --plan "ZCREATE4739509SCRIPT-PLAN" --regex "TEST2.*"
@@ -446,11 +1111,11 @@ class BambooActions(object):
         """
         command = str.format('--action getBranchList --plan "{0}"', plan_name)
         return self.add_optional_arguments(command, limit=limit, regex=regex, columns=columns,
-                                           file=file_name, append=append, encoding=encoding)
+                                           file=file_name, append=append, encoding=encoding, outputType=output_type)
 
     def get_build_list(self, plan_name=None, labels=None, issues=None, limit=None, columns=None, file_name=None,
                        append=None, encoding=None, date_format=None, field=None, fields=None, field1=None,
-                       value1=None, field2=None, value2=None, output_format=None):
+                       value1=None, field2=None, value2=None, output_format=None, output_type=None):
         """
         Get a list of build results. Build results can be filtered by labels, issues, and using field parameters.
         Supported fields are state, notState, started, endedBefore. For example, include only successful results
@@ -473,6 +1138,7 @@ class BambooActions(object):
             field2: accepts a key name for the field like "state". (Optional)
             value2: accepts a value for the field1 like "SUCCESSFUL". (Optional)
             output_format: format of the resultant list. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
         Examples:
             get_build_list(plan_name="ZLONGRUNNING-AA")
             get_build_list(plan_name="ZCLI-BUILDLIST", limit=1, output_format=999, issues="NOTFOUND-123")
@@ -486,7 +1152,8 @@ class BambooActions(object):
         return self.add_optional_arguments(command, labels=labels, issues=issues, limit=limit, columns=columns,
                                            file=file_name, append=append, encoding=encoding, field=field, fields=fields,
                                            field1=field1, value1=value1, field2=field2, value2=value2,
-                                           dateFormat=date_format, outputFormat=output_format)
+                                           dateFormat=date_format, outputFormat=output_format,
+                                           outputType=output_type)
 
     def get_job(self, plan_name=None, job=None):
         """
@@ -502,7 +1169,7 @@ class BambooActions(object):
         return self.add_optional_arguments(command)
 
     def get_job_list(self, plan_name=None, stage=None, limit=None, regex=None, columns=None, file_name=None,
-                     append=None, encoding=None):
+                     append=None, encoding=None, output_type=None):
         """
         Get a list of jobs for a plan with regex filtering on job key or name. Subset by stage if desired.
         Arguments:
@@ -514,6 +1181,7 @@ class BambooActions(object):
             append: append the columns to be included. (Optional)
             file_name: file path which contains the build data. (Optional)
             encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
         Examples:
             --action getJobList --plan "ZCREATE4739509-AA" --job "@all" --stage "My stage 1" --columns "enabled,type"
             --action getJobList --plan "ZCREATE4739509-CC"
@@ -524,7 +1192,7 @@ class BambooActions(object):
         """
         command = str.format('--action getJobList --plan "{0}"', plan_name)
         return self.add_optional_arguments(command, stage=stage, limit=limit, regex=regex, columns=columns,
-                                           file=file_name, append=append, encoding=encoding)
+                                           file=file_name, append=append, encoding=encoding, outputType=output_type)
 
     def get_plan(self, plan_name=None):
         """
@@ -540,7 +1208,7 @@ class BambooActions(object):
     def get_plan_list(self, project_name=None, favorite=False, exclude_disabled=False, exclude_enabled=False,
                       labels=None, options=None, limit=None, regex=None, output_format=None, date_format=None,
                       columns=None, file_name=None, append=None, encoding=None, field=None,
-                      fields=None, field1=None, value1=None, field2=None, value2=None):
+                      fields=None, field1=None, value1=None, field2=None, value2=None, output_type=None):
         """
         Get a list of plans for a project with regex filtering on plan key or name. Additionally, use labels
         parameter to filter by labels. Use @all for project to get a list of plans across all projects. To also
@@ -568,6 +1236,7 @@ class BambooActions(object):
             field2: accepts a key name for the field like "state". (Optional)
             value2: accepts a value for the field1 like "SUCCESSFUL". (Optional)
             output_format: format of the resultant list. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
         Examples:
             --action getPlanList --project "@all" --excludeDisabled --outputFormat 999 --dateFormat
             "yyyy-MM-dd HH:mm:ss"
@@ -584,7 +1253,8 @@ class BambooActions(object):
                                            limit=limit, regex=regex, outputFormat=output_format,
                                            dateFormat=date_format, columns=columns, file=file_name,
                                            append=append, encoding=encoding, field=field, fields=fields,
-                                           field1=field1, value1=value1, field2=field2, value2=value2)
+                                           field1=field1, value1=value1, field2=field2, value2=value2,
+                                           outputType=output_type)
 
     def get_project(self, project_name=None):
         """
@@ -613,7 +1283,8 @@ class BambooActions(object):
         command = str.format('--action getStage --plan "{0}" --stage "{1}"', plan_name, stage)
         return self.add_optional_arguments(command)
 
-    def get_stage_list(self, plan_name, regex=None, columns=None, file_name=None, append=None, encoding=None):
+    def get_stage_list(self, plan_name, regex=None, columns=None, file_name=None, append=None, encoding=None,
+                       output_type=None, limit=None):
         """
         Get a list of stages for a plan with regex filtering on stage name.
         Arguments:
@@ -623,13 +1294,15 @@ class BambooActions(object):
             append: append the columns to be included. (Optional)
             file_name: file path which contains the build data. (Optional)
             encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
+            limit: to limit the number of stages retrieved. By default set to 25. (Optional)
         Examples:
             get_stage_list(plan_name="ZCREATE4739509SCRIPT-PLAN")
             get_stage_list(plan_name="ZCREATE4739509SCRIPT-PLAN", regex="A.*")
         """
         command = str.format('--action getStageList --plan "{0}"', plan_name)
-        return self.add_optional_arguments(command, regex=regex, columns=columns, file=file_name,
-                                           append=append, encoding=encoding)
+        return self.add_optional_arguments(command, limit=limit, regex=regex, columns=columns, file=file_name,
+                                           append=append, encoding=encoding, outputType=output_type)
 
     def get_task(self, plan_name, job, task):
         """
@@ -643,9 +1316,71 @@ class BambooActions(object):
             get_task(plan_name="ZCLI-TASKS", job="JOB", task="@all")
             get_task(plan_name="ZCLI-TASKS", job="JOB", task=1)
         """
-        command = str.format('--action addTask --plan "{0}" --job "{1}" --task "{2}"', plan_name, job, task)
+        command = str.format('--action getTask --plan "{0}" --job "{1}" --task "{2}"', plan_name, job, task)
         return self.add_optional_arguments(command)
 
+    def get_task_list(self, plan_name, job, columns=None, file_name=None, append=None, encoding=None,
+                      output_type=None, limit=None):
+        """
+        Get a list of the tasks of a plan job, in the order they run.
+        Arguments:
+            plan_name: name/id of the plan. Type string. (Mandatory)
+            job: name/id of the job. Type string. (Mandatory)
+            columns: columns to select for the results like id,key,description. (Optional)
+            append: append the columns to be included. (Optional)
+            file_name: file path which contains the build data. (Optional)
+            encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
+            limit: to limit the number of tasks retrieved. By default set to 25. (Optional)
+        Examples:
+            get_task_list(plan_name="ZCLI-TASKS", job="JOB1")
+        """
+        command = str.format('--action getTaskList --plan "{0}" --job "{1}"', plan_name, job)
+        return self.add_optional_arguments(command, limit=limit, columns=columns, file=file_name, append=append,
+                                           encoding=encoding, outputType=output_type)
+
+    def get_requirement_list(self, plan_name, job, regex=None, columns=None, file_name=None, append=None,
+                             encoding=None, output_type=None, limit=None):
+        """
+        Get a list of the requirements of a plan job with regex filtering on the requirement key.
+        Arguments:
+            plan_name: name/id of the plan. Type string. (Mandatory)
+            job: name/id of the job. Type string. (Mandatory)
+            regex: a regular expression to select the requirements. (Optional)
+            columns: columns to select for the results like id,key,type,value. (Optional)
+            append: append the columns to be included. (Optional)
+            file_name: file path which contains the build data. (Optional)
+            encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
+            limit: to limit the number of requirements retrieved. By default set to 25. (Optional)
+        Examples:
+            get_requirement_list(plan_name="ZCLI-REQUIREMENTS", job="JOB1")
+            get_requirement_list(plan_name="ZCLI-REQUIREMENTS", job="JOB1", regex="system.*")
+        """
+        command = str.format('--action getRequirementList --plan "{0}" --job "{1}"', plan_name, job)
+        return self.add_optional_arguments(command, limit=limit, regex=regex, columns=columns, file=file_name,
+                                           append=append, encoding=encoding, outputType=output_type)
+
+    def get_repository_list(self, plan_name, regex=None, columns=None, file_name=None, append=None, encoding=None,
+                            output_type=None, limit=None):
+        """
+        Get a list of the repositories of a plan with regex filtering on the repository name.
+        Arguments:
+            plan_name: name/id of the plan. Type string. (Mandatory)
+            regex: a regular expression to select the repositories. (Optional)
+            columns: columns to select for the results like id,name,type. (Optional)
+            append: append the columns to be included. (Optional)
+            file_name: file path which contains the build data. (Optional)
+            encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
+            limit: to limit the number of repositories retrieved. By default set to 25. (Optional)
+        Examples:
+            get_repository_list(plan_name="ZCLI-REQUIREMENTS")
+        """
+        command = str.format('--action getRepositoryList --plan "{0}"', plan_name)
+        return self.add_optional_arguments(command, limit=limit, regex=regex, columns=columns, file=file_name,
+                                           append=append, encoding=encoding, outputType=output_type)
+
     def run(self, file_path=None, inputs=None, common=None, continues=None, simulate=False, field=None,
             encoding=None, clear_file_before_append=False, find_replace=None, find_replace_regex=None,
             date_format=None):
@@ -837,7 +1572,7 @@ class BambooActions(object):
         command = str.format('--action removeStage --plan "{0}" --stage "{1}"', plan_name, stage)
         return self.add_optional_arguments(command, wait=wait, timeout=timeout, continues=continues)
 
-    def remove_task(self, plan_name, job, task, task_id):
+    def remove_task(self, plan_name, job, task=None, task_id=None):
         """
         Remove a task from a plan job. Use --task @all to remove all tasks.
         Arguments:
@@ -847,30 +1582,31 @@ class BambooActions(object):
             task_id: task id of the task. Type string. (Mandatory)
         Examples:
             remove_task(plan_name="ZCLI-TASKS", job="JOB1", task="@all")
-            remove_task(plan_name="ZCLI-TASKS", job="JOB1", id=2)
+            remove_task(plan_name="ZCLI-TASKS", job="JOB1", task_id=2)
         """
         if task is not None:
             command = str.format('--action removeTask --plan "{0}" --job "{1}" --task "{2}"', plan_name, job, task)
         else:
-            command = str.format('--action removeTask --plan "{0}" --job "{1}" --id "{2}"', plan_name, job, id)
-        return self.add_optional_arguments(command, job=job, task=task, id=task_id)
+            command = str.format('--action removeTask --plan "{0}" --job "{1}" --id "{2}"', plan_name, job, task_id)
+        return self.add_optional_arguments(command)
 
-    def remove_requirement(self, plan_name, job, requirement, task_id):
+    def remove_requirement(self, plan_name, job, requirement=None, task_id=None):
         """
         Remove a plan requirement. Specify -1 for id to remove all requirements from a plan that are
         eligible to be removed.
         Arguments:
             plan_name: name/id of the plan. Type string. (Mandatory)
             job: name/id of the job. Type string. (Mandatory)
-            requirement: this is like a pre-requisite and a mandatory requirement to run the job. It could
-                         some software setup need on the bamboo agent or it can also be custom requirements. (Mandatory)
-            task_id: task id of the task. Type string. (Mandatory)
+            requirement: key of the requirement to remove. (Mandatory) OR
+            task_id: id of the requirement to remove. (Mandatory)
         Examples:
-            remove_requirement(plan_name="ZCLI-TASKS", job="JOB1", requirement="SIML2", task_id=1)
+            remove_requirement(plan_name="ZCLI-TASKS", job="JOB1", requirement="SIML2")
+            remove_requirement(plan_name="ZCLI-TASKS", job="JOB1", task_id=1)
         """
-        command = str.format('--action removeRequirement --plan "{0}" --job "{1}" --requirement "{2}" --id {3}',
-                             plan_name, job, requirement, id)
-        return self.add_optional_arguments(command, job=job, requirement=requirement, id=task_id)
+        command = str.format('--action removeRequirement --plan "{0}" --job "{1}"', plan_name, job)
+        if requirement is not None:
+            return self.add_optional_arguments(command, requirement=requirement)
+        return self.add_optional_arguments(command, id=task_id)
 
     def update_branching_options(self, plan_name=None, field=None, field1=None, value1=None,
                                  field2=None, value2=None, file_name=None, encoding=None):
@@ -903,7 +1639,7 @@ class BambooActions(object):
         Examples:
             enable_agent(agent_name="YOUR_BAMBOO_AGENT_NAME")
         """
-        command = str.format('--action enableAgent --agent "{0} ', agent_name)
+        command = str.format('--action enableAgent --agent "{0}"', agent_name)
         return self.add_optional_arguments(command)
 
     def disable_agent(self, agent_name):
@@ -914,11 +1650,12 @@ class BambooActions(object):
         Examples:
             disable_agent(agent_name="YOUR_BAMBOO_AGENT_NAME")
         """
-        command = str.format('--action disableAgent --agent "{0} ', agent_name)
+        command = str.format('--action disableAgent --agent "{0}"', agent_name)
         return self.add_optional_arguments(command)
 
     def get_agent_info(self, exclude_disabled=False, exclude_enabled=False, options=None, columns=None,
-                       limit=None, regex=None, file_name=None, append=None, encoding=None, select=None):
+                       limit=None, regex=None, file_name=None, append=None, encoding=None, select=None,
+                       output_type=None):
         """
         Get a list of agents based on regex filtering of agent names.
         Arguments:
@@ -931,6 +1668,7 @@ class BambooActions(object):
             columns: columns to select for the results like plan,duration description,labels,issues. (Optional)
             file_name: file path which contains the build data. (Optional)
             encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
             select: Used for row selection by column value on list actions. The first colon (:) in
                 the parameter value delineates the column name or number from a regex selection pattern.
                 Each row's column value is used with the regex pattern to determined row inclusion in the
@@ -952,10 +1690,10 @@ class BambooActions(object):
         return self.add_optional_arguments(command, excludeDisabled=exclude_disabled, columns=columns,
                                            excludeEnabled=exclude_enabled, options=options,
                                            limit=limit, regex=regex, file=file_name,
-                                           append=append, encoding=encoding, select=select)
+                                           append=append, encoding=encoding, select=select, outputType=output_type)
 
     def get_agent_assignment_list(self, agent_name, options=None, limit=None, capability_type=None, regex=None,
-                                  file_name=None, append=None, encoding=None, select=None):
+                                  file_name=None, append=None, encoding=None, select=None, output_type=None):
         """
         Get a list of assignments for agents with regex filtering on entity key or name.
         Specify an agent to filter by agent. Specify an assignment type to filter on type. Valid
@@ -968,6 +1706,7 @@ class BambooActions(object):
             append: append the columns to be included. (Optional)
             file_name: file path which contains the build data. (Optional)
             encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
             capability_type: Capability type like Executable, Custom, or JDK.Also, requirement match type
                 with values: exist (default), equal, match. Also, trigger type for addTrigger and
                 job isolation type like agent or docker.. (Optional)
@@ -987,10 +1726,10 @@ class BambooActions(object):
         command = '--action getAgentAssignmentList '
         return self.add_optional_arguments(command, agent=agent_name, type=capability_type, options=options,
                                            limit=limit, regex=regex, file=file_name,
-                                           append=append, encoding=encoding, select=select)
+                                           append=append, encoding=encoding, select=select, outputType=output_type)
 
     def get_agent_capability(self, agent_name, options=None, limit=None, regex=None, columns=None,
-                             file_name=None, append=None, encoding=None, select=None):
+                             file_name=None, append=None, encoding=None, select=None, output_type=None):
         """
         Get a list of shared or agent specific capabilities with regex filtering on capability key or name (label).
         Use @all for agent to get shared and agent specific capabilities. Specify --options includeUnreferenced
@@ -1004,6 +1743,7 @@ class BambooActions(object):
             columns: columns to select for the results like plan,duration description,labels,issues. (Optional)
             file_name: file path which contains the build data. (Optional)
             encoding: file encoding like UTF-8, UTF-16BE, UTF-32BE. (Optional)
+            output_type: type of the output like text, table or csv. (Optional)
             select: Used for row selection by column value on list actions. The first colon (:) in
                 the parameter value delineates the column name or number from a regex selection pattern.
                 Each row's column value is used with the regex pattern to determined row inclusion in the
@@ -1021,24 +1761,241 @@ class BambooActions(object):
             get_agent_capability(options="includeUnreferenced", regex=".*Maven.*")
         """
         command = str.format('--action getCapabilityList ')
-        return self.add_optional_arguments(command, agent=agent_name, options=options,
+        return self.add_optional_arguments(command, agent=agent_name, options=options, columns=columns,
                                            limit=limit, regex=regex, file=file_name,
-                                           append=append, encoding=encoding, select=select)
+                                           append=append, encoding=encoding, select=select, outputType=output_type)
+
+    def render_command(self, command):
+        """
+        Prefixes an action command with the acli executable and the bamboo server name. Every argument is quoted
+        for the shell on its own, so $, backticks and backslashes in the values reach acli verbatim.
+        """
+        arguments = self.render_argv(command)[1:]
+        if os.sys.platform.startswith("win"):
+            arguments = subprocess.list2cmdline(arguments)
+        else:
+            arguments = ' '.join(shlex.quote(argument) for argument in arguments)
+        if os.sys.platform.startswith("linux"):
+            return str.format("PATH={0}:$PATH && {0}/acli {1}", self.acli_directory_path, arguments)
+        return str.format("cd {0} && acli {1}", self.acli_directory_path, arguments)
+
+    def render_argv(self, command):
+        """Returns the argument list which starts acli for an action command without a shell"""
+        argv = getattr(command, 'argv', None)
+        if argv is None:
+            argv = shlex.split(command)
+        return [self.acli_executable, self.bamboo_server_name] + list(argv)
+
+    def execute_command(self, command, stderr=None):
+        """
+        Runs an action command through acli and returns the reply. Under a deadline, see call_deadline, acli is
+        watched and its process group killed when the deadline stops it.
+        """
+        deadline = self.call_deadline()
+        if deadline is None:
+            if self.use_shell:
+                return subprocess.check_output(self.render_command(command), shell=True, stderr=stderr)
+            return subprocess.check_output(self.render_argv(command), stderr=stderr, cwd=self.acli_directory_path,
+                                           env=self.acli_environment)
+        deadline.check(command)
+        process = self.open_command(command, stdout=subprocess.PIPE, stderr=stderr)
+        watchdog = BambooWatchdog(process, deadline)
+        try:
+            output, errors = process.communicate()
+        except BaseException:
+            kill_process_group(process)
+            raise
+        finally:
+            watchdog.close()
+        if watchdog.stopped:
+            raise deadline.error(command, output)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, process.args, output=output, stderr=errors)
+        return output
+
+    def open_command(self, command, **kwargs):
+        """
+        Starts acli for an action command without waiting for it and returns the subprocess.Popen. acli runs in a
+        process group of its own, so kill_process_group also stops the JVM it starts.
+        """
+        kwargs = dict(process_group_options(), **kwargs)
+        if self.use_shell:
+            return subprocess.Popen(self.render_command(command), shell=True, **kwargs)
+        return subprocess.Popen(self.render_argv(command), cwd=self.acli_directory_path,
+                                env=self.acli_environment, **kwargs)
+
+    def stream_command(self, function_name, **kwargs):
+        """
+        Sends the action like send_command, but yields the reply line by line while acli is still writing it
+        instead of buffering the whole reply. A consumer which stops early kills the acli process group. The
+        action is always run in its own process, batches and the session pool are not used. The deadline of the
+        thread starting the stream applies, a stopped stream raises after the lines read until then.
+        Examples:
+            for line in bamboo.stream_command(bamboo.get_build_log, build="XXX-DEF-232", job="JOB1"):
+                print(line)
+        """
+        if not os.path.exists(self.acli_directory_path):
+            raise BambooException(FileNotFoundError("{0} folder does not exist!".format(self.acli_directory_path)))
+        deadline = self.call_deadline()
+        try:
+            command = function_name(**kwargs)
+            if deadline is not None:
+                deadline.check(command)
+            process = self.open_command(command, stdout=subprocess.PIPE)
+        except BambooException:
+            raise
+        except Exception as sender_exception:
+            raise BambooException(sender_exception)
+        watchdog = BambooWatchdog(process, deadline) if deadline is not None else None
+        finished = False
+        try:
+            for line in process.stdout:
+                yield line
+            finished = True
+        finally:
+            process.stdout.close()
+            if not finished:
+                kill_process_group(process)
+            if watchdog is not None:
+                watchdog.close()
+            return_code = process.wait()
+        if watchdog is not None and watchdog.stopped:
+            # the lines were yielded already
+            raise deadline.error(command)
+        if return_code != 0:
+            raise BambooException(subprocess.CalledProcessError(return_code, command))
+
+    def map(self, action, iterable_of_kwargs, max_workers=8, progress=None):
+        """
+        Sends the same action for every set of arguments on a pool of threads. Results are yielded as
+        BambooMapResult(index, kwargs, reply, error) in the order they finish, a failed action sets error to its
+        BambooException instead of stopping the other ones. At most twice max_workers actions are queued ahead,
+        so long or endless iterables are consumed as the results come in. Leaving the loop early cancels the
+        actions which have not started yet.
+        Arguments:
+            action: action method or its name, like bamboo.get_build_list or "get_build_list". (Mandatory)
+            iterable_of_kwargs: iterable of dicts with the arguments of each action. (Mandatory)
+            max_workers: number of actions sent at the same time. (Optional)
+            progress: called with the number of finished actions and the total number, which is None when the
+                      iterable has no length. (Optional)
+        Examples:
+            for item in bamboo.map("get_build_list", [{"plan_name": plan} for plan in plans], max_workers=16):
+                print(item.kwargs["plan_name"], item.error or item.reply)
+        """
+        if isinstance(action, str):
+            action = getattr(self, action)
+        total = len(iterable_of_kwargs) if hasattr(iterable_of_kwargs, '__len__') else None
+        pending_kwargs = enumerate(iterable_of_kwargs)
+        running = dict()
+        finished = 0
+        # the workers send under the deadline of the calling thread
+        send = functools.partial(self._send_within, getattr(self._local, 'deadline', None), action)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            while True:
+                for index, kwargs in pending_kwargs:
+                    running[executor.submit(send, **kwargs)] = (index, kwargs)
+                    if len(running) >= max_workers * 2:
+                        break
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index, kwargs = running.pop(future)
+                    error = future.exception()
+                    finished += 1
+                    if progress is not None:
+                        progress(finished, total)
+                    yield BambooMapResult(index, kwargs, None if error else future.result(), error)
+        finally:
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _send_within(self, deadline, function_name, **kwargs):
+        previous_deadline = getattr(self._local, 'deadline', None)
+        self._local.deadline = deadline
+        try:
+            return self.send_command(function_name, **kwargs)
+        finally:
+            self._local.deadline = previous_deadline
+
+    def enable_cache(self, action_ttls=None, max_entries=1024):
+        """
+        Caches the replies of the read actions sent through send_command, see BambooResultCache.
+        Examples:
+            bamboo.enable_cache(action_ttls=dict(DEFAULT_CACHE_TTLS, get_build_list=30), max_entries=4096)
+            bamboo.cache.stats()
+        """
+        self.cache = BambooResultCache(action_ttls=action_ttls, max_entries=max_entries)
+        return self.cache
+
+    def _send(self, command, action_name=None):
+        if self.policy is not None:
+            # the error output is kept on the exception, the policy tells transient errors apart by it
+            send = (self.session_pool.send if self.session_pool is not None else
+                    functools.partial(self.execute_command, stderr=subprocess.PIPE))
+            return self.policy.call(action_name, send, command)
+        if self.session_pool is not None:
+            return self.session_pool.send(command)
+        return self.execute_command(command)
+
+    def enable_coalescing(self, action_names=None):
+        """
+        Merges identical read actions sent at the same time by several threads, see BambooCoalescer.
+        Examples:
+            bamboo.enable_coalescing(action_names=["get_plan_list", "get_agent_info"])
+            bamboo.coalescer.stats()
+        """
+        self.coalescer = BambooCoalescer(action_names=action_names)
+        return self.coalescer
+
+    def _send_coalesced(self, command, action_name):
+        if self.coalescer is None:
+            return self._send(command, action_name)
+        self.coalescer.detach(action_name)
+        return self.coalescer.send(action_name, command, functools.partial(self._send, action_name=action_name),
+                                   deadline=self.call_deadline())
+
+    def _send_cached(self, action_name, command, kwargs):
+        reply = self.cache.get(action_name, command)
+        if reply is not None:
+            return reply
+        generation = self.cache.generation
+        try:
+            reply = self._send_coalesced(command, action_name)
+        finally:
+            # a mutation is invalidated once it is done, so no read in between caches the state before it
+            self.cache.invalidate(action_name, kwargs)
+        self.cache.put(action_name, command, kwargs, reply, generation)
+        return reply
 
     def send_command(self, function_name, **kwargs):
+        """
+        Renders the action with the given arguments and sends it to the bamboo server. Within a batch block the
+        action is queued and a BambooBatchResult is returned instead of the reply. When a session_pool is set the
+        action is handed to a warm acli session instead of starting a new process. When a cache is enabled read
+        actions are answered from it and mutating actions invalidate it. When a policy is set, like a
+        BambooPolicy, the action is sent through its call method, which rate limits and retries it. When
+        coalescing is enabled identical reads in flight share one reply. The deadline of the current thread and
+        call_timeout stop acli when it takes too long.
+        Examples:
+            send_command(bamboo.get_plan_list, project_name="@all")
+        """
         try:
             # checking if the ACLI directory exists
             if os.path.exists(self.acli_directory_path):
                 command = function_name(**kwargs)
-                if os.sys.platform.startswith("linux"):
-                    command = str.format("PATH={0}:$PATH && {0}/acli {1} {2}", self.acli_directory_path,
-                                         self.bamboo_server_name, command)
-                else:
-                    command = str.format("cd {0} && acli {1} {2}", self.acli_directory_path, self.bamboo_server_name,
-                                         command)
-                reply = subprocess.check_output(command, shell=True)
-                return reply
+                batch = self.current_batch()
+                if batch is not None:
+                    # the cache and the coalescer see the action when the batch is flushed
+                    return batch.queue(command, function_name.__name__, kwargs)
+                if self.cache is not None:
+                    return self._send_cached(function_name.__name__, command, kwargs)
+                return self._send_coalesced(command, function_name.__name__)
             else:
                 raise FileNotFoundError("{0} folder does not exist!".format(self.acli_directory_path))
+        except BambooException:
+            raise
         except Exception as sender_exception:
             raise BambooException(sender_exception)
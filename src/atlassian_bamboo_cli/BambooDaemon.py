@@ -0,0 +1,272 @@
+# !/usr/bin/env python
+# title           : BambooDaemon.py
+# description     : Local daemon keeping warm acli sessions for many client processes. Clients send actions over a
+#                   Unix socket, so short lived scripts share the running sessions instead of starting acli cold.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : python -m atlassian_bamboo_cli daemon --acli-directory /opt/acli --server realbamboo
+# notes           : every frame is a 4 byte big endian length followed by that many bytes of utf-8 json.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import base64
+import getpass
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+
+from .BambooCLI import ACTION_NAMES, BambooActions, BambooException
+from .BambooSession import BambooSessionPool
+
+FRAME_HEADER = struct.Struct('>I')
+# a frame larger than this is taken as a broken stream rather than allocated
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+PROTOCOL_VERSION = 1
+
+
+def default_socket_path():
+    """Returns the socket path from BAMBOO_CLI_SOCKET, or a per user path in the temp directory"""
+    if os.environ.get('BAMBOO_CLI_SOCKET'):
+        return os.environ['BAMBOO_CLI_SOCKET']
+    # os.getuid only exists on Unix
+    user = os.getuid() if hasattr(os, 'getuid') else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), str.format('atlassian-bamboo-cli-{0}.sock', user))
+
+
+def _receive_exactly(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def send_frame(connection, message):
+    """Sends a json serializable message as one frame"""
+    payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    connection.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def receive_frame(connection):
+    """Returns the next message of the connection, or None once the other side closed it"""
+    header = _receive_exactly(connection, FRAME_HEADER.size)
+    if header is None:
+        return None
+    size = FRAME_HEADER.unpack(header)[0]
+    if size > MAX_FRAME_SIZE:
+        raise BambooException(str.format('frame of {0} bytes is larger than {1}', size, MAX_FRAME_SIZE))
+    payload = _receive_exactly(connection, size)
+    if payload is None:
+        raise BambooException('connection closed in the middle of a frame')
+    return json.loads(payload.decode('utf-8'))
+
+
+class _BambooRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon
+        while True:
+            try:
+                request = receive_frame(self.request)
+            except (BambooException, ValueError, OSError):
+                return
+            if request is None:
+                return
+            try:
+                send_frame(self.request, daemon.handle_request(request))
+            except OSError:
+                return
+
+
+class _BambooServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class BambooDaemon(object):
+    """
+    Serves BambooActions over a Unix socket. The actions are sent through a BambooSessionPool, so all clients share
+    the same warm acli sessions. A request is {"action": name, "kwargs": {...}}, the response is {"ok": true,
+    "reply": base64 reply} or {"ok": false, "error": message}. The actions "ping" and "stats" are answered by the
+    daemon itself.
+    Arguments:
+        actions: BambooActions instance the actions are sent with.
+        socket_path: path of the Unix socket, see default_socket_path. (Optional)
+        pool_size: number of warm acli sessions. (Optional)
+        timeout: seconds to wait for the output of a single action. (Optional)
+        max_uses: number of actions after which a session is restarted. (Optional)
+    Examples:
+        with BambooDaemon(bamboo, pool_size=4) as daemon:
+            daemon.serve_forever()
+    """
+    def __init__(self, actions, socket_path=None, pool_size=2, timeout=300, max_uses=500):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise BambooException('the bamboo daemon needs Unix domain sockets')
+        self.actions = actions
+        self.socket_path = socket_path or default_socket_path()
+        self.requests = 0
+        self.errors = 0
+        self.serving = False
+        self.lock = threading.Lock()
+        self._remove_stale_socket()
+        self.actions.session_pool = BambooSessionPool(actions, size=pool_size, timeout=timeout, max_uses=max_uses)
+        # the socket is created accessible to the current user only, it runs actions with its credentials
+        previous_umask = os.umask(0o177)
+        try:
+            self.server = _BambooServer(self.socket_path, _BambooRequestHandler)
+        finally:
+            os.umask(previous_umask)
+        self.server.daemon = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise BambooException(str.format('a bamboo daemon is already listening on {0}', self.socket_path))
+
+    def stats(self):
+        with self.lock:
+            return dict(requests=self.requests, errors=self.errors, recycled=self.actions.session_pool.recycled,
+                        pool_size=self.actions.session_pool.size, protocol=PROTOCOL_VERSION)
+
+    def handle_request(self, request):
+        """Runs one request and returns the response message"""
+        action = request.get('action') if isinstance(request, dict) else None
+        with self.lock:
+            self.requests += 1
+        if action == 'ping':
+            return dict(ok=True, protocol=PROTOCOL_VERSION)
+        if action == 'stats':
+            return dict(ok=True, stats=self.stats())
+        try:
+            if action not in ACTION_NAMES:
+                raise BambooException(str.format('{0} is not a bamboo action', action))
+            reply = self.actions.send_command(getattr(self.actions, action), **(request.get('kwargs') or dict()))
+            return dict(ok=True, reply=base64.b64encode(reply).decode('ascii'))
+        except Exception as request_exception:
+            with self.lock:
+                self.errors += 1
+            return dict(ok=False, error=str(request_exception))
+
+    def serve_forever(self):
+        """Serves requests until close is called from another thread or the process is interrupted"""
+        self.serving = True
+        try:
+            self.server.serve_forever()
+        finally:
+            self.serving = False
+
+    def close(self):
+        """Stops serving, removes the socket and stops the warm acli sessions"""
+        if self.serving:
+            self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.actions.session_pool.close()
+
+
+class BambooClient(object):
+    """
+    Client of a BambooDaemon with the same action methods as BambooActions: every action method sends the action
+    with the given arguments through the daemon and returns its reply. One connection is kept open and shared by
+    the threads of the client.
+    Arguments:
+        socket_path: path of the daemon socket, see default_socket_path. (Optional)
+        timeout: seconds to wait for the daemon to answer. (Optional)
+    Examples:
+        client = BambooClient()
+        plans = client.get_plan_list(project_name="@all")
+        client.send_command("get_build", build="XXX-DEF-232")
+    """
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(self.socket_path)
+        except OSError as connect_exception:
+            connection.close()
+            raise BambooException(str.format('no bamboo daemon on {0}: {1}', self.socket_path, connect_exception))
+        return connection
+
+    def request(self, message):
+        """Sends one request message and returns the response message"""
+        with self.lock:
+            if self.connection is None:
+                self.connection = self._connect()
+            try:
+                send_frame(self.connection, message)
+                response = receive_frame(self.connection)
+            except (OSError, ValueError) as request_exception:
+                self.close()
+                raise BambooException(request_exception)
+            if response is None:
+                self.close()
+                raise BambooException('the bamboo daemon closed the connection')
+            return response
+
+    def send_command(self, function_name, **kwargs):
+        """
+        Sends an action through the daemon and returns its reply. The action is a name like "get_plan_list" or a
+        BambooActions method.
+        """
+        action = function_name if isinstance(function_name, str) else function_name.__name__
+        response = self.request(dict(action=action, kwargs=kwargs))
+        if not response.get('ok'):
+            raise BambooException(response.get('error'))
+        return base64.b64decode(response['reply'])
+
+    def ping(self):
+        return self.request(dict(action='ping')).get('ok', False)
+
+    def stats(self):
+        return self.request(dict(action='stats')).get('stats')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def _client_action(name):
+    def action(self, **kwargs):
+        return self.send_command(name, **kwargs)
+    action.__name__ = name
+    action.__qualname__ = str.format('BambooClient.{0}', name)
+    action.__doc__ = getattr(BambooActions, name).__doc__
+    return action
+
+
+for _action_name in ACTION_NAMES:
+    setattr(BambooClient, _action_name, _client_action(_action_name))
@@ -0,0 +1,1186 @@
+# !/usr/bin/env python
+# title           : BambooEmulator.py
+# description     : Stateful stand in for acli and the bamboo server behind it, for load and scale tests without
+#                   a network. Plans, builds and agents live in a sqlite model, the actions print the output acli
+#                   prints, and startup latency, action latency and errors can be injected.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : bamboo = EmulatedBambooActions(BambooEmulator(action_latency=0.01)) for an in-process fake,
+#                   write_emulator_acli("/tmp/acli", "/tmp/acli/bamboo.db") for an acli executable to point
+#                   BambooActions at.
+# notes           : list actions always print csv, DEFAULT_LIST_LIMIT rows unless a limit is given like acli.
+#                   Builds run on the emulated agents in real time, see build_duration.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import random
+import re
+import shlex
+import sqlite3
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+from .BambooCLI import BambooActions, BambooException, CANCEL_POLL_INTERVAL
+from .BambooParser import DEFAULT_DATE_FORMAT, column_converter, column_name, format_timestamp, \
+    java_date_format_to_strptime
+
+# environment variable pointing the emulated acli at its json config
+EMULATOR_CONFIG_VARIABLE = 'BAMBOO_EMULATOR_CONFIG'
+# reply of an injected error, an overloaded server by default
+DEFAULT_ERROR_MESSAGE = 'Remote error: 503 Service Unavailable'
+# exit code of acli for a failed action
+ERROR_EXIT_CODE = 255
+# rows the list actions print when no limit is given, like acli
+DEFAULT_LIST_LIMIT = 25
+
+EMULATOR_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS projects (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS plans (
+    key TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    name TEXT,
+    description TEXT,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    next_number INTEGER NOT NULL DEFAULT 1,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plans_project ON plans (project);
+CREATE TABLE IF NOT EXISTS builds (
+    key TEXT PRIMARY KEY,
+    plan TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    queued REAL NOT NULL,
+    started REAL,
+    completed REAL,
+    outcome TEXT NOT NULL,
+    agent TEXT
+);
+CREATE INDEX IF NOT EXISTS builds_plan_number ON builds (plan, number);
+CREATE INDEX IF NOT EXISTS builds_completed ON builds (completed);
+CREATE TABLE IF NOT EXISTS agents (
+    name TEXT PRIMARY KEY,
+    id INTEGER NOT NULL,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    free_at REAL NOT NULL DEFAULT 0,
+    capabilities TEXT NOT NULL DEFAULT '{}'
+);
+'''
+
+# options acli takes without a value
+FLAG_OPTIONS = frozenset(['continue', 'replace', 'disable', 'enable', 'final', 'wait', 'simulate', 'favorite',
+                          'excludeDisabled', 'excludeEnabled', 'exclude_disabled', 'exclude_enabled', 'manual',
+                          'clearFileBeforeAppend', 'append', 'verbose', 'debug', 'quiet'])
+# options which can be given several times
+LIST_OPTIONS = frozenset(['input', 'field'])
+SHORT_OPTIONS = {'a': 'action', 'f': 'file', 'p': 'plan', 'v': 'verbose'}
+
+# acli actions changing the model, they run in a write transaction
+MUTATING_ACTIONS = frozenset(['createPlan', 'deletePlan', 'enablePlan', 'disablePlan', 'addStage', 'removeStage',
+                              'addJob', 'removeJob', 'enableJob', 'disableJob', 'addTask', 'removeTask',
+                              'addRequirement', 'removeRequirement', 'addRepository', 'addBranch',
+                              'updateBranchingOptions', 'queueBuild', 'restartBuild', 'stopBuild', 'enableAgent',
+                              'disableAgent'])
+
+_PLAN_KEY = re.compile(r'^[A-Z][A-Z0-9_]*-[A-Z0-9_]+$')
+_BUILD_KEY = re.compile(r'^([A-Z][A-Z0-9_]*-[A-Z0-9_]+)-(\d+)$')
+_LOG_TIME_FORMAT = '%d-%b-%Y %H:%M:%S'
+
+
+class BambooEmulatorError(BambooException):
+    """Failure of an emulated action, printed as the "Error: " line acli prints"""
+    pass
+
+
+class _InjectedError(BambooEmulatorError):
+    pass
+
+
+def parse_action_arguments(argv):
+    """
+    Splits acli arguments into a dict of option name to value. Flags are True and the options of LIST_OPTIONS
+    are lists.
+    Examples:
+        parse_action_arguments(["--action", "getPlan", "--plan", "XXX-DEF"]) returns
+            {'action': 'getPlan', 'plan': 'XXX-DEF'}
+    """
+    options = dict()
+    index = 0
+    while index < len(argv):
+        token = argv[index]
+        if token.startswith('--'):
+            name = token[2:]
+        elif token.startswith('-') and len(token) == 2:
+            name = SHORT_OPTIONS.get(token[1], token[1])
+        else:
+            raise BambooEmulatorError(str.format('unexpected argument {0}', token))
+        if name in FLAG_OPTIONS:
+            value = True
+            index += 1
+        elif index + 1 < len(argv):
+            value = argv[index + 1]
+            index += 2
+        else:
+            raise BambooEmulatorError(str.format('--{0} needs a value', name))
+        if name in LIST_OPTIONS:
+            options.setdefault(name, list()).append(value)
+        else:
+            options[name] = value
+    return options
+
+
+def _details(*pairs):
+    lines = list()
+    for name, value in pairs:
+        if value is None:
+            value = ''
+        elif isinstance(value, bool):
+            value = 'true' if value else 'false'
+        lines.append(str.format('{0} {1}: {2}\n', name, '. ' * max(1, (24 - len(name)) // 2), value))
+    return ''.join(lines)
+
+
+def _flag(value):
+    return value is True or str(value).lower() in ('true', 'yes', '1')
+
+
+class BambooEmulator(object):
+    """
+    In memory, or sqlite file, model of a bamboo server answering acli action arguments with the output acli
+    prints: "Run: " echoes for the run action, csv for the list actions and "Key . . : value" lines for the get
+    actions. Errors are printed as "Error: " lines and fail the action with exit code ERROR_EXIT_CODE.
+    Queued builds are placed on the enabled agent which is free first and run build_duration seconds, their state
+    moves from Queued to InProgress to Successful or Failed in real time, and their job logs are generated.
+    Every acli process, a call of execute, pays startup_latency once and every action it runs pays its action
+    latency, latencies are slept outside of the model lock so concurrent callers overlap like on a real server.
+    Arguments:
+        state_path: sqlite database of the model, ":memory:" keeps it in this process. A file is shared by all
+                    emulated acli processes using it. (Optional)
+        startup_latency: seconds every acli process takes to start, like the JVM start and the login. (Optional)
+        action_latency: seconds every action takes. (Optional)
+        action_latencies: dict of acli action name, like "getBuildLog", to the seconds it takes. (Optional)
+        latency_jitter: share of a latency added at random on top, 0.5 adds up to half of it. (Optional)
+        error_rate: share of the actions failing with error_message. (Optional)
+        error_rates: dict of acli action name to the share of these actions failing. (Optional)
+        error_message: reply of an injected error. (Optional)
+        build_duration: seconds a build runs on its agent. (Optional)
+        failure_rate: share of the builds which fail. (Optional)
+        log_lines: number of log lines of a build job. (Optional)
+        seed: seed of the random draws, for repeatable runs. (Optional)
+    Examples:
+        emulator = BambooEmulator(action_latency=0.02, error_rates={"getBuildLog": 0.05}, seed=7)
+        emulator.populate(projects=10, plans=10000, agents=50)
+        bamboo = EmulatedBambooActions(emulator)
+        bamboo.send_command(bamboo.get_plan_list, project_name="@all", output_type="csv")
+    """
+    def __init__(self, state_path=':memory:', startup_latency=0.0, action_latency=0.0, action_latencies=None,
+                 latency_jitter=0.0, error_rate=0.0, error_rates=None, error_message=DEFAULT_ERROR_MESSAGE,
+                 build_duration=5.0, failure_rate=0.1, log_lines=50, seed=None):
+        self.state_path = state_path
+        self.startup_latency = startup_latency
+        self.action_latency = action_latency
+        self.action_latencies = dict(action_latencies or dict())
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_rates = dict(error_rates or dict())
+        self.error_message = error_message
+        self.build_duration = build_duration
+        self.failure_rate = failure_rate
+        self.log_lines = log_lines
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(state_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            if state_path != ':memory:':
+                # concurrent acli processes read while one of them writes
+                self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(EMULATOR_SCHEMA)
+        self.counters = dict(processes=0, actions=0, errors=0, injected=0)
+        self.handlers = dict((name[len('action_'):], getattr(self, name)) for name in dir(self)
+                             if name.startswith('action_'))
+
+    def config(self):
+        """Returns the arguments the emulator was created with, as written for the emulated acli by write_config"""
+        return dict(state_path=self.state_path, startup_latency=self.startup_latency,
+                    action_latency=self.action_latency, action_latencies=self.action_latencies,
+                    latency_jitter=self.latency_jitter, error_rate=self.error_rate, error_rates=self.error_rates,
+                    error_message=self.error_message, build_duration=self.build_duration,
+                    failure_rate=self.failure_rate, log_lines=self.log_lines, seed=self.seed)
+
+    def close(self):
+        self.connection.close()
+
+    def stats(self):
+        """Returns the number of acli processes and actions emulated, the failed and the injected errors"""
+        with self.lock:
+            return dict(self.counters)
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _draw(self):
+        with self.random_lock:
+            return self.random.random()
+
+    def _latency(self, seconds):
+        if not seconds:
+            return 0.0
+        return seconds * (1 + self.latency_jitter * self._draw())
+
+    @contextlib.contextmanager
+    def _transaction(self, write=False):
+        with self.lock:
+            # an immediate transaction takes the write lock up front, so concurrent processes never deadlock
+            self.connection.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    # model
+
+    def populate(self, projects=1, plans=10, stages=1, jobs=2, tasks=2, builds=5, agents=4, prefix='EMU'):
+        """
+        Adds generated projects with plans spread over them, each with stages, jobs, tasks and a history of
+        finished builds, and agents. Meant for scale tests, 10000 plans take a few seconds.
+        Arguments:
+            projects: number of projects. (Optional)
+            plans: number of plans over all projects. (Optional)
+            stages: number of stages per plan. (Optional)
+            jobs: number of jobs per stage. (Optional)
+            tasks: number of script tasks per job. (Optional)
+            builds: number of finished builds per plan. (Optional)
+            agents: number of agents. (Optional)
+            prefix: prefix of the project keys. (Optional)
+        """
+        now = time.time()
+        project_keys = [str.format('{0}{1}', prefix, index) for index in range(projects)]
+        with self._transaction(write=True) as connection:
+            connection.executemany('INSERT OR REPLACE INTO projects (key, name, description) VALUES (?, ?, ?)',
+                                   [(key, str.format('Project {0}', key), None) for key in project_keys])
+            for index in range(plans):
+                project = project_keys[index % projects]
+                plan = str.format('{0}-P{1}', project, index)
+                content = self._new_content()
+                for stage_index in range(stages):
+                    stage = str.format('Stage {0}', stage_index + 1)
+                    content['stages'].append(dict(name=stage, description=None, manual=False, final=False))
+                    for job_index in range(jobs):
+                        job = str.format('JOB{0}', stage_index * jobs + job_index + 1)
+                        content['jobs'].append(dict(
+                            key=job, name=str.format('Job {0}', job), stage=stage, description=None, enabled=True,
+                            tasks=[dict(id=task_index + 1, key='com.atlassian.bamboo.plugins.scripttask:task.builder'
+                                        '.script', description=str.format('script {0}', task_index + 1),
+                                        enabled=True, final=False, fields=list()) for task_index in range(tasks)],
+                            requirements=list()))
+                connection.execute('INSERT OR REPLACE INTO plans (key, project, name, description, enabled, '
+                                   'next_number, content) VALUES (?, ?, ?, ?, 1, ?, ?)',
+                                   (plan, project, str.format('Plan {0}', index), None, builds + 1,
+                                    json.dumps(content)))
+                rows = list()
+                for number in range(1, builds + 1):
+                    started = now - (builds - number + 1) * 3600
+                    completed = started + self.build_duration * (1 + self._draw())
+                    rows.append((str.format('{0}-{1}', plan, number), plan, number, started - 5, started, completed,
+                                 'Failed' if self._draw() < self.failure_rate else 'Successful', None))
+                connection.executemany('INSERT OR REPLACE INTO builds (key, plan, number, queued, started, '
+                                       'completed, outcome, agent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            offset = connection.execute('SELECT COUNT(*) FROM agents').fetchone()[0]
+            connection.executemany(
+                'INSERT OR REPLACE INTO agents (name, id, enabled, free_at, capabilities) VALUES (?, ?, 1, 0, ?)',
+                [(str.format('agent-{0}', offset + index + 1), offset + index + 1,
+                  json.dumps({'os.name': 'Linux', 'system.jdk.JDK': '/usr/lib/jvm/default'}))
+                 for index in range(agents)])
+
+    def add_agent(self, name, capabilities=None, enabled=True):
+        """Adds an agent with a dict of capabilities to the model"""
+        with self._transaction(write=True) as connection:
+            agent_id = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM agents').fetchone()[0]
+            connection.execute('INSERT OR REPLACE INTO agents (name, id, enabled, free_at, capabilities) '
+                               'VALUES (?, ?, ?, 0, ?)', (name, agent_id, int(enabled), json.dumps(capabilities or {})))
+
+    @staticmethod
+    def _new_content():
+        return dict(stages=list(), jobs=list(), repositories=list(), branches=list(), branching=dict())
+
+    def _plan(self, connection, key):
+        if not key:
+            raise BambooEmulatorError('--plan is needed')
+        row = connection.execute('SELECT * FROM plans WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise BambooEmulatorError(str.format('Plan {0} not found.', key))
+        return row, json.loads(row['content'])
+
+    @staticmethod
+    def _save(connection, key, content):
+        connection.execute('UPDATE plans SET content = ? WHERE key = ?', (json.dumps(content), key))
+
+    @staticmethod
+    def _stage(content, name):
+        for stage in content['stages']:
+            if stage['name'] == name:
+                return stage
+        raise BambooEmulatorError(str.format('Stage {0} not found.', name))
+
+    @staticmethod
+    def _job(content, key):
+        for job in content['jobs']:
+            if job['key'] == key or job['name'] == key:
+                return job
+        raise BambooEmulatorError(str.format('Job {0} not found.', key))
+
+    @staticmethod
+    def _build_state(row, now):
+        if row['completed'] is not None and now >= row['completed']:
+            return row['outcome']
+        if row['started'] is None or now < row['started']:
+            return 'Queued'
+        return 'InProgress'
+
+    # output
+
+    @staticmethod
+    def _format_time(timestamp, options):
+        if timestamp is None:
+            return ''
+        value = datetime.datetime.fromtimestamp(timestamp).astimezone()
+        date_format = options.get('dateFormat')
+        if date_format is None:
+            return value.isoformat(timespec='milliseconds')
+        if date_format == DEFAULT_DATE_FORMAT:
+            return format_timestamp(value)
+        return value.strftime(java_date_format_to_strptime(date_format))
+
+    @staticmethod
+    def _parse_time(value, options):
+        try:
+            parsed = column_converter('started', options.get('dateFormat'))(value)
+        except ValueError:
+            raise BambooEmulatorError(str.format('{0} is not a date of the format {1}', value,
+                                                 options.get('dateFormat')))
+        return parsed.timestamp()
+
+    @staticmethod
+    def _regex(options):
+        if options.get('regex') is None:
+            return None
+        try:
+            return re.compile(options['regex'])
+        except re.error as regex_error:
+            raise BambooEmulatorError(str.format('invalid regex {0}: {1}', options['regex'], regex_error))
+
+    @staticmethod
+    def _list(options, noun, headers, rows):
+        rows = rows[:int(options.get('limit') or DEFAULT_LIST_LIMIT)]
+        indexes = list(range(len(headers)))
+        if options.get('columns'):
+            names = [column_name(header) for header in headers]
+            indexes = [names.index(column_name(column)) for column in options['columns'].split(',')
+                       if column.strip() and column_name(column) in names]
+        output = io.StringIO()
+        output.write(str.format('{0} {1} in list\n', len(rows), noun))
+        writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        writer.writerow([headers[index] for index in indexes])
+        for row in rows:
+            writer.writerow(['' if row[index] is None else ('true' if row[index] is True else 'false'
+                                                             if row[index] is False else row[index])
+                             for index in indexes])
+        return output.getvalue()
+
+    # running actions
+
+    def execute(self, argv, stdin=None, stdout=None, stderr=None, sleep=time.sleep):
+        """
+        Runs one emulated acli process. argv are the acli arguments, starting with the server name. Output is
+        written to the stdout and stderr text streams, the exit code is returned.
+        Arguments:
+            argv: acli arguments like ["realbamboo", "--action", "getPlan", "--plan", "XXX-DEF"]. (Mandatory)
+            stdin: text stream the run action reads its actions from when it has no input or file. (Optional)
+            stdout: text stream of the output, sys.stdout by default. (Optional)
+            stderr: text stream of the errors of single actions, sys.stderr by default. (Optional)
+            sleep: function sleeping the latencies. (Optional)
+        """
+        stdout = stdout if stdout is not None else sys.stdout
+        stderr = stderr if stderr is not None else sys.stderr
+        self._count('processes')
+        sleep(self._latency(self.startup_latency))
+        if argv and not argv[0].startswith('-'):
+            # the server name of the ACLI.properties file
+            argv = argv[1:]
+        try:
+            options = parse_action_arguments(argv)
+            action = options.pop('action', None)
+            if action == 'run':
+                return self._run(options, stdin, stdout, sleep)
+            stdout.write(self._perform(action, options, dict(), sleep))
+            return 0
+        except BambooEmulatorError as action_error:
+            stderr.write(self._error_line(action_error))
+            return ERROR_EXIT_CODE
+
+    def _error_line(self, action_error):
+        self._count('errors')
+        if isinstance(action_error, _InjectedError):
+            return str.format('{0}\n', action_error)
+        return str.format('Error: {0}\n', action_error)
+
+    def _perform(self, action, options, context, sleep):
+        handler = self.handlers.get(action)
+        if handler is None:
+            raise BambooEmulatorError(str.format('{0} is not a valid action', action))
+        self._count('actions')
+        sleep(self._latency(self.action_latencies.get(action, self.action_latency)))
+        if self._draw() < self.error_rates.get(action, self.error_rate):
+            self._count('injected')
+            raise _InjectedError(self.error_message)
+        with self._transaction(write=action in MUTATING_ACTIONS) as connection:
+            output = handler(connection, options, context)
+        wait = context.pop('wait', None)
+        if wait is not None:
+            output += self._wait_build(wait, options, sleep)
+        if options.get('file'):
+            with open(options['file'], 'a' if options.get('append') else 'w', encoding='utf-8') as output_file:
+                output_file.write(output)
+            output = str.format('Output written to {0}\n', options['file'])
+        return output
+
+    @staticmethod
+    def _replace(token, context):
+        for name in ('plan', 'stage', 'job'):
+            placeholder = str.format('@{0}@', name)
+            if placeholder in token and name in context:
+                token = token.replace(placeholder, context[name])
+        return token
+
+    def _run(self, options, stdin, stdout, sleep):
+        if options.get('file'):
+            with open(options['file'], 'r', encoding='utf-8') as run_file:
+                inputs = run_file.read().splitlines()
+        elif options.get('input'):
+            inputs = options['input']
+        elif stdin is not None:
+            # a session, every action is answered before the next line is read
+            inputs = iter(stdin.readline, '')
+        else:
+            inputs = list()
+        common = shlex.split(options['common']) if options.get('common') else list()
+        context = dict()
+        successful, failed = 0, 0
+        for line in inputs:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            stdout.write(str.format('Run: {0}\n', line))
+            try:
+                argv = [self._replace(token, context) for token in shlex.split(line) + common]
+                action_options = parse_action_arguments(argv)
+                action = action_options.pop('action', None)
+                if action == 'run':
+                    raise BambooEmulatorError('run actions cannot be nested')
+                stdout.write(self._perform(action, action_options, context, sleep))
+                successful += 1
+            except (BambooEmulatorError, ValueError) as action_error:
+                stdout.write(self._error_line(action_error))
+                failed += 1
+                if not options.get('continue'):
+                    stdout.flush()
+                    break
+            stdout.flush()
+        if failed:
+            stdout.write(str.format('Run completed with {0} errors and {1} actions that were successful.\n',
+                                    failed, successful))
+        else:
+            stdout.write(str.format('Run completed successfully. {0} actions were successful.\n', successful))
+        stdout.flush()
+        return ERROR_EXIT_CODE if failed else 0
+
+    # acli actions, named action_<acli action name>
+
+    def action_getClientInfo(self, connection, options, context):
+        return _details(('Client name', 'Bamboo emulator'), ('Server', 'emulated'),
+                        ('Comment', options.get('comment')))
+
+    def action_createPlan(self, connection, options, context):
+        key = options.get('plan', '')
+        if not _PLAN_KEY.match(key):
+            raise BambooEmulatorError(str.format('{0} is not a valid plan key.', key))
+        exists = connection.execute('SELECT 1 FROM plans WHERE key = ?', (key,)).fetchone()
+        if exists and not options.get('replace'):
+            raise BambooEmulatorError(str.format('Plan {0} already exists.', key))
+        project = key.split('-')[0]
+        connection.execute('INSERT OR IGNORE INTO projects (key, name, description) VALUES (?, ?, NULL)',
+                           (project, options.get('projectName') or project))
+        connection.execute('DELETE FROM builds WHERE plan = ?', (key,))
+        connection.execute('INSERT OR REPLACE INTO plans (key, project, name, description, enabled, next_number, '
+                           'content) VALUES (?, ?, ?, ?, ?, 1, ?)',
+                           (key, project, options.get('name') or key.split('-')[1], options.get('description'),
+                            0 if options.get('disable') else 1, json.dumps(self._new_content())))
+        context['plan'] = key
+        return str.format('Plan {0} created.\n', key)
+
+    def action_deletePlan(self, connection, options, context):
+        self._plan(connection, options.get('plan'))
+        connection.execute('DELETE FROM plans WHERE key = ?', (options['plan'],))
+        connection.execute('DELETE FROM builds WHERE plan = ?', (options['plan'],))
+        return str.format('Plan {0} deleted.\n', options['plan'])
+
+    def _set_plan_enabled(self, connection, key, enabled):
+        self._plan(connection, key)
+        connection.execute('UPDATE plans SET enabled = ? WHERE key = ?', (int(enabled), key))
+        return str.format('Plan {0} {1}.\n', key, 'enabled' if enabled else 'disabled')
+
+    def action_enablePlan(self, connection, options, context):
+        return self._set_plan_enabled(connection, options.get('plan') or options.get('build'), True)
+
+    def action_disablePlan(self, connection, options, context):
+        return self._set_plan_enabled(connection, options.get('plan') or options.get('build'), False)
+
+    def action_getPlan(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        project = connection.execute('SELECT name FROM projects WHERE key = ?', (row['project'],)).fetchone()
+        return _details(('Key', row['key']), ('Name', row['name']), ('Project', row['project']),
+                        ('Project name', project['name'] if project else row['project']),
+                        ('Description', row['description']), ('Enabled', bool(row['enabled'])),
+                        ('Stages', len(content['stages'])), ('Jobs', len(content['jobs'])))
+
+    def action_getPlanList(self, connection, options, context):
+        project = options.get('project')
+        if project in (None, '@all'):
+            rows = connection.execute('SELECT key, project, name, description, enabled FROM plans ORDER BY key')
+        else:
+            rows = connection.execute('SELECT plans.key, project, plans.name, plans.description, enabled FROM plans '
+                                      'JOIN projects ON projects.key = plans.project '
+                                      'WHERE projects.key = ? OR projects.name = ? ORDER BY plans.key',
+                                      (project, project))
+        regex = self._regex(options)
+        plans = list()
+        for row in rows:
+            if options.get('excludeDisabled') and not row['enabled']:
+                continue
+            if options.get('excludeEnabled') and row['enabled']:
+                continue
+            if regex is not None and not (regex.fullmatch(row['key']) or regex.fullmatch(row['name'] or '')):
+                continue
+            plans.append((row['key'], row['project'], row['name'], row['description'], bool(row['enabled'])))
+        return self._list(options, 'plans', ['Key', 'Project', 'Name', 'Description', 'Enabled'], plans)
+
+    def action_getProject(self, connection, options, context):
+        key = options.get('project')
+        row = connection.execute('SELECT * FROM projects WHERE key = ? OR name = ?', (key, key)).fetchone()
+        if row is None:
+            raise BambooEmulatorError(str.format('Project {0} not found.', key))
+        plans = connection.execute('SELECT COUNT(*) FROM plans WHERE project = ?', (row['key'],)).fetchone()[0]
+        return _details(('Key', row['key']), ('Name', row['name']), ('Description', row['description']),
+                        ('Plans', plans))
+
+    def action_addStage(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        name = options.get('stage')
+        if any(stage['name'] == name for stage in content['stages']):
+            raise BambooEmulatorError(str.format('Stage {0} already exists in plan {1}.', name, row['key']))
+        content['stages'].append(dict(name=name, description=options.get('description'),
+                                      manual=_flag(options.get('manual', False)), final=bool(options.get('final'))))
+        self._save(connection, row['key'], content)
+        context['plan'], context['stage'] = row['key'], name
+        return str.format('Stage {0} added to plan {1}.\n', name, row['key'])
+
+    def action_getStage(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        stage = self._stage(content, options.get('stage'))
+        return _details(('Name', stage['name']), ('Description', stage['description']), ('Manual', stage['manual']),
+                        ('Final', stage['final']),
+                        ('Jobs', sum(1 for job in content['jobs'] if job['stage'] == stage['name'])))
+
+    def action_getStageList(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        regex = self._regex(options)
+        stages = [(stage['name'], stage['description'], stage['manual'], stage['final'])
+                  for stage in content['stages'] if regex is None or regex.fullmatch(stage['name'])]
+        return self._list(options, 'stages', ['Name', 'Description', 'Manual', 'Final'], stages)
+
+    def action_removeStage(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        name = options.get('stage')
+        removed = [stage['name'] for stage in content['stages'] if name == '@all' or stage['name'] == name]
+        if not removed and not options.get('continue'):
+            raise BambooEmulatorError(str.format('Stage {0} not found.', name))
+        content['stages'] = [stage for stage in content['stages'] if stage['name'] not in removed]
+        content['jobs'] = [job for job in content['jobs'] if job['stage'] not in removed]
+        self._save(connection, row['key'], content)
+        return str.format('{0} stages removed from plan {1}.\n', len(removed), row['key'])
+
+    def action_addJob(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        stage = self._stage(content, options.get('stage'))
+        key = options.get('job')
+        if any(job['key'] == key for job in content['jobs']):
+            raise BambooEmulatorError(str.format('Job {0} already exists in plan {1}.', key, row['key']))
+        content['jobs'].append(dict(key=key, name=options.get('name') or key, stage=stage['name'],
+                                    description=options.get('description'), enabled=not options.get('disable'),
+                                    tasks=list(), requirements=list()))
+        self._save(connection, row['key'], content)
+        context['plan'], context['stage'], context['job'] = row['key'], stage['name'], key
+        return str.format('Job {0} added to stage {1} of plan {2}.\n', key, stage['name'], row['key'])
+
+    def action_getJob(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job = self._job(content, options.get('job'))
+        return _details(('Key', job['key']), ('Name', job['name']), ('Stage', job['stage']),
+                        ('Description', job['description']), ('Enabled', job['enabled']),
+                        ('Tasks', len(job['tasks'])), ('Requirements', len(job['requirements'])))
+
+    def action_getJobList(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        regex = self._regex(options)
+        jobs = [(job['key'], job['name'], job['stage'], job['description'], job['enabled'])
+                for job in content['jobs']
+                if (options.get('stage') in (None, '@all') or job['stage'] == options['stage']) and
+                (regex is None or regex.fullmatch(job['key']) or regex.fullmatch(job['name']))]
+        return self._list(options, 'jobs', ['Key', 'Name', 'Stage', 'Description', 'Enabled'], jobs)
+
+    def action_removeJob(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        try:
+            job = self._job(content, options.get('job'))
+        except BambooEmulatorError:
+            if options.get('continue'):
+                return str.format('Job {0} not found.\n', options.get('job'))
+            raise
+        content['jobs'].remove(job)
+        self._save(connection, row['key'], content)
+        return str.format('Job {0} removed from plan {1}.\n', job['key'], row['key'])
+
+    def _set_job_enabled(self, connection, options, enabled):
+        row, content = self._plan(connection, options.get('plan'))
+        if options.get('job') == '@all':
+            jobs = [job for job in content['jobs'] if options.get('stage') in (None, job['stage'])]
+        else:
+            jobs = [self._job(content, options.get('job'))]
+        for job in jobs:
+            job['enabled'] = enabled
+        self._save(connection, row['key'], content)
+        return str.format('{0} jobs {1} in plan {2}.\n', len(jobs), 'enabled' if enabled else 'disabled', row['key'])
+
+    def action_enableJob(self, connection, options, context):
+        return self._set_job_enabled(connection, options, True)
+
+    def action_disableJob(self, connection, options, context):
+        if options.get('job') is None and options.get('build'):
+            # BambooActions.disable_plan sends disableJob with the plan as build
+            return self._set_plan_enabled(connection, options['build'], False)
+        return self._set_job_enabled(connection, options, False)
+
+    def action_addTask(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job = self._job(content, options.get('job'))
+        if not options.get('taskKey'):
+            raise BambooEmulatorError('--taskKey is needed')
+        task_id = max([task['id'] for task in job['tasks']] or [0]) + 1
+        fields = list(options.get('field') or list())
+        for index in ('1', '2'):
+            if options.get('field' + index) is not None:
+                fields.append(str.format('{0}={1}', options['field' + index], options.get('value' + index, '')))
+        job['tasks'].append(dict(id=task_id, key=options['taskKey'], description=options.get('description'),
+                                 enabled=not options.get('disable'), final=bool(options.get('final')),
+                                 fields=fields + ([options['fields']] if options.get('fields') else [])))
+        self._save(connection, row['key'], content)
+        return str.format('Task {0} added to job {1} of plan {2}.\n', task_id, job['key'], row['key'])
+
+    def _tasks(self, content, options):
+        job = self._job(content, options.get('job'))
+        task = options.get('task', options.get('id'))
+        if task in (None, '@all'):
+            return job, list(job['tasks'])
+        tasks = [entry for entry in job['tasks'] if str(entry['id']) == str(task) or entry['description'] == task]
+        if not tasks:
+            raise BambooEmulatorError(str.format('Task {0} not found in job {1}.', task, job['key']))
+        return job, tasks
+
+    def action_getTask(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job, tasks = self._tasks(content, options)
+        return ''.join(_details(('Id', task['id']), ('Key', task['key']), ('Description', task['description']),
+                                ('Enabled', task['enabled']), ('Final', task['final']))
+                       for task in tasks)
+
+    def action_getTaskList(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job = self._job(content, options.get('job'))
+        tasks = [(task['id'], task['key'], task['description'], task['enabled'], task['final'])
+                 for task in job['tasks']]
+        return self._list(options, 'tasks', ['Id', 'Key', 'Description', 'Enabled', 'Final'], tasks)
+
+    def action_removeTask(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job, tasks = self._tasks(content, options)
+        job['tasks'] = [task for task in job['tasks'] if task not in tasks]
+        self._save(connection, row['key'], content)
+        return str.format('{0} tasks removed from job {1}.\n', len(tasks), job['key'])
+
+    def action_addRequirement(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job = self._job(content, options.get('job'))
+        requirement_id = max([requirement['id'] for requirement in job['requirements']] or [0]) + 1
+        job['requirements'].append(dict(id=requirement_id, key=options.get('requirement'),
+                                        type=options.get('type') or 'exists', value=options.get('value')))
+        self._save(connection, row['key'], content)
+        return str.format('Requirement {0} added to job {1}.\n', options.get('requirement'), job['key'])
+
+    def action_getRequirementList(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job = self._job(content, options.get('job'))
+        regex = self._regex(options)
+        requirements = [(requirement['id'], requirement['key'], requirement['type'], requirement['value'])
+                        for requirement in job['requirements'] if regex is None or regex.fullmatch(requirement['key'])]
+        return self._list(options, 'requirements', ['Id', 'Key', 'Type', 'Value'], requirements)
+
+    def action_removeRequirement(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        job = self._job(content, options.get('job'))
+        kept = [requirement for requirement in job['requirements']
+                if requirement['key'] != options.get('requirement') and str(requirement['id']) != options.get('id')]
+        if len(kept) == len(job['requirements']):
+            raise BambooEmulatorError(str.format('Requirement {0} not found.',
+                                                 options.get('requirement', options.get('id'))))
+        job['requirements'] = kept
+        self._save(connection, row['key'], content)
+        return str.format('Requirement removed from job {0}.\n', job['key'])
+
+    def action_addRepository(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        name = options.get('name')
+        existing = [repository for repository in content['repositories'] if repository['name'] == name]
+        if existing and not options.get('replace'):
+            if options.get('continue'):
+                return str.format('Repository {0} already exists.\n', name)
+            raise BambooEmulatorError(str.format('Repository {0} already exists in plan {1}.', name, row['key']))
+        content['repositories'] = [repository for repository in content['repositories'] if repository['name'] != name]
+        repository_id = max([repository['id'] for repository in content['repositories']] or [0]) + 1
+        content['repositories'].append(dict(id=repository_id, name=name, type=options.get('repositoryKey') or 'GIT'))
+        self._save(connection, row['key'], content)
+        return str.format('Repository {0} added to plan {1}.\n', name, row['key'])
+
+    def action_getRepositoryList(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        regex = self._regex(options)
+        repositories = [(repository['id'], repository['name'], repository['type'])
+                        for repository in content['repositories']
+                        if regex is None or regex.fullmatch(repository['name'])]
+        return self._list(options, 'repositories', ['Id', 'Name', 'Type'], repositories)
+
+    def action_addBranch(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        branch = options.get('branch')
+        if any(entry['name'] == branch for entry in content['branches']):
+            if options.get('continue'):
+                return str.format('Branch {0} already exists.\n', branch)
+            raise BambooEmulatorError(str.format('Branch {0} already exists in plan {1}.', branch, row['key']))
+        key = str.format('{0}{1}', row['key'], len(content['branches']) + 1)
+        content['branches'].append(dict(key=key, name=branch, description=options.get('description'),
+                                        enabled=_flag(options.get('enable', False))))
+        self._save(connection, row['key'], content)
+        return str.format('Branch {0} added to plan {1} with key {2}.\n', branch, row['key'], key)
+
+    def action_getBranchList(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        regex = self._regex(options)
+        branches = [(branch['key'], branch['name'], branch['description'], branch['enabled'])
+                    for branch in content['branches']
+                    if regex is None or regex.fullmatch(branch['key']) or regex.fullmatch(branch['name'])]
+        return self._list(options, 'branches', ['Key', 'Name', 'Description', 'Enabled'], branches)
+
+    def action_updateBranchingOptions(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan'))
+        for field in options.get('field') or list():
+            name, _, value = field.partition('=')
+            content['branching'][name] = value
+        for index in ('1', '2'):
+            if options.get('field' + index) is not None:
+                content['branching'][options['field' + index]] = options.get('value' + index)
+        self._save(connection, row['key'], content)
+        return str.format('Branching options updated for plan {0}.\n', row['key'])
+
+    # builds
+
+    def _schedule(self, connection, now):
+        # the build goes to the enabled agent which is free first, like a queue served in order
+        agent = connection.execute('SELECT name, free_at FROM agents WHERE enabled = 1 ORDER BY free_at, id '
+                                   'LIMIT 1').fetchone()
+        duration = self.build_duration * (1 + self.latency_jitter * self._draw())
+        started = max(now, agent['free_at']) if agent is not None else now
+        if agent is not None:
+            connection.execute('UPDATE agents SET free_at = ? WHERE name = ?', (started + duration, agent['name']))
+        return (agent['name'] if agent is not None else None), started, started + duration
+
+    def action_queueBuild(self, connection, options, context):
+        row, content = self._plan(connection, options.get('plan') or options.get('build'))
+        if not row['enabled']:
+            raise BambooEmulatorError(str.format('Plan {0} is disabled.', row['key']))
+        now = time.time()
+        number = row['next_number']
+        agent, started, completed = self._schedule(connection, now)
+        key = str.format('{0}-{1}', row['key'], number)
+        connection.execute('INSERT INTO builds (key, plan, number, queued, started, completed, outcome, agent) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           (key, row['key'], number, now, started, completed,
+                            'Failed' if self._draw() < self.failure_rate else 'Successful', agent))
+        connection.execute('UPDATE plans SET next_number = ? WHERE key = ?', (number + 1, row['key']))
+        if options.get('wait'):
+            context['wait'] = key
+        return str.format('Build {0} queued for plan {1}.\n', key, row['key'])
+
+    def _wait_build(self, key, options, sleep):
+        deadline = time.time() + float(options['timeout']) if options.get('timeout') else None
+        while True:
+            with self._transaction() as connection:
+                row = connection.execute('SELECT * FROM builds WHERE key = ?', (key,)).fetchone()
+            now = time.time()
+            state = self._build_state(row, now)
+            if row['completed'] is not None and now >= row['completed']:
+                break
+            if deadline is not None and now >= deadline:
+                raise BambooEmulatorError(str.format('Build {0} did not complete within {1} seconds, state {2}.',
+                                                     key, options['timeout'], state))
+            wait = row['completed'] - now
+            sleep(min(wait, deadline - now) if deadline is not None else wait)
+        if state != 'Successful' and not options.get('continue'):
+            raise BambooEmulatorError(str.format('Build {0} completed with state {1}.', key, state))
+        return str.format('Build {0} completed with state {1}.\n', key, state)
+
+    def _build(self, connection, options):
+        build = options.get('build') or options.get('plan') or ''
+        match = _BUILD_KEY.match(build)
+        if match is not None:
+            row = connection.execute('SELECT * FROM builds WHERE key = ?', (build,)).fetchone()
+        elif options.get('number') is not None:
+            row = connection.execute('SELECT * FROM builds WHERE plan = ? AND number = ?',
+                                     (build, int(options['number']))).fetchone()
+        else:
+            row = connection.execute('SELECT * FROM builds WHERE plan = ? ORDER BY number DESC LIMIT 1',
+                                     (build,)).fetchone()
+        if row is None:
+            raise BambooEmulatorError(str.format('Build {0} not found.', build))
+        return row
+
+    def action_getBuild(self, connection, options, context):
+        row = self._build(connection, options)
+        now = time.time()
+        state = self._build_state(row, now)
+        final = row['completed'] is not None and now >= row['completed']
+        return _details(('Build', row['key']), ('Plan', row['plan']), ('Number', row['number']), ('State', state),
+                        ('Life cycle state', 'Finished' if final else state),
+                        ('Queued', self._format_time(row['queued'], options)),
+                        ('Started', self._format_time(row['started'] if now >= row['started'] else None, options)),
+                        ('Completed', self._format_time(row['completed'] if final else None, options)),
+                        ('Duration', int(row['completed'] - row['started']) if final else None),
+                        ('Agent', row['agent']))
+
+    def _field_filters(self, options):
+        filters = list()
+        for field in options.get('field') or list():
+            name, _, value = field.partition('=')
+            filters.append((name, value))
+        for index in ('1', '2'):
+            if options.get('field' + index) is not None:
+                filters.append((options['field' + index], options.get('value' + index, '')))
+        return filters
+
+    def action_getBuildList(self, connection, options, context):
+        plan = options.get('plan')
+        self._plan(connection, plan)
+        now = time.time()
+        sql, parameters = 'SELECT * FROM builds WHERE plan = ?', [plan]
+        state_filter = None
+        for name, value in self._field_filters(options):
+            if name.lower() == 'state':
+                state_filter = re.sub(r'[^a-z]', '', value.lower())
+            elif name.lower() in ('started', 'startedafter'):
+                sql += ' AND started >= ?'
+                parameters.append(self._parse_time(value, options))
+            elif name.lower() == 'endedbefore':
+                sql += ' AND completed < ? AND completed <= ?'
+                parameters.extend([self._parse_time(value, options), now])
+            elif name.lower() == 'endedafter':
+                sql += ' AND completed > ? AND completed <= ?'
+                parameters.extend([self._parse_time(value, options), now])
+        builds = list()
+        for row in connection.execute(sql + ' ORDER BY number DESC', parameters):
+            state = self._build_state(row, now)
+            if state_filter is not None and re.sub(r'[^a-z]', '', state.lower()) != state_filter:
+                continue
+            final = row['completed'] is not None and now >= row['completed']
+            builds.append((row['key'], row['number'], state,
+                           self._format_time(row['started'] if now >= row['started'] else None, options),
+                           self._format_time(row['completed'] if final else None, options),
+                           int(row['completed'] - row['started']) if final else None, row['agent']))
+            if len(builds) >= int(options.get('limit') or DEFAULT_LIST_LIMIT):
+                break
+        return self._list(options, 'builds',
+                          ['Build', 'Number', 'State', 'Started', 'Completed', 'Duration', 'Agent'], builds)
+
+    def _log_lines(self, row, job, now):
+        generator = random.Random(str.format('{0}/{1}', row['key'], job))
+        final = row['completed'] is not None and now >= row['completed']
+        if now < row['started']:
+            return list()
+        end = row['completed'] if final else now
+        count = self.log_lines if final else min(int(self.log_lines * (end - row['started']) /
+                                                      max(row['completed'] - row['started'], 0.001)),
+                                                  self.log_lines - 1)
+        # a running build only appends lines, the lines already written never change
+        step = (row['completed'] - row['started']) / max(self.log_lines, 1)
+        lines = list()
+        for index in range(count):
+            timestamp = datetime.datetime.fromtimestamp(row['started'] + index * step).strftime(_LOG_TIME_FORMAT)
+            if index == 0:
+                detail = str.format('Build {0} started building on agent {1}', row['key'], row['agent'] or 'local')
+                lines.append(str.format('build\t{0}\t{1}', timestamp, detail))
+            elif index == self.log_lines - 1:
+                lines.append(str.format('build\t{0}\tFinished building {1} with result: {2}', timestamp,
+                                        row['key'], row['outcome']))
+            elif row['outcome'] == 'Failed' and index >= self.log_lines - 4:
+                lines.append(str.format('error\t{0}\t{1}', timestamp, generator.choice([
+                    str.format('ERROR: test_{0} failed', generator.randint(1, 500)),
+                    'java.lang.AssertionError: expected:<0> but was:<1>',
+                    'Caused by: java.io.IOException: Broken pipe',
+                    str.format('error: command exited with code {0}', generator.randint(1, 127))])))
+            else:
+                lines.append(str.format('simple\t{0}\t[{1}] step {2}: {3}', timestamp, job, index, generator.choice(
+                    ['compiling sources', 'running tests', 'resolving dependencies', 'packaging', 'uploading'])))
+        return lines
+
+    def action_getBuildLog(self, connection, options, context):
+        row = self._build(connection, options)
+        job = options.get('job')
+        if job is None:
+            _, content = self._plan(connection, row['plan'])
+            job = content['jobs'][0]['key'] if content['jobs'] else 'JOB1'
+        lines = self._log_lines(row, job, time.time())
+        regex = self._regex(options)
+        if regex is not None:
+            lines = [line for line in lines if regex.fullmatch(line.split('\t', 2)[2])]
+        if options.get('limit') is not None:
+            lines = lines[-int(options['limit']):] if int(options['limit']) else list()
+        return ''.join(line + '\n' for line in lines)
+
+    def action_restartBuild(self, connection, options, context):
+        row = self._build(connection, dict(plan=options.get('plan')))
+        now = time.time()
+        if row['completed'] is None or now < row['completed']:
+            raise BambooEmulatorError(str.format('Build {0} is still running.', row['key']))
+        agent, started, completed = self._schedule(connection, now)
+        connection.execute('UPDATE builds SET queued = ?, started = ?, completed = ?, outcome = ?, agent = ? '
+                           'WHERE key = ?', (now, started, completed, 'Failed' if self._draw() < self.failure_rate
+                                             else 'Successful', agent, row['key']))
+        if options.get('wait'):
+            context['wait'] = row['key']
+        return str.format('Build {0} restarted.\n', row['key'])
+
+    def action_stopBuild(self, connection, options, context):
+        self._plan(connection, options.get('plan'))
+        now = time.time()
+        rows = connection.execute('SELECT key, started FROM builds WHERE plan = ? AND completed > ?',
+                                  (options['plan'], now)).fetchall()
+        for row in rows:
+            connection.execute('UPDATE builds SET started = ?, completed = ?, outcome = ? WHERE key = ?',
+                               (min(row['started'], now), now, 'NotBuilt', row['key']))
+        return str.format('{0} builds of plan {1} stopped.\n', len(rows), options['plan'])
+
+    # agents
+
+    def _agent(self, connection, name):
+        row = connection.execute('SELECT * FROM agents WHERE name = ? OR CAST(id AS TEXT) = ?',
+                                 (name, name)).fetchone()
+        if row is None:
+            raise BambooEmulatorError(str.format('Agent {0} not found.', name))
+        return row
+
+    def action_getAgentList(self, connection, options, context):
+        now = time.time()
+        busy = set(row['agent'] for row in connection.execute(
+            'SELECT agent FROM builds WHERE agent IS NOT NULL AND completed > ? AND started <= ?', (now, now)))
+        agents = list()
+        for row in connection.execute('SELECT * FROM agents ORDER BY id'):
+            if (options.get('excludeDisabled') or options.get('exclude_disabled')) and not row['enabled']:
+                continue
+            if (options.get('excludeEnabled') or options.get('exclude_enabled')) and row['enabled']:
+                continue
+            agents.append((row['id'], row['name'], 'Remote', bool(row['enabled']), True, row['name'] in busy))
+        return self._list(options, 'agents', ['Id', 'Name', 'Type', 'Enabled', 'Online', 'Busy'], agents)
+
+    def _set_agent_enabled(self, connection, options, enabled):
+        row = self._agent(connection, options.get('agent'))
+        connection.execute('UPDATE agents SET enabled = ? WHERE name = ?', (int(enabled), row['name']))
+        return str.format('Agent {0} {1}.\n', row['name'], 'enabled' if enabled else 'disabled')
+
+    def action_enableAgent(self, connection, options, context):
+        return self._set_agent_enabled(connection, options, True)
+
+    def action_disableAgent(self, connection, options, context):
+        return self._set_agent_enabled(connection, options, False)
+
+    def action_getCapabilityList(self, connection, options, context):
+        row = self._agent(connection, options.get('agent'))
+        regex = self._regex(options)
+        capabilities = [(key, value) for key, value in sorted(json.loads(row['capabilities']).items())
+                        if regex is None or regex.fullmatch(key)]
+        return self._list(options, 'capabilities', ['Key', 'Value'], capabilities)
+
+    def action_getAgentAssignmentList(self, connection, options, context):
+        self._agent(connection, options.get('agent'))
+        return self._list(options, 'assignments', ['Type', 'Key', 'Name'], list())
+
+
+def _stop_sleep(deadline):
+    # sleeps a latency of the in-process emulator, interrupted by the deadline of the calling thread
+    def sleep(seconds):
+        if deadline is None:
+            time.sleep(seconds)
+            return
+        end = time.monotonic() + seconds
+        while not deadline.stopped():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, deadline.wait_interval() or remaining, CANCEL_POLL_INTERVAL))
+        raise _EmulatorStopped()
+    return sleep
+
+
+class _EmulatorStopped(Exception):
+    pass
+
+
+class EmulatedBambooActions(BambooActions):
+    """
+    BambooActions answered by a BambooEmulator in this process instead of acli processes. Batches, the cache,
+    coalescing, the policy, map and deadlines work unchanged, latencies are cut short by the deadline of the
+    calling thread. The session pool needs acli processes, point BambooActions at write_emulator_acli for it.
+    Arguments:
+        emulator: BambooEmulator answering the actions, a new in memory one by default. (Optional)
+        bamboo_project_name: Name of the bamboo project. (Optional)
+        acli_bamboo_server_name: server name passed like to acli. (Optional)
+    Examples:
+        bamboo = EmulatedBambooActions(BambooEmulator(startup_latency=1.5, action_latency=0.05))
+        with bamboo.batch():
+            bamboo.send_command(bamboo.create_plan, plan_name="EMU-NEW")
+            bamboo.send_command(bamboo.add_stage, stage="FIRST")
+    """
+    def __init__(self, emulator=None, bamboo_project_name='EMU', acli_bamboo_server_name='emulator'):
+        super(EmulatedBambooActions, self).__init__(bamboo_project_name, os.curdir, acli_bamboo_server_name,
+                                                    use_shell=False)
+        self.emulator = emulator if emulator is not None else BambooEmulator()
+
+    def execute_command(self, command, stderr=None):
+        """Runs an action command on the emulator and returns the reply, failing like subprocess.check_output"""
+        deadline = self.call_deadline()
+        if deadline is not None:
+            deadline.check(command)
+        argv = self.render_argv(command)[1:]
+        output, errors = io.StringIO(), io.StringIO()
+        try:
+            return_code = self.emulator.execute(argv, stdout=output, stderr=errors, sleep=_stop_sleep(deadline))
+        except _EmulatorStopped:
+            raise deadline.error(command, output.getvalue().encode('utf-8'))
+        reply = output.getvalue().encode('utf-8')
+        error_output = errors.getvalue().encode('utf-8')
+        if stderr == subprocess.STDOUT:
+            reply += error_output
+        elif stderr is None:
+            sys.stderr.write(errors.getvalue())
+        if return_code:
+            raise subprocess.CalledProcessError(return_code, argv, output=reply, stderr=error_output)
+        return reply
+
+    def open_command(self, command, **kwargs):
+        raise BambooException('the in-process emulator starts no acli processes, use write_emulator_acli')
+
+    def stream_command(self, function_name, **kwargs):
+        """Sends the action like BambooActions.stream_command and yields the reply line by line"""
+        try:
+            command = function_name(**kwargs)
+        except Exception as sender_exception:
+            raise BambooException(sender_exception)
+        try:
+            reply = self.execute_command(command)
+        except subprocess.CalledProcessError as process_error:
+            raise BambooException(process_error)
+        for line in reply.splitlines(True):
+            yield line
+
+
+def write_emulator_acli(directory, state_path, python=None, **config):
+    """
+    Writes an acli executable into the directory which runs the emulator on the sqlite state_path, so
+    BambooActions, sessions, the daemon and the benchmarks can be pointed at it like at a real ACLI installation.
+    The emulator arguments are written to emulator.json next to it. Returns the path of the executable.
+    Arguments:
+        directory: directory of the executable, created if needed. (Mandatory)
+        state_path: sqlite database of the emulated server. (Mandatory)
+        python: python interpreter running the emulator, the current one by default. (Optional)
+        config: BambooEmulator arguments like startup_latency or error_rate. (Optional)
+    Examples:
+        write_emulator_acli("/tmp/acli", "/tmp/acli/bamboo.db", startup_latency=1.0, action_latency=0.02)
+        BambooEmulator("/tmp/acli/bamboo.db").populate(plans=10000, agents=50)
+        bamboo = BambooActions("EMU0", "/tmp/acli", "emulator", use_shell=False)
+    """
+    os.makedirs(directory, exist_ok=True)
+    config_path = os.path.join(os.path.abspath(directory), 'emulator.json')
+    with open(config_path, 'w', encoding='utf-8') as config_file:
+        json.dump(dict(config, state_path=os.path.abspath(state_path)), config_file, indent=2, sort_keys=True)
+    python = python or sys.executable
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if os.sys.platform.startswith('win'):
+        path = os.path.join(directory, 'acli.bat')
+        script = str.format('@echo off\r\nset {0}={1}\r\nset PYTHONPATH={2};%PYTHONPATH%\r\n'
+                            '"{3}" -m atlassian_bamboo_cli.BambooEmulator %*\r\n',
+                            EMULATOR_CONFIG_VARIABLE, config_path, package_root, python)
+    else:
+        path = os.path.join(directory, 'acli')
+        script = str.format('#!/bin/sh\n{0}={1}\nPYTHONPATH={2}${{PYTHONPATH:+:$PYTHONPATH}}\n'
+                            'export {0} PYTHONPATH\nexec {3} -m atlassian_bamboo_cli.BambooEmulator "$@"\n',
+                            EMULATOR_CONFIG_VARIABLE, shlex.quote(config_path), shlex.quote(package_root),
+                            shlex.quote(python))
+    with open(path, 'w', encoding='utf-8') as script_file:
+        script_file.write(script)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def main(args=None):
+    """Runs one emulated acli process with the config of BAMBOO_EMULATOR_CONFIG, see write_emulator_acli"""
+    config_path = os.environ.get(EMULATOR_CONFIG_VARIABLE)
+    if not config_path:
+        sys.stderr.write(str.format('Error: {0} is not set, see write_emulator_acli\n', EMULATOR_CONFIG_VARIABLE))
+        return ERROR_EXIT_CODE
+    with open(config_path, 'r', encoding='utf-8') as config_file:
+        config = json.load(config_file)
+    emulator = BambooEmulator(**config)
+    try:
+        return emulator.execute(sys.argv[1:] if args is None else args, stdin=sys.stdin)
+    finally:
+        emulator.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# !/usr/bin/env python
+# title           : BambooForensics.py
+# description     : Harvests the error lines of the logs of the failed builds of many plans. Failed builds, job
+#                   logs and report writing run as concurrent pipeline stages with bounded queues in between, and
+#                   a checkpoint file lets an interrupted harvest continue where it stopped.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : BambooFailureHarvester(bamboo, "forensics").run(["XXX-DEF", "XXX-GHI"])
+# notes           : every failed build gets one gzip report, written completely before it is checkpointed.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import collections
+import gzip
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+from .BambooLog import iter_build_log
+from .BambooParser import first_value, iter_builds, iter_partitioned
+
+# log lines worth reading for a failure, selected by acli before they are sent
+DEFAULT_ERROR_REGEX = r'.*(?:ERROR|Error|Exception|FAIL|error:|fatal|Caused by).*'
+CHECKPOINT_NAME = 'harvest.checkpoint'
+
+_JobLog = collections.namedtuple('_JobLog', ['build', 'job', 'jobs', 'entries', 'error'])
+_LogTask = collections.namedtuple('_LogTask', ['build', 'job', 'jobs'])
+# end of a stage, one per worker of the stage
+_DONE = None
+
+
+class BambooFailureHarvester(object):
+    """
+    Collects the error context of the failed builds of plans into one gzip text report per build. The stages
+    run on their own threads: plan workers list the failed builds and the jobs of a plan, log workers read the
+    selected lines of each job log, and the calling thread writes the reports. The queues between the stages
+    are bounded, so a slow stage holds back the ones before it instead of piling up logs in memory. Only the
+    lines matching regex are sent by acli, and only the last limit of them per job log.
+    Builds with a report in the checkpoint are skipped, a build whose logs could not all be read is not
+    checkpointed and is read again by the next run.
+    Arguments:
+        actions: BambooActions instance used for sending the actions.
+        output_directory: directory of the reports and the checkpoint, created if needed.
+        regex: regex selecting the log lines of a job log. (Optional)
+        limit: number of selected lines kept per job log, the last ones. (Optional)
+        builds_per_plan: number of latest failed builds harvested per plan. (Optional)
+        since: only harvest builds started after this datetime. (Optional)
+        plan_workers: number of plans read at the same time. (Optional)
+        log_workers: number of job logs read at the same time. (Optional)
+        queue_size: capacity of the queues between the stages. (Optional)
+    Examples:
+        harvester = BambooFailureHarvester(bamboo, "forensics", since=datetime.datetime(2026, 10, 17, 18, 0))
+        stats = harvester.run(plan.key for plan in iter_partitioned(bamboo, bamboo.get_plan_list,
+                                                                    project_name="XXX"))
+        print(stats["reports"], stats["failed"])
+    """
+    def __init__(self, actions, output_directory, regex=DEFAULT_ERROR_REGEX, limit=200, builds_per_plan=25,
+                 since=None, plan_workers=4, log_workers=8, queue_size=64):
+        self.actions = actions
+        self.output_directory = output_directory
+        self.regex = regex
+        self.limit = limit
+        self.builds_per_plan = builds_per_plan
+        self.since = since
+        self.plan_workers = plan_workers
+        self.log_workers = log_workers
+        self.queue_size = queue_size
+        self.checkpoint_path = os.path.join(output_directory, CHECKPOINT_NAME)
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        os.makedirs(output_directory, exist_ok=True)
+
+    def report_path(self, build):
+        return os.path.join(self.output_directory, str.format('{0}.log.gz', build))
+
+    def harvested(self):
+        """Returns the dict of the checkpointed builds to their checkpoint entry"""
+        builds = dict()
+        if not os.path.exists(self.checkpoint_path):
+            return builds
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line of an interrupted run can be cut off
+                    continue
+                if os.path.exists(self.report_path(entry['build'])):
+                    builds[entry['build']] = entry
+        return builds
+
+    def _read_plan(self, plan, done, log_queue, stats):
+        # every job of the plan, a job left out would never be harvested once the build is checkpointed
+        jobs = [first_value(record, 'key', 'job')
+                for record in iter_partitioned(self.actions, self.actions.get_job_list, plan_name=plan)]
+        jobs = [job for job in jobs if job is not None] or [None]
+        builds = iter_builds(self.actions, plan, window=self.builds_per_plan, started_after=self.since,
+                             field='state=FAILED', columns='build,state,started,completed')
+        for record in itertools.islice(builds, self.builds_per_plan):
+            build = first_value(record, 'build', 'key')
+            if build is None or build in done:
+                with self.lock:
+                    stats['skipped'] += build is not None
+                continue
+            with self.lock:
+                stats['builds'] += 1
+            for job in jobs:
+                if self.stop.is_set():
+                    return
+                log_queue.put(_LogTask(build, job, len(jobs)))
+
+    def _plan_worker(self, plans, done, log_queue, stats):
+        while not self.stop.is_set():
+            try:
+                plan = plans.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._read_plan(plan, done, log_queue, stats)
+            except Exception as plan_exception:
+                with self.lock:
+                    stats['failed'][plan] = plan_exception
+
+    def _log_worker(self, log_queue, report_queue):
+        while True:
+            task = log_queue.get()
+            if task is _DONE:
+                report_queue.put(_DONE)
+                return
+            if self.stop.is_set():
+                continue
+            try:
+                entries = list(iter_build_log(self.actions, task.build, job=task.job, regex=self.regex,
+                                              limit=self.limit))
+                report_queue.put(_JobLog(task.build, task.job, task.jobs, entries, None))
+            except Exception as log_exception:
+                report_queue.put(_JobLog(task.build, task.job, task.jobs, None, log_exception))
+
+    def _write_report(self, build, job_logs):
+        path = self.report_path(build)
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as report:
+            report.write(str.format('Build: {0}\n', build))
+            for job_log in sorted(job_logs, key=lambda job_log: job_log.job or ''):
+                report.write(str.format('\nJob: {0} ({1} lines)\n', job_log.job or '-', len(job_log.entries)))
+                for entry in job_log.entries:
+                    report.write(str.format('{0}\t{1}\t{2}\n', entry.type, entry.timestamp, entry.detail))
+        os.replace(path + '.tmp', path)
+        return path
+
+    def _checkpoint(self, checkpoint_file, build, job_logs):
+        entry = dict(build=build, jobs=len(job_logs), lines=sum(len(job_log.entries) for job_log in job_logs),
+                     harvested=time.time())
+        checkpoint_file.write(json.dumps(entry, sort_keys=True) + '\n')
+        checkpoint_file.flush()
+
+    def run(self, plans):
+        """
+        Harvests the failed builds of the plans and returns a dict with the number of builds harvested, the
+        builds skipped as already harvested, the reports written, and the plans or builds which failed with
+        their exception.
+        """
+        self.stop.clear()
+        stats = dict(builds=0, skipped=0, reports=0, failed=dict())
+        done = self.harvested()
+        plan_queue = queue.Queue()
+        for plan in plans:
+            plan_queue.put(plan)
+        log_queue = queue.Queue(maxsize=self.queue_size)
+        report_queue = queue.Queue(maxsize=self.queue_size)
+
+        plan_threads = [threading.Thread(target=self._plan_worker, args=(plan_queue, done, log_queue, stats),
+                                         name='bamboo-harvest-plan') for _ in range(self.plan_workers)]
+        log_threads = [threading.Thread(target=self._log_worker, args=(log_queue, report_queue),
+                                        name='bamboo-harvest-log') for _ in range(self.log_workers)]
+
+        def finish_plans():
+            for thread in plan_threads:
+                thread.join()
+            for _ in log_threads:
+                log_queue.put(_DONE)
+
+        coordinator = threading.Thread(target=finish_plans, name='bamboo-harvest-coordinator')
+        for thread in plan_threads + log_threads + [coordinator]:
+            thread.daemon = True
+            thread.start()
+
+        pending = collections.defaultdict(list)
+        running = len(log_threads)
+        try:
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as checkpoint_file:
+                while running:
+                    job_log = report_queue.get()
+                    if job_log is _DONE:
+                        running -= 1
+                        continue
+                    job_logs = pending[job_log.build]
+                    job_logs.append(job_log)
+                    if len(job_logs) < job_log.jobs:
+                        continue
+                    del pending[job_log.build]
+                    errors = [log for log in job_logs if log.error is not None]
+                    if errors:
+                        stats['failed'][job_log.build] = errors[0].error
+                        continue
+                    self._write_report(job_log.build, job_logs)
+                    self._checkpoint(checkpoint_file, job_log.build, job_logs)
+                    stats['reports'] += 1
+        finally:
+            # unblocks the stages, the logs read after an interruption are dropped
+            self.stop.set()
+            while running:
+                if report_queue.get() is _DONE:
+                    running -= 1
+            coordinator.join()
+        return stats
@@ -0,0 +1,219 @@
+# !/usr/bin/env python
+# title           : BambooHistory.py
+# description     : Local sqlite store of the build results of plans, synced incrementally from getBuildList so
+#                   reports on durations, states and counts run locally instead of through ACLI.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : history = BambooBuildHistory(bamboo, "builds.db"); history.sync("XXX-DEF")
+# notes           : timestamps are stored as ISO 8601 text in UTC, so they sort and compare in sql.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import concurrent.futures
+import datetime
+import sqlite3
+import threading
+import time
+
+from .BambooParser import BuildRecord, BuildState, DEFAULT_DATE_FORMAT, iter_builds, parse_build_details
+
+HISTORY_COLUMNS = 'build,number,state,started,completed,duration'
+
+HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS builds (
+    build TEXT PRIMARY KEY,
+    plan TEXT NOT NULL,
+    number INTEGER,
+    state TEXT,
+    started TEXT,
+    completed TEXT,
+    duration INTEGER,
+    final INTEGER NOT NULL DEFAULT 0,
+    synced REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS builds_plan_started ON builds (plan, started);
+CREATE INDEX IF NOT EXISTS builds_open ON builds (final) WHERE final = 0;
+CREATE TABLE IF NOT EXISTS watermarks (
+    plan TEXT PRIMARY KEY,
+    started TEXT,
+    synced REAL NOT NULL
+);
+'''
+
+
+def _utc_text(value):
+    # builds started in different offsets only sort by their text once they are all in UTC, a naive datetime is
+    # taken as local time
+    if isinstance(value, datetime.datetime):
+        return value.astimezone(datetime.timezone.utc).isoformat()
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class BambooBuildHistory(object):
+    """
+    Keeps the build results of plans in a sqlite database. Every plan has a watermark, the start time of the
+    newest build stored, and a sync only asks getBuildList for the builds started since the watermark. Builds
+    which were not in a final state yet are checked again on every sync until they are.
+    Arguments:
+        actions: BambooActions instance used for sending the actions.
+        database_path: path of the sqlite database file, ":memory:" keeps it in memory.
+        limit: number of builds read per action and stored per transaction, see iter_builds. (Optional)
+    Examples:
+        history = BambooBuildHistory(bamboo, "builds.db")
+        history.sync_all(["XXX-DEF", "XXX-GHI"], max_workers=4)
+        history.state_counts("XXX-DEF")
+        history.duration_stats("XXX-DEF", since="2026-10-01")
+    """
+    def __init__(self, actions, database_path, limit=500):
+        self.actions = actions
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.executescript(HISTORY_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def watermark(self, plan_name):
+        """Returns the start time of the newest stored build of the plan as ISO text, or None"""
+        with self.lock:
+            row = self.connection.execute('SELECT started FROM watermarks WHERE plan = ?', (plan_name,)).fetchone()
+        return row['started'] if row else None
+
+    def _fetch_new_builds(self, plan_name, watermark):
+        return iter_builds(self.actions, plan_name, window=self.limit, started_after=watermark, columns=HISTORY_COLUMNS)
+
+    def _store(self, plan_name, records):
+        rows = list()
+        for record in records:
+            state = getattr(record, 'state', None)
+            started = getattr(record, 'started', None)
+            completed = getattr(record, 'completed', None)
+            rows.append((record.build, plan_name, getattr(record, 'number', None),
+                         state.name if isinstance(state, BuildState) else state,
+                         _utc_text(started), _utc_text(completed),
+                         getattr(record, 'duration', None),
+                         1 if isinstance(state, BuildState) and state.final else 0, time.time()))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO builds (build, plan, number, state, started, completed, duration, final, synced) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(build) DO UPDATE SET number = excluded.number, '
+                'state = excluded.state, started = excluded.started, completed = excluded.completed, '
+                'duration = excluded.duration, final = excluded.final, synced = excluded.synced', rows)
+        return len(rows)
+
+    def _read_build(self, build):
+        # getBuild prints the fields getBuildList has as HISTORY_COLUMNS
+        return parse_build_details(self.actions.send_command(self.actions.get_build, build=build,
+                                                             date_format=DEFAULT_DATE_FORMAT),
+                                   HISTORY_COLUMNS.split(','))
+
+    def _recheck_open_builds(self, plan_name):
+        with self.lock:
+            builds = [row['build'] for row in self.connection.execute(
+                'SELECT build FROM builds WHERE plan = ? AND final = 0', (plan_name,))]
+        records = list()
+        for build in builds:
+            record = self._read_build(build)
+            if isinstance(record.state, BuildState):
+                record.build = record.build or build
+                records.append(record)
+        self._store(plan_name, records)
+        return len(builds)
+
+    def sync(self, plan_name):
+        """
+        Fetches the builds of the plan started since its watermark, upserts them and moves the watermark. Stored
+        builds which were not final are checked again. Returns the number of builds fetched.
+        """
+        watermark = self._watermark_timestamp(plan_name)
+        self._recheck_open_builds(plan_name)
+        count, newest, records = 0, watermark, list()
+        for record in self._fetch_new_builds(plan_name, watermark):
+            if not isinstance(record, BuildRecord) or not getattr(record, 'build', None):
+                continue
+            records.append(record)
+            started = getattr(record, 'started', None)
+            if isinstance(started, datetime.datetime):
+                started = started.astimezone(datetime.timezone.utc)
+                newest = started if newest is None else max(newest, started)
+            if len(records) >= self.limit:
+                count += self._store(plan_name, records)
+                records = list()
+        count += self._store(plan_name, records)
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO watermarks (plan, started, synced) VALUES (?, ?, ?) ON CONFLICT(plan) DO UPDATE '
+                'SET started = excluded.started, synced = excluded.synced',
+                (plan_name, _utc_text(newest) if newest is not None else None, time.time()))
+        return count
+
+    def _watermark_timestamp(self, plan_name):
+        watermark = self.watermark(plan_name)
+        return datetime.datetime.fromisoformat(watermark).astimezone(datetime.timezone.utc) if watermark else None
+
+    def sync_all(self, plan_names, max_workers=4):
+        """
+        Syncs several plans on a pool of threads. Returns a dict of plan to the number of builds fetched, or to
+        the exception its sync failed with.
+        """
+        results = dict()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict((executor.submit(self.sync, plan_name), plan_name) for plan_name in plan_names)
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                results[futures[future]] = error if error is not None else future.result()
+        return results
+
+    def _query(self, sql, parameters):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def _filters(plan_name, since, until=None):
+        conditions, parameters = list(), list()
+        for condition, value in (('plan = ?', plan_name), ('started >= ?', since), ('started < ?', until)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(_utc_text(value))
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', parameters
+
+    def builds(self, plan_name=None, state=None, since=None, limit=None):
+        """Returns the stored builds, newest first, as sqlite3.Row objects"""
+        where, parameters = self._filters(plan_name, since)
+        if state is not None:
+            where += (' AND ' if where else ' WHERE ') + 'state = ?'
+            parameters.append(state.name if isinstance(state, BuildState) else state)
+        sql = 'SELECT * FROM builds' + where + ' ORDER BY started DESC'
+        if limit is not None:
+            sql += str.format(' LIMIT {0:d}', limit)
+        return self._query(sql, parameters)
+
+    def state_counts(self, plan_name=None, since=None, until=None):
+        """Returns a dict of state name to the number of builds in that state"""
+        where, parameters = self._filters(plan_name, since, until)
+        rows = self._query('SELECT state, COUNT(*) AS count FROM builds' + where + ' GROUP BY state', parameters)
+        return dict((row['state'], row['count']) for row in rows)
+
+    def build_count(self, plan_name=None, since=None, until=None):
+        where, parameters = self._filters(plan_name, since, until)
+        return self._query('SELECT COUNT(*) AS count FROM builds' + where, parameters)[0]['count']
+
+    def durations(self, plan_name=None, since=None, until=None):
+        """Returns the durations of the final builds, oldest first"""
+        where, parameters = self._filters(plan_name, since, until)
+        where += (' AND ' if where else ' WHERE ') + 'final = 1 AND duration IS NOT NULL'
+        return [row['duration'] for row in self._query(
+            'SELECT duration FROM builds' + where + ' ORDER BY started', parameters)]
+
+    def duration_stats(self, plan_name=None, since=None, until=None):
+        """Returns a dict with count, average, min and max duration of the final builds"""
+        where, parameters = self._filters(plan_name, since, until)
+        where += (' AND ' if where else ' WHERE ') + 'final = 1 AND duration IS NOT NULL'
+        row = self._query('SELECT COUNT(duration) AS count, AVG(duration) AS average, MIN(duration) AS min, '
+                          'MAX(duration) AS max FROM builds' + where, parameters)[0]
+        return dict(row)
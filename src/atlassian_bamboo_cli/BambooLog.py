@@ -0,0 +1,184 @@
+# !/usr/bin/env python
+# title           : BambooLog.py
+# description     : Reads build logs from the getBuildLog action line by line while acli is still writing them,
+#                   so log scraping runs in constant memory and can stop without reading the rest of the log.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : for entry in iter_build_log(bamboo, build="XXX-DEF-232", job="JOB1"): print(entry.detail)
+# notes           : log lines have 3 tab separated columns with type, timestamp, and detail elements.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import collections
+import datetime
+import itertools
+import time
+
+from .BambooParser import get_build_state
+
+# number of the last yielded log entries a new log tail is checked against
+FOLLOW_OVERLAP = 5
+# timestamp of the log entries, like 30-Mar-2020 08:25:39
+LOG_TIMESTAMP_FORMAT = '%d-%b-%Y %H:%M:%S'
+
+BambooLogEntry = collections.namedtuple('BambooLogEntry', ['type', 'timestamp', 'detail'])
+
+
+def parse_log_line(line, encoding='utf-8'):
+    """
+    Splits a build log line into a BambooLogEntry. Returns None for lines which are not log entries, like the
+    empty line at the end of the reply.
+    Examples:
+        parse_log_line(b"build\\t30-Mar-2020 08:25:39\\tBuild ZCLI-X-3 started") returns
+            BambooLogEntry(type='build', timestamp='30-Mar-2020 08:25:39', detail='Build ZCLI-X-3 started')
+    """
+    if isinstance(line, bytes):
+        line = line.decode(encoding, 'replace')
+    columns = line.rstrip('\r\n').split('\t', 2)
+    if len(columns) < 3:
+        return None
+    return BambooLogEntry(*columns)
+
+
+def parse_log_timestamp(entry):
+    """Returns the timestamp of a BambooLogEntry as a datetime, or None when it is not in LOG_TIMESTAMP_FORMAT"""
+    try:
+        return datetime.datetime.strptime(entry.timestamp, LOG_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def iter_build_log(actions, build, job=None, encoding='utf-8', **kwargs):
+    """
+    Streams the log of a build job and yields a BambooLogEntry per log line. The next line is only read from
+    acli when the consumer asks for it, leaving the loop early stops acli.
+    Arguments:
+        actions: BambooActions instance used for sending the action. (Mandatory)
+        build: name/id of the build. Type string. (Mandatory)
+        job: name/id of the job. Type string. (Optional)
+        encoding: encoding of the log. (Optional)
+        kwargs: other get_build_log arguments like number, limit or regex. (Optional)
+    Examples:
+        for entry in iter_build_log(bamboo, build="XXX-DEF-232", job="JOB1", regex="ERROR"):
+            if "OutOfMemoryError" in entry.detail:
+                break
+    """
+    for line in actions.stream_command(actions.get_build_log, build=build, job=job, **kwargs):
+        entry = parse_log_line(line, encoding)
+        if entry is not None:
+            yield entry
+
+
+class _LogPosition(object):
+    # what follow_build_log yielded so far: the number of entries, the last ones, and how many of them share
+    # the timestamp of the last one
+    def __init__(self):
+        self.count = 0
+        self.seen = collections.deque(maxlen=FOLLOW_OVERLAP)
+        self.time = None
+        self.same_time = 0
+
+    def add(self, entry):
+        timestamp = parse_log_timestamp(entry)
+        if timestamp is not None and timestamp == self.time:
+            self.same_time += 1
+        else:
+            self.time, self.same_time = timestamp, 1
+        self.seen.append(entry)
+        self.count += 1
+
+    def resume(self, tail, whole):
+        # position of the first entry not yielded yet in a tail of the log, None when the tail does not tell
+        if whole:
+            position = self.count
+        else:
+            # a cut tail tells it once it reaches back before the second of the last yielded entry, the first
+            # same_time entries of that second were yielded already
+            times = [parse_log_timestamp(entry) for entry in tail]
+            if self.time is None or not times or None in times or times[0] >= self.time:
+                return None
+            position = sum(1 for timestamp in times if timestamp < self.time) + self.same_time
+        overlap = min(len(self.seen), position)
+        if position > len(tail) or tail[position - overlap:position] != list(self.seen)[len(self.seen) - overlap:]:
+            return None
+        return position
+
+
+def _iter_new_entries(actions, build, job, position, window, max_window, encoding, kwargs):
+    size = window
+    while size <= max_window:
+        tail = list(iter_build_log(actions, build, job, encoding, limit=size, **kwargs))
+        # a tail shorter than the window is the whole log
+        start = position.resume(tail, len(tail) < size)
+        if start is not None:
+            for entry in tail[start:]:
+                yield entry
+            return
+        if len(tail) < size:
+            break
+        size *= 2
+    # skip exactly the entries already yielded while streaming the whole log
+    for entry in itertools.islice(iter_build_log(actions, build, job, encoding, **kwargs), position.count, None):
+        yield entry
+
+
+def follow_build_log(actions, build, job=None, window=200, max_window=5000, min_interval=2.0, max_interval=60.0,
+                     backoff=2.0, timeout=None, encoding='utf-8', **kwargs):
+    """
+    Follows the log of a running build like tail -f. The existing log is streamed first, afterwards every poll
+    only asks for the last window log lines. When the tail holds the whole log the new entries start after the
+    number of entries yielded so far. A cut tail which reaches back before the timestamp of the last yielded entry
+    continues after the entries of that second yielded so far, so repeated lines like heartbeats are not taken
+    for ones already seen. The last yielded entries only check that the log continues them. Otherwise the window
+    grows up to max_window, and then the whole log is streamed again skipping the entries yielded so far. Polls
+    happen every min_interval seconds while the log grows and back off up to max_interval while it is idle.
+    Following stops once the build reached a final state and its remaining lines were yielded, or when the
+    timeout elapsed.
+    Arguments:
+        actions: BambooActions instance used for sending the actions. (Mandatory)
+        build: build key with the build number, like XXX-DEF-232. (Mandatory)
+        job: name/id of the job. Type string. (Optional)
+        window: number of log lines fetched per poll. (Optional)
+        max_window: largest number of log lines fetched per poll before falling back to the whole log. (Optional)
+        min_interval: seconds between polls while new lines arrive. (Optional)
+        max_interval: longest number of seconds between polls while the log is idle. (Optional)
+        backoff: factor the interval grows with after a poll without new lines. (Optional)
+        timeout: seconds after which following stops even if the build is still running. (Optional)
+        encoding: encoding of the log. (Optional)
+        kwargs: other get_build_log arguments like regex. (Optional)
+    Examples:
+        for entry in follow_build_log(bamboo, build="ZLONGRUNNING-AA-12", job="JOB1", max_interval=30):
+            print(entry.timestamp, entry.detail)
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    position = _LogPosition()
+    for entry in iter_build_log(actions, build, job, encoding, **kwargs):
+        position.add(entry)
+        yield entry
+
+    interval = min_interval
+    poll_window = window
+    finished = False
+    while True:
+        previous_count = position.count
+        for entry in _iter_new_entries(actions, build, job, position, poll_window, max_window, encoding, kwargs):
+            position.add(entry)
+            yield entry
+        if finished:
+            return
+        # size the next window after the amount of output since the last poll
+        poll_window = min(max(window, 2 * (position.count - previous_count)), max_window)
+        if position.count > previous_count:
+            interval = min_interval
+        else:
+            state = get_build_state(actions, build)
+            # one more poll picks up the lines written between the last poll and the end of the build
+            finished = state is not None and state.final
+            if finished:
+                continue
+            interval = min(interval * backoff, max_interval)
+        if deadline is not None and time.time() + interval > deadline:
+            return
+        time.sleep(interval)
@@ -0,0 +1,311 @@
+# !/usr/bin/env python
+# title           : BambooLogArchive.py
+# description     : Local archive of build logs. Logs read with getBuildLog are stored as compressed chunks in a
+#                   sqlite database together with a trigram index, so searches across thousands of builds only
+#                   decompress and scan the chunks which can contain a match.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : archive = BambooLogArchive(bamboo, "logs.db"); archive.archive("XXX-DEF-232", job="JOB1")
+# notes           : the index is case insensitive, the regex of a search decides the actual matches.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import collections
+import concurrent.futures
+import functools
+import gzip
+import lzma
+import re
+import sqlite3
+import threading
+import time
+
+from .BambooCLI import BambooException
+from .BambooLog import parse_log_line
+
+BambooLogMatch = collections.namedtuple('BambooLogMatch', ['build', 'job', 'line_number', 'entry'])
+
+ARCHIVE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS logs (
+    build TEXT NOT NULL,
+    job TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    archived REAL NOT NULL,
+    PRIMARY KEY (build, job)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    build TEXT NOT NULL,
+    job TEXT NOT NULL,
+    first_line INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_build ON chunks (build, job);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    PRIMARY KEY (gram, chunk)
+) WITHOUT ROWID;
+'''
+
+# low presets compress log text almost as well as the defaults at a fraction of the time
+CODECS = {'lzma': (functools.partial(lzma.compress, preset=1), lzma.decompress),
+          'gzip': (functools.partial(gzip.compress, compresslevel=6), gzip.decompress)}
+
+# characters which end a literal run in a regex, the run can not be required past them
+_REGEX_BREAKS = '.^$[]()|'
+_REGEX_OPTIONAL = '*?{'
+# escapes followed by a fixed number of hex digits
+_REGEX_HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+# values per IN list, sqlite limits the number of parameters of a statement to 999 before version 3.32
+_MAX_PARAMETERS = 400
+
+
+def trigrams(text):
+    """Returns the set of lower case 3 character substrings of the text"""
+    text = text.lower()
+    # zip builds the character triples in C, only the distinct ones are joined back into strings
+    return set(map(''.join, set(zip(text, text[1:], text[2:]))))
+
+
+def regex_literals(pattern):
+    """
+    Returns literal strings every match of the regex has to contain, which is conservative: patterns with
+    alternations give none, and groups, classes and optional characters end a literal run.
+    Examples:
+        regex_literals(r"OutOfMemoryError: .* heap") returns ["OutOfMemoryError: ", " heap"]
+    """
+    if '|' in pattern:
+        return list()
+    literals, run = list(), list()
+    index, depth = 0, 0
+    while index < len(pattern):
+        character = pattern[index]
+        index += 1
+        if character == '\\' and index < len(pattern):
+            start = index
+            escaped = pattern[index]
+            index += 1
+            if escaped.isalnum():
+                # classes like \d or \w, references and character codes, none of them taken as literal text
+                if escaped in _REGEX_HEX_ESCAPES:
+                    index += _REGEX_HEX_ESCAPES[escaped]
+                elif escaped == 'N' and pattern[index:index + 1] == '{':
+                    index = pattern.find('}', index) + 1 or len(pattern)
+                elif escaped == '0':
+                    while index < len(pattern) and pattern[index] in '01234567' and index < start + 3:
+                        index += 1
+                elif escaped.isdigit():
+                    while index < len(pattern) and pattern[index].isdigit():
+                        index += 1
+                literals.append(''.join(run))
+                run = list()
+                continue
+            character = escaped
+        elif character in _REGEX_BREAKS:
+            if character == '(':
+                depth += 1
+            elif character == ')':
+                depth -= 1
+            elif character == '[':
+                # skip the class, a ] right after the opening bracket belongs to it
+                index += 1 if pattern[index:index + 1] == ']' else 0
+                while index < len(pattern) and pattern[index] != ']':
+                    index += 2 if pattern[index] == '\\' else 1
+                index += 1
+            literals.append(''.join(run))
+            run = list()
+            continue
+        elif character in _REGEX_OPTIONAL or character == '+':
+            # the quantified character may not be there at all, a + keeps it but ends the run
+            if character != '+' and run:
+                run.pop()
+            if character == '{':
+                while index < len(pattern) and pattern[index] != '}':
+                    index += 1
+                index += 1
+            literals.append(''.join(run))
+            run = list()
+            continue
+        if depth == 0:
+            run.append(character)
+    literals.append(''.join(run))
+    return [literal for literal in literals if literal]
+
+
+class BambooLogArchive(object):
+    """
+    Stores build logs as chunks of chunk_lines log lines, compressed with lzma or gzip, and indexes the lower case
+    trigrams of every chunk. A search takes the trigrams of a literal text, or of the literal runs every match of
+    a regex has to contain, looks up the chunks having all of them and only decompresses and scans those.
+    Logs are archived once per build and job, so pulling new builds only reads and indexes the new logs.
+    Arguments:
+        actions: BambooActions instance used for reading the logs.
+        database_path: path of the sqlite database file, ":memory:" keeps it in memory.
+        chunk_lines: number of log lines per compressed chunk. (Optional)
+        codec: lzma or gzip. (Optional)
+    Examples:
+        archive = BambooLogArchive(bamboo, "logs.db")
+        archive.archive_all([("XXX-DEF-232", "JOB1"), ("XXX-DEF-233", "JOB1")], max_workers=8)
+        for match in archive.search(r"OutOfMemoryError: .* heap", plan_name="XXX-DEF"):
+            print(match.build, match.line_number, match.entry.detail)
+    """
+    def __init__(self, actions, database_path, chunk_lines=1000, codec='lzma'):
+        if codec not in CODECS:
+            raise BambooException(str.format('{0} is not one of the codecs {1}', codec, sorted(CODECS)))
+        self.actions = actions
+        self.chunk_lines = chunk_lines
+        self.codec = codec
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript(ARCHIVE_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def contains(self, build, job=None):
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM logs WHERE build = ? AND job = ?',
+                                           (build, job or '')).fetchone() is not None
+
+    def _store_chunk(self, build, job, first_line, lines):
+        text = ''.join(lines)
+        data = CODECS[self.codec][0](text.encode('utf-8'))
+        grams = trigrams(text)
+        with self.lock, self.connection:
+            chunk = self.connection.execute(
+                'INSERT INTO chunks (build, job, first_line, codec, data) VALUES (?, ?, ?, ?, ?)',
+                (build, job, first_line, self.codec, data)).lastrowid
+            self.connection.executemany('INSERT OR IGNORE INTO grams (gram, chunk) VALUES (?, ?)',
+                                        ((gram, chunk) for gram in grams))
+
+    def remove(self, build, job=None):
+        """Drops the archived log of a build job"""
+        job = job or ''
+        with self.lock, self.connection:
+            # one pass over the index, it is keyed on the gram first
+            self.connection.execute('DELETE FROM grams WHERE chunk IN (SELECT id FROM chunks WHERE build = ? AND '
+                                    'job = ?)', (build, job))
+            self.connection.execute('DELETE FROM chunks WHERE build = ? AND job = ?', (build, job))
+            self.connection.execute('DELETE FROM logs WHERE build = ? AND job = ?', (build, job))
+
+    def archive(self, build, job=None, replace=False, encoding='utf-8'):
+        """
+        Streams the log of a build job into the archive chunk by chunk and returns its number of lines. A log
+        already archived is skipped unless replace is set, which re-reads it, like for a build still running.
+        """
+        if self.contains(build, job):
+            if not replace:
+                return None
+            self.remove(build, job)
+        job_key = job or ''
+        lines, first_line, count = list(), 0, 0
+        try:
+            for line in self.actions.stream_command(self.actions.get_build_log, build=build, job=job):
+                lines.append(line.decode(encoding, 'replace') if isinstance(line, bytes) else line)
+                count += 1
+                if len(lines) >= self.chunk_lines:
+                    self._store_chunk(build, job_key, first_line, lines)
+                    first_line, lines = count, list()
+            if lines:
+                self._store_chunk(build, job_key, first_line, lines)
+        except BaseException:
+            # a partly archived log would be skipped forever, so it is dropped
+            self.remove(build, job)
+            raise
+        with self.lock, self.connection:
+            self.connection.execute('INSERT INTO logs (build, job, lines, archived) VALUES (?, ?, ?, ?)',
+                                    (build, job_key, count, time.time()))
+        return count
+
+    def archive_all(self, builds, max_workers=4, replace=False):
+        """
+        Archives the logs of several builds on a pool of threads. builds holds build keys or (build, job) tuples.
+        Returns a dict of (build, job) to the number of lines archived, None for logs archived before, or to the
+        exception the log could not be read with.
+        """
+        keys = [tuple(build) if isinstance(build, (tuple, list)) else (build, None) for build in builds]
+        results = dict()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict((executor.submit(self.archive, build, job, replace), (build, job)) for build, job in keys)
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                results[futures[future]] = error if error is not None else future.result()
+        return results
+
+    def _chunk_ids(self, conditions, parameters):
+        where = (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        with self.lock:
+            return [row[0] for row in self.connection.execute(
+                'SELECT id FROM chunks' + where + ' ORDER BY build, job, first_line', parameters)]
+
+    def candidates(self, pattern, regex=True, plan_name=None, builds=None):
+        """Returns the ids of the chunks which can contain a match, in build and line order"""
+        literals = regex_literals(pattern) if regex else [pattern]
+        grams = set()
+        for literal in literals:
+            grams.update(trigrams(literal))
+        # the chunks having a part of the grams still include every chunk which can match
+        grams = sorted(grams)[:_MAX_PARAMETERS]
+        conditions, parameters = list(), list()
+        if plan_name is not None:
+            conditions.append('substr(build, 1, ?) = ?')
+            parameters.extend([len(plan_name) + 1, plan_name + '-'])
+        if grams:
+            conditions.append(str.format(
+                'id IN (SELECT chunk FROM grams WHERE gram IN ({0}) GROUP BY chunk HAVING COUNT(*) = ?)',
+                ', '.join('?' * len(grams))))
+            parameters.extend(grams)
+            parameters.append(len(grams))
+        if builds is None:
+            return self._chunk_ids(conditions, parameters)
+        # the builds are asked for in sorted slices, so the chunks of a slice all come after the previous ones
+        builds = sorted(set(builds))
+        chunk_ids = list()
+        for start in range(0, len(builds), _MAX_PARAMETERS):
+            part = builds[start:start + _MAX_PARAMETERS]
+            chunk_ids.extend(self._chunk_ids(conditions + [str.format('build IN ({0})', ', '.join('?' * len(part)))],
+                                             parameters + part))
+        return chunk_ids
+
+    def search(self, pattern, regex=True, flags=0, plan_name=None, builds=None, limit=None, encoding='utf-8'):
+        """
+        Yields a BambooLogMatch for every archived log line matching the pattern, a regex searched in the line,
+        or a literal text when regex is False.
+        Arguments:
+            pattern: regex or literal text to search for. (Mandatory)
+            regex: treat the pattern as a regex. (Optional)
+            flags: re flags like re.IGNORECASE. (Optional)
+            plan_name: only search the builds of this plan. (Optional)
+            builds: only search these build keys. (Optional)
+            limit: stop after this many matches. (Optional)
+        """
+        matcher = re.compile(pattern if regex else re.escape(pattern), flags)
+        found = 0
+        for chunk in self.candidates(pattern, regex=regex, plan_name=plan_name, builds=builds):
+            with self.lock:
+                row = self.connection.execute('SELECT build, job, first_line, codec, data FROM chunks WHERE id = ?',
+                                              (chunk,)).fetchone()
+            if row is None:
+                continue
+            build, job, first_line, codec, data = row
+            text = CODECS[codec][1](data).decode(encoding, 'replace')
+            for offset, line in enumerate(text.splitlines()):
+                if matcher.search(line):
+                    yield BambooLogMatch(build, job or None, first_line + offset, parse_log_line(line))
+                    found += 1
+                    if limit is not None and found >= limit:
+                        return
+
+    def stats(self):
+        """Returns a dict with the number of logs, lines, chunks, compressed bytes and index entries"""
+        with self.lock:
+            logs, lines = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(lines), 0) FROM logs').fetchone()
+            chunks, size = self.connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM chunks').fetchone()
+            grams = self.connection.execute('SELECT COUNT(*) FROM grams').fetchone()[0]
+        return dict(logs=logs, lines=lines, chunks=chunks, compressed_bytes=size, index_entries=grams)
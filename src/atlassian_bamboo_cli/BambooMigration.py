@@ -0,0 +1,203 @@
+# !/usr/bin/env python
+# title           : BambooMigration.py
+# description     : Migrates the plans of a project from one bamboo server to another. Every plan is read from the
+#                   source, compiled into the ordered add actions recreating it on the target and replayed there
+#                   as run actions, plans in parallel, with a journal so an interrupted migration resumes.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : BambooMigration(source, target, "migration.journal").migrate(project_name="XXX")
+# notes           : getTaskList does not list the task configuration, see the transform argument. Task keys
+#                   unknown to the BambooTasks of the target are added to it.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+from .BambooCLI import BambooException
+from .BambooParser import first_value, iter_partitioned
+from .BambooPlanSpec import diff_plan, fetch_plan_state
+
+JOURNAL_DONE = 'done'
+JOURNAL_FAILED = 'failed'
+
+
+def plan_spec_from_state(state, plan=None, project_name=None):
+    """
+    Turns a plan state read by fetch_plan_state into a plan spec recreating it, see load_plan_spec. The system
+    requirements are left out, bamboo adds them again for the tasks of a job.
+    Arguments:
+        state: plan state read from the source server. (Mandatory)
+        plan: key of the plan on the target, the source key by default. (Optional)
+        project_name: name of the project on the target, the source project name by default. (Optional)
+    """
+    details = state.get('details') or dict()
+    spec = dict(plan=plan or state['plan'], name=details.get('name') or state['plan'].split('-')[-1],
+                description=details.get('description'),
+                project_name=project_name or details.get('project_name') or details.get('project'),
+                repositories=[dict(name=repository) for repository in sorted(state['repositories']) if repository],
+                branches=[dict(branch=branch) for branch in sorted(state['branches']) if branch],
+                stages=list())
+    stages = dict()
+    for stage in state['stages']:
+        stages[stage] = dict(stage=stage, jobs=list())
+        spec['stages'].append(stages[stage])
+    for job, job_state in state['jobs'].items():
+        stage = stages.get(job_state['stage'])
+        if stage is None:
+            stage = stages[job_state['stage']] = dict(stage=job_state['stage'], jobs=list())
+            spec['stages'].append(stage)
+        stage['jobs'].append(dict(
+            job=job, name=job_state.get('name') or job, disable=job_state['enabled'] is False,
+            requirements=[dict(requirement=requirement['key'], req_type=requirement['type'], value=requirement['value'])
+                          for requirement in job_state['requirements']
+                          if requirement['key'] and not str(requirement['key']).startswith('system.')],
+            tasks=[dict(task_key=task['key'], description=task['description'] or None, disable=task['enabled'] is False)
+                   for task in job_state['tasks']]))
+    return spec
+
+
+class BambooMigration(object):
+    """
+    Copies plans from a source to a target server, each with its own BambooActions instance. A plan is read with
+    fetch_plan_state on both servers and diff_plan compiles the source spec against the target state into the
+    ordered createPlan, addRepository, addStage, addJob, addRequirement, addTask and addBranch actions, which are
+    sent as run actions of max_size actions, stopping at the first failing one. Because the target is diffed,
+    a plan left half migrated only gets its missing parts on the next attempt.
+    The journal file gets one json line per finished or failed plan, plans journaled as done are skipped.
+    Arguments:
+        source: BambooActions of the server the plans are read from.
+        target: BambooActions of the server the plans are created on.
+        journal_path: path of the journal file.
+        rename: function of the source plan key returning the target plan key. (Optional)
+        project_name: name of the project the plans are created in on the target. (Optional)
+        transform: function called with the source state and the compiled spec, returning the spec to
+                   create, like to fill in the task fields getTaskList does not list. (Optional)
+        max_workers: number of plans migrated at the same time. (Optional)
+        max_size: number of actions sent per run action. (Optional)
+    Examples:
+        migration = BambooMigration(old_bamboo, new_bamboo, "xxx.journal", rename=lambda plan: "NEW" + plan[3:])
+        stats = migration.migrate(project_name="XXX", max_workers=16)
+        for plan, commands in migration.compile("XXX-DEF"):
+            print("\\n".join(commands))
+    """
+    def __init__(self, source, target, journal_path, rename=None, project_name=None, transform=None, max_workers=8,
+                 max_size=50):
+        self.source = source
+        self.target = target
+        self.journal_path = journal_path
+        self.rename = rename or (lambda plan: plan)
+        self.project_name = project_name
+        self.transform = transform
+        self.max_workers = max_workers
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def journal(self):
+        """Returns the dict of source plan key to its last journal entry"""
+        entries = dict()
+        if not os.path.exists(self.journal_path):
+            return entries
+        with open(self.journal_path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry['plan']] = entry
+        return entries
+
+    def _record(self, plan, status, **values):
+        entry = dict(values, plan=plan, target=self.rename(plan), status=status, time=time.time())
+        with self.lock, open(self.journal_path, 'a', encoding='utf-8') as journal_file:
+            journal_file.write(json.dumps(entry, sort_keys=True) + '\n')
+        return entry
+
+    def _register_task_keys(self, spec):
+        # the source lists the full plugin keys of its tasks, the target is expected to have the same plugins
+        with self.lock:
+            for stage in spec['stages']:
+                for job in stage['jobs']:
+                    for task in job['tasks']:
+                        try:
+                            self.target.bamboo_tasks.get_task_key(task['task_key'])
+                        except KeyError:
+                            self.target.bamboo_tasks.task_dict[task['task_key']] = dict()
+
+    def changes(self, plan):
+        """Returns the BambooPlanChange list which creates the source plan on the target, or what is missing of it"""
+        state = fetch_plan_state(self.source, plan, max_size=self.max_size)
+        if not state['exists']:
+            raise BambooException(str.format('{0} does not exist on the source server', plan))
+        spec = plan_spec_from_state(state, plan=self.rename(plan), project_name=self.project_name)
+        if self.transform is not None:
+            spec = self.transform(state, spec)
+        self._register_task_keys(spec)
+        target_state = fetch_plan_state(self.target, spec['plan'], max_size=self.max_size)
+        return diff_plan(spec, target_state, self.target.bamboo_tasks, prune=False)
+
+    def compile(self, plans):
+        """Yields (plan, command list) with the rendered target commands of each plan, without sending them"""
+        for plan in ([plans] if isinstance(plans, str) else plans):
+            yield plan, [getattr(self.target, change.action)(**change.kwargs) for change in self.changes(plan)]
+
+    def migrate_plan(self, plan):
+        """Migrates one plan and returns the number of actions sent. Failures are journaled and raised"""
+        sent = 0
+        try:
+            changes = self.changes(plan)
+            for start in range(0, len(changes), self.max_size):
+                chunk = changes[start:start + self.max_size]
+                with self.target.batch(max_size=0, continues=False):
+                    results = [self.target.send_command(getattr(self.target, change.action), **change.kwargs)
+                               for change in chunk]
+                for change, batch_result in zip(chunk, results):
+                    try:
+                        batch_result.result()
+                    except BambooException as change_exception:
+                        raise BambooException(str.format('{0} failed: {1}', change.reason, change_exception))
+                    sent += 1
+        except Exception as migrate_exception:
+            self._record(plan, JOURNAL_FAILED, sent=sent, error=str(migrate_exception))
+            raise
+        self._record(plan, JOURNAL_DONE, sent=sent)
+        return sent
+
+    def migrate(self, plans=None, project_name=None, retry_failed=True):
+        """
+        Migrates the given source plan keys, or all plans of the source project listed with iter_partitioned, in
+        parallel. Returns a dict with the number of plans, the plans migrated, skipped as journaled done, and
+        failed with their exception.
+        Arguments:
+            plans: source plan keys. (Optional)
+            project_name: source project whose plans are migrated when no plans are given. (Optional)
+            retry_failed: also migrate the plans journaled as failed. (Optional)
+        """
+        if plans is None:
+            plans = [first_value(record, 'key', 'plan') for record in
+                     iter_partitioned(self.source, self.source.get_plan_list, project_name=project_name)]
+        plans = [plan for plan in plans if plan]
+        journal = self.journal()
+        stats = dict(plans=len(plans), migrated=0, skipped=0, actions=0, failed=dict())
+        pending = list()
+        for plan in plans:
+            status = journal.get(plan, dict()).get('status')
+            if status == JOURNAL_DONE or (status == JOURNAL_FAILED and not retry_failed):
+                stats['skipped'] += 1
+            else:
+                pending.append(plan)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = dict((executor.submit(self.migrate_plan, plan), plan) for plan in pending)
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                if error is not None:
+                    stats['failed'][futures[future]] = error
+                    continue
+                stats['migrated'] += 1
+                stats['actions'] += future.result()
+        return stats
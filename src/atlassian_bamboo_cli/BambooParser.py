@@ -0,0 +1,661 @@
+# !/usr/bin/env python
+# title           : BambooParser.py
+# description     : Parses the csv output of the ACLI list actions into compact typed records while the reply is
+#                   still being read, so large lists never have to be held in memory as one decoded string.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : for build in iter_records(bamboo, bamboo.get_build_list, plan_name="XXX-DEF", limit=1000)
+# notes           : values which do not convert to the column type are kept as strings.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import csv
+import datetime
+import enum
+import functools
+import inspect
+import keyword
+import re
+
+from .BambooCLI import BambooException
+
+DEFAULT_DATE_FORMAT = "yyyy-MM-dd'T'HH:mm:ss.SSSZ"
+# rows asked for when a list is read whole, ACLI stops at 25 rows when no limit is given
+FULL_LIST_LIMIT = 10000
+
+INTEGER_COLUMNS = frozenset(['number', 'id', 'build_number', 'duration', 'successful_tests', 'failed_tests',
+                             'skipped_tests', 'quarantined_tests'])
+TIMESTAMP_COLUMNS = frozenset(['started', 'completed', 'queued', 'created', 'updated', 'last_updated',
+                               'build_date', 'ended'])
+BOOLEAN_COLUMNS = frozenset(['enabled', 'disabled', 'favorite', 'online', 'busy', 'final', 'manual'])
+STATE_COLUMNS = frozenset(['state', 'build_state', 'life_cycle_state'])
+
+# SimpleDateFormat pattern letters with their strptime directive, longest first
+JAVA_DATE_TOKENS = (('yyyy', '%Y'), ('yy', '%y'), ('MMMM', '%B'), ('MMM', '%b'), ('MM', '%m'), ('dd', '%d'),
+                    ('EEEE', '%A'), ('EEE', '%a'), ('HH', '%H'), ('hh', '%I'), ('mm', '%M'), ('ss', '%S'),
+                    ('SSS', '%f'), ('XXX', '%z'), ('Z', '%z'), ('z', '%Z'), ('a', '%p'))
+
+
+class BuildState(enum.Enum):
+    """State of a build result as reported by bamboo"""
+    SUCCESSFUL = 'Successful'
+    FAILED = 'Failed'
+    UNKNOWN = 'Unknown'
+    IN_PROGRESS = 'InProgress'
+    QUEUED = 'Queued'
+    PENDING = 'Pending'
+    NOT_BUILT = 'NotBuilt'
+
+    @property
+    def final(self):
+        """True for the states a build does not leave anymore"""
+        return self in (BuildState.SUCCESSFUL, BuildState.FAILED, BuildState.NOT_BUILT)
+
+    @classmethod
+    def parse(cls, value):
+        """Returns the BuildState for a state text like "Successful", "IN_PROGRESS" or "In Progress" """
+        state = _BUILD_STATES.get(re.sub(r'[^a-z]', '', value.lower()))
+        if state is None:
+            raise ValueError(str.format('{0} is not a build state', value))
+        return state
+
+
+_BUILD_STATES = dict((state.value.lower(), state) for state in BuildState)
+
+
+@functools.lru_cache(maxsize=32)
+def java_date_format_to_strptime(date_format):
+    """
+    Translates a java SimpleDateFormat pattern, as used by the ACLI dateFormat parameter, into a strptime format.
+    Examples:
+        java_date_format_to_strptime("yyyy-MM-dd'T'HH:mm:ss.SSSZ") returns '%Y-%m-%dT%H:%M:%S.%f%z'
+    """
+    result = list()
+    index = 0
+    while index < len(date_format):
+        if date_format[index] == "'":
+            end = date_format.find("'", index + 1)
+            end = len(date_format) if end < 0 else end
+            result.append(date_format[index + 1:end].replace('%', '%%') or "'")
+            index = end + 1
+            continue
+        for token, directive in JAVA_DATE_TOKENS:
+            if date_format.startswith(token, index):
+                result.append(directive)
+                index += len(token)
+                break
+        else:
+            result.append(date_format[index].replace('%', '%%'))
+            index += 1
+    return ''.join(result)
+
+
+def _to_int(value):
+    return int(value)
+
+
+def _to_bool(value):
+    if value.lower() in ('true', 'yes', 'y', '1'):
+        return True
+    if value.lower() in ('false', 'no', 'n', '0'):
+        return False
+    raise ValueError(value)
+
+
+_DEFAULT_TIMESTAMP = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)\.(\d{3})([+-])(\d\d)(\d\d)$')
+_TIMEZONES = dict()
+
+
+def _to_default_timestamp(value):
+    # strptime dominates the parsing time of large lists, the default date format is matched directly instead
+    match = _DEFAULT_TIMESTAMP.match(value)
+    if match is None:
+        raise ValueError(value)
+    year, month, day, hour, minute, second, millisecond, sign, offset_hours, offset_minutes = match.groups()
+    offset = (sign, offset_hours, offset_minutes)
+    timezone = _TIMEZONES.get(offset)
+    if timezone is None:
+        minutes = int(offset_hours) * 60 + int(offset_minutes)
+        timezone = datetime.timezone(datetime.timedelta(minutes=-minutes if sign == '-' else minutes))
+        _TIMEZONES[offset] = timezone
+    return datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                             int(millisecond) * 1000, timezone)
+
+
+def _to_timestamp(value, strptime_format):
+    if strptime_format is None:
+        return datetime.datetime.fromisoformat(value)
+    return datetime.datetime.strptime(value, strptime_format)
+
+
+def column_converter(name, date_format=None):
+    """Returns the function converting the text of a column into its type, or None for text columns"""
+    if name in INTEGER_COLUMNS:
+        return _to_int
+    if name in BOOLEAN_COLUMNS:
+        return _to_bool
+    if name in STATE_COLUMNS:
+        return BuildState.parse
+    if name in TIMESTAMP_COLUMNS and date_format == DEFAULT_DATE_FORMAT:
+        return _to_default_timestamp
+    if name in TIMESTAMP_COLUMNS:
+        return functools.partial(_to_timestamp, strptime_format=java_date_format_to_strptime(date_format)
+                                 if date_format else None)
+    return None
+
+
+def column_name(header):
+    """Normalizes a csv header like "Build number" into a record attribute name like build_number"""
+    name = re.sub(r'[^0-9a-z]+', '_', header.strip().lower()).strip('_')
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = 'column_' + name
+    return name
+
+
+class BambooRecord(object):
+    """
+    Base of the records a list action is parsed into. The subclasses are created per csv header with one slot
+    for each column, so a record costs no more memory than its values.
+    """
+    __slots__ = ()
+    _classes = dict()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def with_columns(cls, columns):
+        """Returns the subclass of the record type which has a slot for each of the columns"""
+        key = (cls, tuple(columns))
+        record_class = BambooRecord._classes.get(key)
+        if record_class is None:
+            record_class = type(cls.__name__, (cls,), {'__slots__': tuple(columns)})
+            BambooRecord._classes[key] = record_class
+        return record_class
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        values = ', '.join(str.format('{0}={1!r}', name, getattr(self, name)) for name in self.__slots__)
+        return str.format('{0}({1})', type(self).__name__, values)
+
+
+class BuildRecord(BambooRecord):
+    __slots__ = ()
+
+
+class PlanRecord(BambooRecord):
+    __slots__ = ()
+
+
+class JobRecord(BambooRecord):
+    __slots__ = ()
+
+
+class StageRecord(BambooRecord):
+    __slots__ = ()
+
+
+class BranchRecord(BambooRecord):
+    __slots__ = ()
+
+
+class AgentRecord(BambooRecord):
+    __slots__ = ()
+
+
+class AssignmentRecord(BambooRecord):
+    __slots__ = ()
+
+
+class CapabilityRecord(BambooRecord):
+    __slots__ = ()
+
+
+class TaskRecord(BambooRecord):
+    __slots__ = ()
+
+
+class RequirementRecord(BambooRecord):
+    __slots__ = ()
+
+
+class RepositoryRecord(BambooRecord):
+    __slots__ = ()
+
+
+RECORD_TYPES = {'get_build_list': BuildRecord,
+                'get_plan_list': PlanRecord,
+                'get_job_list': JobRecord,
+                'get_stage_list': StageRecord,
+                'get_branch_list': BranchRecord,
+                'get_agent_info': AgentRecord,
+                'get_agent_assignment_list': AssignmentRecord,
+                'get_agent_capability': CapabilityRecord,
+                'get_task_list': TaskRecord,
+                'get_requirement_list': RequirementRecord,
+                'get_repository_list': RepositoryRecord}
+
+
+class BambooColumnarTable(object):
+    """
+    Column oriented alternative to a list of records. Each column is one list, which keeps the per row overhead
+    of very large lists down to the values themselves.
+    Arguments:
+        columns: names of the columns.
+    Examples:
+        table = read_table(bamboo, bamboo.get_build_list, plan_name="XXX-DEF", limit=10000)
+        durations = table.column("duration")
+    """
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.data = dict((name, list()) for name in self.columns)
+
+    def __len__(self):
+        return len(self.data[self.columns[0]]) if self.columns else 0
+
+    def append(self, values):
+        for name, value in zip(self.columns, values):
+            self.data[name].append(value)
+
+    def column(self, name):
+        return self.data[name]
+
+    def rows(self):
+        """Yields the rows as tuples in column order"""
+        return zip(*[self.data[name] for name in self.columns])
+
+
+def parse_list_rows(lines, date_format=None, encoding='utf-8'):
+    """
+    Parses the csv part of a list action reply. Yields the column names first and then one list of converted
+    values per row. Lines before the csv header, like "3 builds in list", are skipped.
+    Arguments:
+        lines: iterable of reply lines as bytes or str, e.g. BambooActions.stream_command. (Mandatory)
+        date_format: the dateFormat the reply was requested with, used for the timestamp columns. (Optional)
+        encoding: encoding of the reply. (Optional)
+    """
+    text_lines = (line.decode(encoding, 'replace') if isinstance(line, bytes) else line for line in lines)
+    for line in text_lines:
+        if line.startswith('"'):
+            break
+    else:
+        yield []
+        return
+    reader = csv.reader(_chain_first(line, text_lines))
+    names = list()
+    for header in next(reader):
+        name = column_name(header)
+        names.append(name if name not in names else str.format('{0}_{1}', name, len(names)))
+    yield names
+
+    converters = [column_converter(name, date_format) for name in names]
+    for row in reader:
+        if not row:
+            continue
+        values = list()
+        for converter, value in zip(converters, row):
+            if value == '':
+                value = None
+            elif converter is not None:
+                try:
+                    value = converter(value)
+                except ValueError:
+                    pass
+            values.append(value)
+        values.extend([None] * (len(names) - len(values)))
+        yield values
+
+
+def _chain_first(first, rest):
+    yield first
+    for line in rest:
+        yield line
+
+
+def parse_list_output(lines, record_type=BambooRecord, date_format=None, encoding='utf-8'):
+    """
+    Parses the reply of a list action into records of the record type, one record per row.
+    Examples:
+        builds = list(parse_list_output(reply.splitlines(), BuildRecord))
+    """
+    rows = parse_list_rows(lines, date_format=date_format, encoding=encoding)
+    record_class = record_type.with_columns(next(rows))
+    for values in rows:
+        yield record_class(*values)
+
+
+def first_value(record, *names):
+    """Returns the value of the first of the columns the record has a value for, column names differ between
+    ACLI versions like key and job for the jobs of getJobList"""
+    for name in names:
+        value = getattr(record, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def _list_arguments(function_name, kwargs):
+    arguments = inspect.signature(function_name).parameters
+    if 'output_type' not in arguments:
+        raise BambooException(str.format('{0} is not a list action', function_name.__name__))
+    kwargs['output_type'] = 'csv'
+    if 'date_format' in arguments and kwargs.get('date_format') is None:
+        kwargs['date_format'] = DEFAULT_DATE_FORMAT
+    return kwargs.get('date_format')
+
+
+def iter_records(actions, function_name, **kwargs):
+    """
+    Sends a list action asking ACLI for csv output and yields typed records while the reply is streamed in.
+    Actions which support a date format are asked for DEFAULT_DATE_FORMAT unless one is given.
+    Arguments:
+        actions: BambooActions instance used for sending the action. (Mandatory)
+        function_name: list action method, like bamboo.get_build_list. (Mandatory)
+        kwargs: arguments of the list action, like plan_name, limit and columns. (Optional)
+    Examples:
+        for build in iter_records(bamboo, bamboo.get_build_list, plan_name="XXX-DEF", limit=1000,
+                                  columns="build,number,state,started,completed"):
+            if build.state is BuildState.FAILED:
+                print(build.build, build.started)
+    """
+    date_format = _list_arguments(function_name, kwargs)
+    record_type = RECORD_TYPES.get(function_name.__name__, BambooRecord)
+    return parse_list_output(actions.stream_command(function_name, **kwargs), record_type, date_format=date_format)
+
+
+def read_table(actions, function_name, **kwargs):
+    """
+    Sends a list action like iter_records and collects the typed values into a BambooColumnarTable.
+    Examples:
+        table = read_table(bamboo, bamboo.get_plan_list, project_name="@all", limit=5000)
+    """
+    date_format = _list_arguments(function_name, kwargs)
+    rows = parse_list_rows(actions.stream_command(function_name, **kwargs), date_format=date_format)
+    table = BambooColumnarTable(next(rows))
+    for values in rows:
+        table.append(values)
+    return table
+
+
+def check_full_list(records, action_name, limit=FULL_LIST_LIMIT):
+    """
+    Returns the records of a list action sent with limit + 1 rows, raising a BambooException when more than
+    limit came back, as the list could not be read whole.
+    """
+    if len(records) > limit:
+        raise BambooException(str.format('{0} lists more than {1} rows, it cannot be read whole', action_name, limit))
+    return records
+
+
+def read_all_records(actions, function_name, limit=FULL_LIST_LIMIT, **kwargs):
+    """
+    Reads all records of a list action like iter_records. ACLI lists 25 rows when no limit is given, so the
+    action is sent with limit + 1 rows and a BambooException is raised when the list is longer than limit.
+    Plan, job and branch lists of any length are read with iter_partitioned instead.
+    Examples:
+        agents = read_all_records(bamboo, bamboo.get_agent_info, exclude_disabled=True)
+    """
+    if kwargs.get('limit') is not None:
+        raise BambooException('read_all_records sets limit itself')
+    records = list(iter_records(actions, function_name, limit=limit + 1, **kwargs))
+    return check_full_list(records, function_name.__name__, limit)
+
+
+# characters plan, job and branch keys are made of, the partitions of iter_partitioned
+PARTITION_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_'
+PARTITION_KEY_COLUMNS = {'get_plan_list': ('key', 'plan'), 'get_job_list': ('key', 'job'),
+                         'get_branch_list': ('key', 'branch')}
+
+
+def format_timestamp(timestamp):
+    """Formats a datetime in DEFAULT_DATE_FORMAT, which is how the date filters of the list actions are sent to
+    ACLI. A naive datetime is taken as local time"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.astimezone()
+    return str.format('{0}.{1:03d}{2}', timestamp.strftime('%Y-%m-%dT%H:%M:%S'), timestamp.microsecond // 1000,
+                      timestamp.strftime('%z'))
+
+
+def _build_number(record):
+    number = getattr(record, 'number', None)
+    if number is None:
+        # build keys end with the build number, like XXX-DEF-232
+        key = first_value(record, 'build', 'key')
+        number = str(key).rsplit('-', 1)[-1] if key is not None else None
+    try:
+        return int(number)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_build_details(reply, columns, date_format=DEFAULT_DATE_FORMAT, encoding='utf-8'):
+    """
+    Parses the reply of getBuild into a BuildRecord with the given columns, converted like the getBuildList columns
+    of the same name. Fields missing from the reply are None.
+    Examples:
+        parse_build_details(bamboo.send_command(bamboo.get_build, build="XXX-DEF-232", date_format=DEFAULT_DATE_FORMAT),
+                            ["build", "state", "completed"])
+    """
+    values = parse_key_value_output(reply, encoding)
+    row = list()
+    for name in columns:
+        value = values.get(name) or None
+        converter = column_converter(name, date_format)
+        if value is not None and converter is not None:
+            try:
+                value = converter(value)
+            except ValueError:
+                pass
+        row.append(value)
+    return BuildRecord.with_columns(columns)(*row)
+
+
+# list filters getBuild has no equivalent of, the builds past the first window of iter_builds can not be checked
+_UNCHECKED_BUILD_FILTERS = ('labels', 'issues', 'fields')
+
+
+def _build_checks(kwargs, started_after):
+    # the started_after, state and notState filters of getBuildList as checks of a BuildRecord, None when other
+    # filters are given
+    if any(kwargs.get(name) for name in _UNCHECKED_BUILD_FILTERS):
+        return None
+    fields = [kwargs.get('field')]
+    if kwargs.get('field1') is not None:
+        fields.append(str.format('{0}={1}', kwargs['field1'], kwargs.get('value1')))
+    checks = list()
+    for field in fields:
+        if not field:
+            continue
+        name, _, value = field.partition('=')
+        if name.strip().lower() not in ('state', 'notstate'):
+            return None
+        state, negated = BuildState.parse(value), name.strip().lower() == 'notstate'
+        checks.append(lambda record, state=state, negated=negated: (getattr(record, 'state', None) is state) != negated)
+    if started_after is not None:
+        checks.append(lambda record: isinstance(getattr(record, 'started', None), datetime.datetime) and
+                      record.started >= started_after)
+    return checks
+
+
+def _iter_build_windows(actions, plan_name, record_class, number, window, checks, started_after):
+    # reads the builds numbered below number with one run action of window getBuild actions per window
+    while number > 1:
+        keys = [str.format('{0}-{1}', plan_name, build_number)
+                for build_number in range(number - 1, max(number - 1 - window, 0), -1)]
+        number -= len(keys)
+        with actions.batch(max_size=0, continues=True):
+            results = [actions.send_command(actions.get_build, build=key, date_format=DEFAULT_DATE_FORMAT)
+                       for key in keys]
+        found, recent = 0, 0
+        for key, batch_result in zip(keys, results):
+            try:
+                reply = batch_result.result()
+            except BambooException:
+                # expired or deleted builds
+                continue
+            record = parse_build_details(reply, record_class.__slots__)
+            if 'build' in record_class.__slots__ and record.build is None:
+                record.build = key
+            found += 1
+            started = getattr(record, 'started', None)
+            recent += started_after is None or not isinstance(started, datetime.datetime) or started >= started_after
+            if all(check(record) for check in checks):
+                yield record
+        # older builds have expired, or all started before started_after
+        if not found or not recent:
+            return
+
+
+def iter_builds(actions, plan_name, window=100, started_after=None, **kwargs):
+    """
+    Yields the build results of a plan, latest first, in build number order. The first window builds are
+    streamed from getBuildList with its filters. ACLI has no filter on the build number, and paging on the
+    completion time would skip the older builds which ended after a newer one, like long or still running builds,
+    so the builds numbered below the first window are read window by window with one run action of window
+    getBuild actions each, and checked against started_after and the state and notState field filters. Reading
+    stops at build number 1, at a window without any build, like expired ones, or at a window of builds which all
+    started before started_after. Only one window is held in memory and a consumer leaving the loop early stops
+    the reading.
+    Arguments:
+        actions: BambooActions instance used for sending the actions. (Mandatory)
+        plan_name: name/id of the plan. (Mandatory)
+        window: number of builds read per action. (Optional)
+        started_after: only yield builds started after this datetime. (Optional)
+        kwargs: other get_build_list arguments like columns, or field="state=FAILED". Labels, issues and other
+                fields can not be checked past the first window, a BambooException is raised when more than window
+                builds match them. (Optional)
+    Examples:
+        for build in iter_builds(bamboo, "XXX-DEF", window=200):
+            if build.state is BuildState.FAILED:
+                break
+    """
+    for name in ('limit', 'field2', 'value2', 'date_format'):
+        if kwargs.get(name) is not None:
+            raise BambooException(str.format('iter_builds sets {0} itself', name))
+    if isinstance(started_after, datetime.datetime):
+        # a naive datetime is taken as local time, like format_timestamp does
+        started_after = started_after.astimezone()
+    elif started_after is not None:
+        try:
+            started_after = _to_default_timestamp(started_after)
+        except ValueError:
+            raise BambooException(str.format('{0} is not a datetime in the format {1}', started_after,
+                                              DEFAULT_DATE_FORMAT))
+    if kwargs.get('columns'):
+        columns = [column.strip() for column in kwargs['columns'].split(',')]
+        kwargs['columns'] = ','.join(columns + [column for column in ('build', 'state', 'started')
+                                                if column not in columns])
+    kwargs.update(plan_name=plan_name, date_format=DEFAULT_DATE_FORMAT)
+    if started_after is not None:
+        kwargs.update(field2='started', value2=format_timestamp(started_after))
+    last_record, count = None, 0
+    for record in iter_records(actions, actions.get_build_list, limit=window, **kwargs):
+        count += 1
+        last_record = record
+        yield record
+    if count < window:
+        return
+    number = _build_number(last_record)
+    if number is None:
+        raise BambooException(str.format('the builds of {0} have no build number to page on', plan_name))
+    checks = _build_checks(kwargs, started_after)
+    if checks is None:
+        raise BambooException(str.format('more than {0} builds of {1} match, labels, issues and fields other than '
+                                         'state can only filter the first window', window, plan_name))
+    for record in _iter_build_windows(actions, plan_name, type(last_record), number, window, checks, started_after):
+        yield record
+
+
+def iter_partitioned(actions, function_name, window=100, prefix='', **kwargs):
+    """
+    Yields the records of get_plan_list, get_job_list or get_branch_list without asking for all of them at
+    once. Keys are read by regex partitions: a prefix matching more than window rows is split into one
+    partition per next key character, plus the key equal to the prefix. Every partition is read with its own
+    action and streamed in, and reading stops once it has more than window rows, so no more than window records
+    are held in memory. The records are yielded partition by partition, not sorted.
+    Arguments:
+        actions: BambooActions instance used for sending the actions. (Mandatory)
+        function_name: list action method, like bamboo.get_plan_list. (Mandatory)
+        window: number of rows a partition is read with at most. (Optional)
+        prefix: only yield the records whose key starts with it. (Optional)
+        kwargs: other arguments of the list action, like project_name or plan_name. (Optional)
+    Examples:
+        for plan in iter_partitioned(bamboo, bamboo.get_plan_list, project_name="@all", window=500):
+            print(plan.key)
+    """
+    if kwargs.get('regex') is not None or kwargs.get('limit') is not None:
+        raise BambooException('iter_partitioned sets regex and limit itself')
+    key_names = PARTITION_KEY_COLUMNS.get(function_name.__name__, ('key',))
+
+    def read_partition(partition, exact=False):
+        # the own records of a partition, or None when it has more than window rows, the regex also matches
+        # names and a record is only yielded by the partition of its key
+        records, rows = list(), 0
+        regex = re.escape(partition) if exact else re.escape(partition) + '.*'
+        for record in iter_records(actions, function_name, regex=regex, limit=window + 1, **kwargs):
+            rows += 1
+            if rows > window:
+                return None
+            key = str(first_value(record, *key_names) or '').upper()
+            if key == partition.upper() or (not exact and key.startswith(partition.upper())):
+                records.append(record)
+        return records
+
+    crowded = list()
+    records = read_partition(prefix)
+    if records is None:
+        crowded.append(prefix)
+    for record in records or list():
+        yield record
+    while crowded:
+        partition = crowded.pop()
+        # the children only match longer keys, an empty partition has no key equal to it
+        for record in (read_partition(partition, exact=True) if partition else list()):
+            yield record
+        for child in (partition + character for character in PARTITION_ALPHABET):
+            records = read_partition(child)
+            if records is None:
+                crowded.append(child)
+                continue
+            for record in records:
+                yield record
+
+
+def parse_key_value_output(reply, encoding='utf-8'):
+    """
+    Parses the reply of a get action, like getBuild or getPlan, which prints one "Name . . . . : value" line per
+    field. Returns a dict with the normalized field names as keys and the values as strings.
+    Examples:
+        parse_key_value_output(bamboo.send_command(bamboo.get_build, build="XXX-DEF-232"))["state"]
+    """
+    if isinstance(reply, bytes):
+        reply = reply.decode(encoding, 'replace')
+    values = dict()
+    for line in reply.splitlines():
+        key, separator, value = line.partition(':')
+        key = key.replace('.', ' ').strip()
+        if separator and key:
+            values.setdefault(column_name(key), value.strip())
+    return values
+
+
+def get_build_state(actions, build):
+    """
+    Returns the BuildState of a build result, or None when the reply of getBuild does not contain a known state.
+    Arguments:
+        actions: BambooActions instance used for sending the action. (Mandatory)
+        build: build key with the build number, like XXX-DEF-232. (Mandatory)
+    """
+    state = parse_key_value_output(actions.send_command(actions.get_build, build=build)).get('state')
+    try:
+        return BuildState.parse(state) if state else None
+    except ValueError:
+        return None
@@ -0,0 +1,304 @@
+# !/usr/bin/env python
+# title           : BambooPlanSpec.py
+# description     : Declarative plan specs. The current state of a plan is read from Bamboo, compared with the spec
+#                   and only the differing stages, jobs, tasks, requirements, repositories and branches are added
+#                   or removed, all in one run action, instead of recreating the whole plan.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : changes = reconcile_plan(bamboo, "plans/XXX-DEF.yaml")
+# notes           : YAML specs need PyYAML, JSON specs and dicts work without it.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import collections
+import json
+import os
+
+from .BambooCLI import BambooException
+from .BambooParser import BambooRecord, FULL_LIST_LIMIT, RECORD_TYPES, check_full_list, first_value, \
+    parse_key_value_output, parse_list_output
+
+BambooPlanChange = collections.namedtuple('BambooPlanChange', ['action', 'kwargs', 'reason'])
+
+# spec keys holding nested entries instead of action arguments
+NESTED_SPEC_KEYS = frozenset(['stages', 'jobs', 'tasks', 'requirements', 'repositories', 'branches'])
+
+# list actions read for the plan itself, the tasks and requirements are read per job
+PLAN_LIST_ACTIONS = ('get_stage_list', 'get_job_list', 'get_repository_list', 'get_branch_list')
+
+
+def load_plan_spec(source):
+    """
+    Returns the plan spec as a dict. The source is a dict or the path of a .json, .yaml or .yml file.
+    A spec looks like:
+        plan: XXX-DEF
+        name: Nightly
+        repositories:
+          - {name: app, repository_key: GIT, fields: "repository.git.repositoryUrl:..."}
+        branches:
+          - {branch: develop}
+        stages:
+          - stage: Build
+            jobs:
+              - job: JOB1
+                name: Compile
+                requirements:
+                  - {requirement: system.jdk.JDK 11}
+                tasks:
+                  - {task_key: CHECKOUT, description: checkout}
+                  - {task_key: SCRIPT, description: compile, field1: scriptBody, value1: make}
+    Every entry holds the arguments of the add action creating it, like add_stage, add_job or add_task.
+    """
+    if isinstance(source, dict):
+        spec = source
+    else:
+        with open(source, 'r') as spec_file:
+            if os.path.splitext(source)[1].lower() in ('.yaml', '.yml'):
+                try:
+                    import yaml
+                except ImportError:
+                    raise BambooException(str.format('PyYAML is needed to read the plan spec {0}', source))
+                spec = yaml.safe_load(spec_file)
+            else:
+                spec = json.load(spec_file)
+    if not isinstance(spec, dict) or not spec.get('plan'):
+        raise BambooException('a plan spec needs the plan key in "plan"')
+    return spec
+
+
+def _arguments(entry, *excluded):
+    return dict((key, value) for key, value in entry.items() if key not in NESTED_SPEC_KEYS and key not in excluded)
+
+
+def _batch_records(batch_result, action_name):
+    # the list actions of a plan which has none of the listed items fail, which counts as an empty list
+    try:
+        reply = batch_result.result()
+    except BambooException:
+        return list()
+    records = list(parse_list_output(reply.splitlines(), RECORD_TYPES.get(action_name, BambooRecord)))
+    # the lists are sent with FULL_LIST_LIMIT + 1 rows, a diff against a partial list would add what exists
+    return check_full_list(records, action_name)
+
+
+def fetch_plan_state(actions, plan, max_size=50):
+    """
+    Reads the current state of a plan into a dict shaped like the diff needs it: exists, stages, jobs with their
+    stage, enabled flag, tasks and requirements, repositories and branches. The plan and its lists are read with
+    one run action and the tasks and requirements of all jobs with a second one, so a plan costs two acli
+    starts however many jobs it has. The lists are read whole, a list longer than FULL_LIST_LIMIT raises a
+    BambooException.
+    """
+    state = dict(plan=plan, exists=True, stages=list(), jobs=dict(), repositories=set(), branches=set())
+    with actions.batch(max_size=max_size, continues=True):
+        plan_result = actions.send_command(actions.get_plan, plan_name=plan)
+        list_results = dict((action_name, actions.send_command(getattr(actions, action_name), plan_name=plan,
+                                                               output_type='csv', limit=FULL_LIST_LIMIT + 1))
+                            for action_name in PLAN_LIST_ACTIONS)
+    try:
+        state['details'] = parse_key_value_output(plan_result.result())
+    except BambooException:
+        state['exists'] = False
+        return state
+    records = dict((action_name, _batch_records(batch_result, action_name))
+                   for action_name, batch_result in list_results.items())
+
+    state['stages'] = [first_value(record, 'name', 'stage') for record in records['get_stage_list']]
+    for record in records['get_job_list']:
+        job = first_value(record, 'key', 'job')
+        if job is not None:
+            state['jobs'][job] = dict(stage=first_value(record, 'stage'), name=first_value(record, 'name'),
+                                      enabled=first_value(record, 'enabled'), tasks=list(), requirements=list())
+    state['repositories'] = set(first_value(record, 'name', 'repository')
+                                for record in records['get_repository_list'])
+    state['branches'] = set(first_value(record, 'branch', 'name') for record in records['get_branch_list'])
+
+    with actions.batch(max_size=max_size, continues=True):
+        job_results = dict((job, (actions.send_command(actions.get_task_list, plan_name=plan, job=job,
+                                                       output_type='csv', limit=FULL_LIST_LIMIT + 1),
+                                  actions.send_command(actions.get_requirement_list, plan_name=plan, job=job,
+                                                       output_type='csv', limit=FULL_LIST_LIMIT + 1)))
+                           for job in state['jobs'])
+    for job, (task_result, requirement_result) in job_results.items():
+        state['jobs'][job]['tasks'] = [
+            dict(id=first_value(record, 'id'), key=first_value(record, 'key', 'task_key', 'type'),
+                 description=first_value(record, 'description', 'name') or '', enabled=first_value(record, 'enabled'))
+            for record in _batch_records(task_result, 'get_task_list')]
+        state['jobs'][job]['requirements'] = [
+            dict(id=first_value(record, 'id'), key=first_value(record, 'key', 'requirement'),
+                 type=first_value(record, 'type', 'match_type'), value=first_value(record, 'value', 'match_value'))
+            for record in _batch_records(requirement_result, 'get_requirement_list')]
+    return state
+
+
+def _same_task(bamboo_tasks, spec_task, task):
+    # a task is identified by its description, tasks without one by their key
+    description = spec_task.get('description') or ''
+    if description or task['description']:
+        return description == task['description']
+    try:
+        key = bamboo_tasks.get_task_key(spec_task.get('task_key'))
+    except KeyError:
+        key = spec_task.get('task_key')
+    return str(key).upper() == str(task['key']).upper()
+
+
+def _diff_tasks(bamboo_tasks, plan, job, spec_tasks, tasks, prune, removals, additions):
+    # tasks run in order and are only appended, so everything after the matching prefix is replaced
+    matching = 0
+    for spec_task, task in zip(spec_tasks, tasks):
+        if not _same_task(bamboo_tasks, spec_task, task):
+            break
+        if task['enabled'] is not None and task['enabled'] == bool(spec_task.get('disable')):
+            break
+        matching += 1
+    if matching == len(spec_tasks) and not prune:
+        return
+    for task in sorted(tasks[matching:], key=lambda item: item['id'] or 0, reverse=True):
+        removals.append(BambooPlanChange('remove_task', dict(plan_name=plan, job=job, task_id=task['id']),
+                                         str.format('task {0} of {1} differs from the spec', task['id'], job)))
+    for spec_task in spec_tasks[matching:]:
+        additions.append(BambooPlanChange('add_task', dict(_arguments(spec_task), plan_name=plan, job=job),
+                                          str.format('task {0} of {1} is missing', spec_task.get('task_key'), job)))
+
+
+def _diff_requirements(plan, job, spec_requirements, requirements, prune, removals, additions):
+    current = dict((requirement['key'], requirement) for requirement in requirements)
+    wanted = set()
+    for spec_requirement in spec_requirements:
+        key = spec_requirement.get('requirement')
+        wanted.add(key)
+        requirement = current.get(key)
+        value = spec_requirement.get('value')
+        req_type = spec_requirement.get('req_type')
+        if requirement is not None and (value is None or requirement['value'] is None or
+                                        str(value) == str(requirement['value'])) and \
+                (req_type is None or requirement['type'] is None or
+                 str(req_type).lower() == str(requirement['type']).lower()):
+            continue
+        if requirement is not None:
+            removals.append(BambooPlanChange('remove_requirement', dict(plan_name=plan, job=job, requirement=key),
+                                             str.format('requirement {0} of {1} changed', key, job)))
+        additions.append(BambooPlanChange('add_requirement', dict(_arguments(spec_requirement), plan_name=plan,
+                                                                  job=job),
+                                          str.format('requirement {0} of {1} is missing', key, job)))
+    if prune:
+        # system requirements are added by Bamboo for the tasks of the job and can not be removed
+        for key in current:
+            if key not in wanted and not str(key).startswith('system.'):
+                removals.append(BambooPlanChange('remove_requirement', dict(plan_name=plan, job=job, requirement=key),
+                                                 str.format('requirement {0} of {1} is not in the spec', key, job)))
+
+
+def diff_plan(spec, state, bamboo_tasks, prune=True):
+    """
+    Compares a plan spec with the state read by fetch_plan_state and returns the BambooPlanChange list which
+    makes the plan match the spec: removals first, then the additions in the order they depend on each other.
+    Stages, jobs, tasks and requirements missing from the spec are only removed when prune is set, repositories
+    and branches missing from the spec are never removed. Tasks have no update action, so a task which differs
+    is removed together with the tasks after it and they are added again.
+    """
+    plan = spec['plan']
+    removals, additions = list(), list()
+    if not state['exists']:
+        additions.append(BambooPlanChange('create_plan', dict(_arguments(spec, 'plan'), plan_name=plan),
+                                          'plan does not exist'))
+
+    for repository in spec.get('repositories', list()):
+        if repository.get('name') not in state['repositories']:
+            additions.append(BambooPlanChange('add_repository', dict(_arguments(repository), plan_name=plan),
+                                              str.format('repository {0} is missing', repository.get('name'))))
+
+    spec_stages = [stage.get('stage') for stage in spec.get('stages', list())]
+    removed_stages = set()
+    if prune:
+        for stage in state['stages']:
+            if stage not in spec_stages:
+                removed_stages.add(stage)
+                removals.append(BambooPlanChange('remove_stage', dict(plan_name=plan, stage=stage),
+                                                 str.format('stage {0} is not in the spec', stage)))
+
+    spec_jobs = set()
+    for spec_stage in spec.get('stages', list()):
+        stage = spec_stage.get('stage')
+        if stage not in state['stages']:
+            additions.append(BambooPlanChange('add_stage', dict(_arguments(spec_stage), plan_name=plan),
+                                              str.format('stage {0} is missing', stage)))
+        for spec_job in spec_stage.get('jobs', list()):
+            job = spec_job.get('job')
+            spec_jobs.add(job)
+            job_state = state['jobs'].get(job)
+            if job_state is not None and job_state['stage'] not in (None, stage):
+                removals.append(BambooPlanChange('remove_job', dict(plan_name=plan, job=job),
+                                                 str.format('job {0} moved to stage {1}', job, stage)))
+                job_state = None
+            if job_state is None:
+                additions.append(BambooPlanChange('add_job', dict(_arguments(spec_job), plan_name=plan, stage=stage),
+                                                  str.format('job {0} is missing', job)))
+                job_state = dict(enabled=None, tasks=list(), requirements=list())
+            elif job_state['enabled'] is not None and job_state['enabled'] == bool(spec_job.get('disable')):
+                action = 'disable_job' if spec_job.get('disable') else 'enable_job'
+                additions.append(BambooPlanChange(action, dict(plan_name=plan, job=job),
+                                                  str.format('job {0} has to be {1}d', job, action.split('_')[0])))
+            _diff_requirements(plan, job, spec_job.get('requirements', list()), job_state['requirements'], prune,
+                               removals, additions)
+            _diff_tasks(bamboo_tasks, plan, job, spec_job.get('tasks', list()), job_state['tasks'], prune,
+                        removals, additions)
+
+    if prune:
+        for job, job_state in state['jobs'].items():
+            if job not in spec_jobs and job_state['stage'] not in removed_stages:
+                removals.append(BambooPlanChange('remove_job', dict(plan_name=plan, job=job),
+                                                 str.format('job {0} is not in the spec', job)))
+
+    for branch in spec.get('branches', list()):
+        if branch.get('branch') not in state['branches'] and branch.get('name') not in state['branches']:
+            additions.append(BambooPlanChange('add_branch', dict(_arguments(branch), plan_name=plan),
+                                              str.format('branch {0} is missing', branch.get('branch'))))
+
+    # a job is removed before its tasks would be, those removals are redundant
+    removed_jobs = set(change.kwargs['job'] for change in removals if change.action == 'remove_job')
+    removals = [change for change in removals
+                if change.action in ('remove_job', 'remove_stage') or change.kwargs['job'] not in removed_jobs]
+    order = ('remove_task', 'remove_requirement', 'remove_job', 'remove_stage')
+    removals.sort(key=lambda change: order.index(change.action))
+    return removals + additions
+
+
+def reconcile_plan(actions, spec, prune=True, dry_run=False, max_size=50):
+    """
+    Makes a plan match its spec with the fewest actions. The current plan is read with getPlan, getStageList,
+    getJobList, getRepositoryList, getBranchList, getTaskList and getRequirementList, see fetch_plan_state, the
+    differences are sent as run actions of max_size changes which stop at the first failing change, and the
+    run actions after a failed one are not sent. Returns a list of (BambooPlanChange, BambooBatchResult) pairs,
+    the results are None for a dry run and for the changes which were not sent.
+    Arguments:
+        actions: BambooActions instance used for sending the actions. (Mandatory)
+        spec: plan spec dict or path of a JSON or YAML spec file, see load_plan_spec. (Mandatory)
+        prune: remove the stages, jobs, tasks and requirements which are not in the spec. (Optional)
+        dry_run: only compute the changes without sending them. (Optional)
+        max_size: number of actions sent per run action. (Optional)
+    Examples:
+        for change, result in reconcile_plan(bamboo, "plans/XXX-DEF.yaml", dry_run=True):
+            print(change.action, change.reason)
+        for plan_file in glob.glob("plans/*.json"):
+            for change, result in reconcile_plan(bamboo, plan_file):
+                result.result()
+    """
+    spec = load_plan_spec(spec)
+    state = fetch_plan_state(actions, spec['plan'], max_size=max_size)
+    changes = diff_plan(spec, state, actions.bamboo_tasks, prune=prune)
+    if dry_run or not changes:
+        return [(change, None) for change in changes]
+    results = list()
+    for start in range(0, len(changes), max_size):
+        chunk = changes[start:start + max_size]
+        with actions.batch(max_size=0, continues=False):
+            results.extend([actions.send_command(getattr(actions, change.action), **change.kwargs)
+                             for change in chunk])
+        # the later changes depend on the failed one, like the rest of its run action they are skipped
+        if any(batch_result.error is not None for batch_result in results[start:]):
+            break
+    return list(zip(changes, results + [None] * (len(changes) - len(results))))
@@ -0,0 +1,319 @@
+# !/usr/bin/env python
+# title           : BambooPolicy.py
+# description     : Call policy for the actions sent to the bamboo server: a token bucket rate limit shared by all
+#                   threads, retries with jittered exponential backoff for transient failures only, a retry budget
+#                   and a circuit breaker failing fast while the server is unhealthy.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : bamboo.policy = BambooPolicy(rate=10, burst=20)
+# notes           : mutating actions and batches are only retried when acli could not reach the server at all, and
+#                   a run action not once any of its actions was done.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import random
+import re
+import subprocess
+import threading
+import time
+
+from .BambooCLI import BambooActions, BambooCancelledError, BambooException, MUTATING_ACTION_NAMES
+
+ERROR_FATAL = 'fatal'
+ERROR_TRANSIENT = 'transient'
+ERROR_UNREACHABLE = 'unreachable'
+
+# output of acli failing before the action reached the server, safe to retry for every action
+UNREACHABLE_PATTERN = re.compile(
+    r'Connection refused|ConnectException|UnknownHostException|No route to host|NoRouteToHostException|'
+    r'Network is unreachable', re.IGNORECASE)
+# output of an overloaded or briefly unavailable server, the action may or may not have been done
+TRANSIENT_PATTERN = re.compile(
+    r'\b(429|502|503|504)\b|Too Many Requests|Service Unavailable|Bad Gateway|Gateway Time-?out|timed out|'
+    r'SocketTimeoutException|Connection reset|NoHttpResponseException|SSLException|Read timed out|'
+    r'did not answer within|session exited', re.IGNORECASE)
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+
+class BambooRetryableError(BambooException):
+    """
+    Raised for an action which failed with a transient error and was not retried again, because its attempts or
+    the retry budget ran out. Sending it again later can succeed.
+    Arguments:
+        cause: exception of the last attempt.
+        attempts: number of attempts made.
+    """
+    def __init__(self, cause, attempts=1):
+        super(BambooRetryableError, self).__init__(str.format('{0} (after {1} attempts)', cause, attempts))
+        self.cause = cause
+        self.attempts = attempts
+
+
+class BambooCircuitOpenError(BambooRetryableError):
+    """Raised without sending the action while the circuit breaker is open"""
+    def __init__(self, retry_in):
+        BambooException.__init__(self, str.format('bamboo server unhealthy, calls fail fast for {0:.1f} more '
+                                                  'seconds', retry_in))
+        self.cause = None
+        self.attempts = 0
+        self.retry_in = retry_in
+
+
+def _error_text(error):
+    texts = [str(error)]
+    for cause in (error, getattr(error, 'cause', None)) + tuple(getattr(error, 'args', ())[:1]):
+        for name in ('output', 'stderr'):
+            value = getattr(cause, name, None)
+            if isinstance(value, bytes):
+                value = value.decode('utf-8', 'replace')
+            if value:
+                texts.append(value)
+    return '\n'.join(texts)
+
+
+def run_reply_applied(error):
+    """
+    Returns True when the output of a failed run action shows that at least one of its actions was done, an
+    action whose output holds no error line counts as done. Running such a run again would repeat these actions.
+    """
+    for cause in (error, getattr(error, 'cause', None)):
+        output = getattr(cause, 'output', None)
+        if isinstance(output, bytes):
+            segments = BambooActions.split_run_reply(output, output.count(b'\n') + 1)
+            if any(BambooActions.find_reply_error(segment) is None for segment in segments):
+                return True
+    return False
+
+
+def classify_error(error):
+    """
+    Returns ERROR_UNREACHABLE when acli could not reach the server, ERROR_TRANSIENT when the server was
+    overloaded, timed out or acli was killed, and ERROR_FATAL for everything else, like unknown plans, missing
+    permissions or invalid arguments.
+    """
+    text = _error_text(error)
+    if UNREACHABLE_PATTERN.search(text):
+        return ERROR_UNREACHABLE
+    if TRANSIENT_PATTERN.search(text):
+        return ERROR_TRANSIENT
+    for cause in (error, ) + tuple(getattr(error, 'args', ())[:1]):
+        if isinstance(cause, subprocess.CalledProcessError) and cause.returncode < 0:
+            # acli killed by a signal, like the oom killer, rather than failing the action
+            return ERROR_TRANSIENT
+    return ERROR_FATAL
+
+
+class BambooRateLimiter(object):
+    """
+    Token bucket shared by all threads. A call takes a token and waits for it when the bucket is empty, tokens
+    are reserved in call order so waiting threads are served one after the other at the rate.
+    Arguments:
+        rate: tokens added per second.
+        burst: maximum number of tokens in the bucket. (Optional)
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, sleeping until it is available. Returns the seconds waited"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class BambooCircuitBreaker(object):
+    """
+    Opens after failure_threshold transient failures in a row and then rejects calls for reset_timeout seconds.
+    Afterwards a single probe call is let through, its success closes the circuit and its failure opens it again.
+    Arguments:
+        failure_threshold: transient failures in a row which open the circuit. (Optional)
+        reset_timeout: seconds the circuit stays open before a probe. (Optional)
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened = 0.0
+        self.probing = False
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def before(self):
+        """Raises BambooCircuitOpenError unless a call may be sent now"""
+        with self.lock:
+            if self.state == CIRCUIT_CLOSED:
+                return
+            retry_in = self.opened + self.reset_timeout - time.monotonic()
+            if self.state == CIRCUIT_OPEN and retry_in <= 0:
+                self.state = CIRCUIT_HALF_OPEN
+            if self.state == CIRCUIT_HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+            raise BambooCircuitOpenError(max(retry_in, 0))
+
+    def success(self):
+        with self.lock:
+            self.state = CIRCUIT_CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != CIRCUIT_OPEN:
+                    self.trips += 1
+                self.state = CIRCUIT_OPEN
+                self.opened = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """Ends a probe call which failed without telling anything about the server health"""
+        with self.lock:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self.probing = False
+
+
+class BambooPolicy(object):
+    """
+    Policy applied by BambooActions to every action sent to the server, including the run actions of batches.
+    Transient failures of read actions are retried after a full jitter exponential backoff, mutating actions and
+    batches only when the server could not be reached, and a run action not once its output shows one of its
+    actions was done, see run_reply_applied. An acli process stopped by its call_timeout counts as transient,
+    one stopped by the deadline or cancel event of the caller is raised unchanged. Every attempt waits for the
+    rate limit, and retries also take a token of the retry budget, which grows by retry_ratio per call, so
+    under load at most that share of the traffic are retries. Fatal errors are raised unchanged, see
+    classify_error.
+    Arguments:
+        rate: actions per second sent by all threads together, None for no limit. (Optional)
+        burst: actions which can be sent at once after an idle time. (Optional)
+        max_attempts: attempts per action including the first one. (Optional)
+        base_delay: backoff of the first retry in seconds, doubled for every further retry. (Optional)
+        max_delay: upper bound of the backoff in seconds. (Optional)
+        retry_ratio: retry budget added per call. (Optional)
+        retry_burst: maximum retry budget. (Optional)
+        failure_threshold: transient failures in a row which open the circuit breaker, None for no breaker.
+                           (Optional)
+        reset_timeout: seconds the circuit breaker stays open. (Optional)
+        classify: function returning ERROR_FATAL, ERROR_TRANSIENT or ERROR_UNREACHABLE for an exception.
+                  (Optional)
+    Examples:
+        bamboo.policy = BambooPolicy(rate=10, burst=20, max_attempts=5)
+        try:
+            bamboo.send_command(bamboo.get_plan_list, project_name="@all")
+        except BambooRetryableError:
+            pass
+        bamboo.policy.stats()
+    """
+    def __init__(self, rate=None, burst=None, max_attempts=4, base_delay=0.5, max_delay=30, retry_ratio=0.1,
+                 retry_burst=10, failure_threshold=5, reset_timeout=30, classify=classify_error):
+        self.limiter = BambooRateLimiter(rate, burst) if rate else None
+        self.breaker = (BambooCircuitBreaker(failure_threshold, reset_timeout)
+                        if failure_threshold else None)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_ratio = retry_ratio
+        self.retry_burst = retry_burst
+        self.retry_tokens = float(retry_burst)
+        self.classify = classify
+        self.counters = dict(calls=0, attempts=0, retries=0, failures=0, fatal=0, rejected=0, budget_exhausted=0)
+        self.lock = threading.Lock()
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _take_retry_token(self):
+        with self.lock:
+            if self.retry_tokens < 1:
+                self.counters['budget_exhausted'] += 1
+                return False
+            self.retry_tokens -= 1
+            self.counters['retries'] += 1
+            return True
+
+    def backoff(self, attempt):
+        """Returns the seconds to wait before the given retry, drawn uniformly up to the exponential bound"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def retryable(self, action_name, error_class, error=None):
+        if action_name == 'run' and error is not None and run_reply_applied(error):
+            return False
+        if error_class == ERROR_UNREACHABLE:
+            return True
+        return error_class == ERROR_TRANSIENT and action_name not in MUTATING_ACTION_NAMES
+
+    def call(self, action_name, function, *args, **kwargs):
+        """Calls function, which sends the action, under the policy and returns its result"""
+        with self.lock:
+            self.counters['calls'] += 1
+            self.retry_tokens = min(self.retry_burst, self.retry_tokens + self.retry_ratio)
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                try:
+                    self.breaker.before()
+                except BambooCircuitOpenError:
+                    self._count('rejected')
+                    raise
+            if self.limiter is not None:
+                self.limiter.acquire()
+            self._count('attempts')
+            try:
+                result = function(*args, **kwargs)
+            except Exception as call_exception:
+                if isinstance(call_exception, BambooCancelledError) and not call_exception.retryable:
+                    # the caller gave up, which tells nothing about the server health
+                    if self.breaker is not None:
+                        self.breaker.release()
+                    raise
+                error_class = self.classify(call_exception)
+                if error_class == ERROR_FATAL:
+                    # the server answered, so it is healthy even though the action failed
+                    self._count('fatal')
+                    if self.breaker is not None:
+                        self.breaker.success()
+                    raise
+                self._count('failures')
+                if self.breaker is not None:
+                    self.breaker.failure()
+                if (not self.retryable(action_name, error_class, call_exception) or attempt >= self.max_attempts or
+                        not self._take_retry_token()):
+                    raise BambooRetryableError(call_exception, attempt)
+                time.sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                if self.breaker is not None:
+                    self.breaker.release()
+                raise
+            if self.breaker is not None:
+                self.breaker.success()
+            return result
+
+    def stats(self):
+        """Returns the counters, the circuit state and the seconds spent waiting for the rate limit"""
+        with self.lock:
+            stats = dict(self.counters, retry_budget=self.retry_tokens)
+        stats['circuit'] = self.breaker.state if self.breaker is not None else None
+        stats['throttled_seconds'] = self.limiter.waited if self.limiter is not None else 0.0
+        return stats
@@ -0,0 +1,311 @@
+# !/usr/bin/env python
+# title           : BambooScheduler.py
+# description     : Client side dispatch of queued builds. Builds wait in priority classes and are only queued on
+#                   the bamboo server when agents are free and their plan is below its concurrency cap, the next
+#                   ones are released as the running builds finish.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : dispatcher = BambooDispatcher(bamboo); dispatcher.submit("XXX-DEF", priority="critical")
+# notes           : finished builds are tracked with a BuildWatcher, free agents are read with getAgentList.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import collections
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import re
+import threading
+import time
+
+from .BambooCLI import BambooException
+from .BambooParser import BuildState, first_value, iter_records, read_all_records
+from .BambooWatcher import BuildWatcher
+
+DISPATCH_PRIORITIES = ('critical', 'high', 'normal', 'low')
+
+BambooDispatchResult = collections.namedtuple('BambooDispatchResult', ['plan', 'build', 'state'])
+
+_BUILD_KEY = re.compile(r'\b([A-Z0-9_]+-[A-Z0-9_]+-\d+)\b')
+
+
+def queued_build_key(reply, plan=None):
+    """Returns the build key a queueBuild reply reports, the key of the plan if it names several"""
+    text = reply.decode('utf-8', 'replace') if isinstance(reply, bytes) else reply
+    keys = _BUILD_KEY.findall(text)
+    for key in keys:
+        if plan is not None and key.startswith(plan + '-'):
+            return key
+    if keys:
+        return keys[0]
+    raise BambooException(str.format('no build key found in the queueBuild reply: {0}', text.strip()))
+
+
+class _Dispatch(object):
+    __slots__ = ('plan', 'priority', 'agents', 'kwargs', 'future', 'submitted', 'build')
+
+    def __init__(self, plan, priority, agents, kwargs):
+        self.plan = plan
+        self.priority = priority
+        self.agents = agents
+        self.kwargs = kwargs
+        self.future = concurrent.futures.Future()
+        self.submitted = time.time()
+        self.build = None
+
+
+class BambooDispatcher(object):
+    """
+    Holds builds back on the client and queues them through queue_build in priority order, as many as there are
+    free agents. The free agents are counted from the whole get_agent_info list with exclude_disabled, enabled
+    agents which are not busy, every refresh_interval seconds, less the agents of the builds the dispatcher queued
+    which have not started yet. Between two counts the dispatcher keeps its own budget: queued builds take agents
+    from it, finished builds give them back, which releases the next builds right away. When the first count
+    fails the pending builds fail with its error. A plan never has more than its cap of builds queued or running,
+    so a flood of one plan does not take all agents. The builds are queued with one run action per dispatch round
+    and watched with a BuildWatcher.
+    Arguments:
+        actions: BambooActions instance used for sending the actions.
+        watcher: BuildWatcher used for the queued builds, one is created and closed with the dispatcher when
+                 not given. (Optional)
+        plan_limit: number of builds of a plan queued or running at the same time. (Optional)
+        plan_limits: dict of plan key to its own cap. (Optional)
+        agent_headroom: free agents left for builds queued by others. (Optional)
+        refresh_interval: seconds between two counts of the free agents. (Optional)
+        build_timeout: seconds a queued build may take before its future fails. (Optional)
+    Examples:
+        with BambooDispatcher(bamboo, plan_limit=2, plan_limits={"XXX-DEF": 4}) as dispatcher:
+            futures = [dispatcher.submit("XXX-DEF", priority="critical")]
+            futures += [dispatcher.submit("XXX-GHI", priority="low", branch=branch) for branch in branches]
+            for future in concurrent.futures.as_completed(futures):
+                print(future.result().build, future.result().state)
+    """
+    def __init__(self, actions, watcher=None, plan_limit=2, plan_limits=None, agent_headroom=0,
+                 refresh_interval=15.0, build_timeout=None):
+        self.actions = actions
+        self.owned_watcher = watcher is None
+        self.watcher = watcher if watcher is not None else BuildWatcher(actions)
+        self.plan_limit = plan_limit
+        self.plan_limits = dict(plan_limits or dict())
+        self.agent_headroom = agent_headroom
+        self.refresh_interval = refresh_interval
+        self.build_timeout = build_timeout
+        self.pending = list()
+        self.sequence = itertools.count()
+        self.running = collections.Counter()
+        self.unstarted = dict()
+        self.futures = set()
+        self.budget = 0
+        self.capacity = 0
+        self.refreshed = None
+        self.counters = dict(submitted=0, dispatched=0, finished=0, failed=0)
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='bamboo-dispatcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(wait=exc_type is None)
+
+    def submit(self, plan_name, priority='normal', agents=1, **kwargs):
+        """
+        Adds a build of a plan to the dispatch queue and returns a future resolving to a
+        BambooDispatchResult(plan, build, state) once the build is final.
+        Arguments:
+            plan_name: name/id of the plan. (Mandatory)
+            priority: one of DISPATCH_PRIORITIES. (Optional)
+            agents: number of agents the build occupies, like the jobs of its largest stage. (Optional)
+            kwargs: other queue_build arguments like branch, revision or field. (Optional)
+        """
+        if priority not in DISPATCH_PRIORITIES:
+            raise BambooException(str.format('{0} is not one of the priorities {1}', priority, DISPATCH_PRIORITIES))
+        dispatch = _Dispatch(plan_name, DISPATCH_PRIORITIES.index(priority), agents, kwargs)
+        with self.condition:
+            if self.closed:
+                raise BambooException('dispatcher is closed')
+            heapq.heappush(self.pending, (dispatch.priority, next(self.sequence), dispatch))
+            self.futures.add(dispatch.future)
+            self.counters['submitted'] += 1
+            self.condition.notify_all()
+        dispatch.future.add_done_callback(self._forget)
+        return dispatch.future
+
+    def _forget(self, future):
+        with self.condition:
+            self.futures.discard(future)
+
+    def free_agents(self):
+        """Returns the number of enabled online agents and how many of them are not busy"""
+        agents, free = 0, 0
+        for record in read_all_records(self.actions, self.actions.get_agent_info, exclude_disabled=True):
+            if first_value(record, 'enabled') is False or first_value(record, 'online', 'active') is False:
+                continue
+            agents += 1
+            if first_value(record, 'busy') is not True:
+                free += 1
+        return agents, free
+
+    def _limit(self, plan):
+        return self.plan_limits.get(plan, self.plan_limit)
+
+    def _take(self):
+        # the best pending build whose plan is below its cap, the skipped ones keep their place
+        skipped, found = list(), None
+        while self.pending:
+            item = heapq.heappop(self.pending)
+            dispatch = item[2]
+            if dispatch.future.cancelled():
+                continue
+            # a build needing more agents than the budget goes once nothing else runs, rather than never
+            if (self.running[dispatch.plan] < self._limit(dispatch.plan) and
+                    (dispatch.agents <= self.budget or not self.running)):
+                if dispatch.future.set_running_or_notify_cancel():
+                    found = dispatch
+                    break
+                continue
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self.pending, item)
+        return found
+
+    def _queued_agents(self):
+        # the agents taken by the builds queued by the dispatcher which have not started yet
+        with self.condition:
+            by_plan = collections.defaultdict(list)
+            for build, dispatch in self.unstarted.items():
+                by_plan[dispatch.plan].append(build)
+        started = set()
+        for plan, builds in by_plan.items():
+            try:
+                for record in iter_records(self.actions, self.actions.get_build_list, plan_name=plan,
+                                           columns='build,state', limit=max(25, 2 * len(builds))):
+                    state = getattr(record, 'state', None)
+                    if isinstance(state, BuildState) and (state.final or state is BuildState.IN_PROGRESS):
+                        started.add(record.build)
+            except BambooException:
+                # the builds of the plan keep counting as not started
+                continue
+        with self.condition:
+            for build in started:
+                self.unstarted.pop(build, None)
+            return sum(dispatch.agents for dispatch in self.unstarted.values())
+
+    def _refresh(self):
+        # the builds are checked before the agents, a build starting in between is counted twice rather than never
+        try:
+            queued = self._queued_agents()
+            agents, free = self.free_agents()
+        except BambooException as refresh_exception:
+            agents, free, error = None, None, refresh_exception
+        failed = list()
+        with self.condition:
+            if free is not None:
+                self.capacity = agents - self.agent_headroom
+                self.budget = free - self.agent_headroom - queued
+                self.refreshed = time.time()
+            elif self.refreshed is None:
+                # without a first count nothing would ever be dispatched, the next submit counts again
+                failed, self.pending = [item[2] for item in self.pending], list()
+            else:
+                self.refreshed = time.time()
+        for dispatch in failed:
+            if dispatch.future.set_running_or_notify_cancel():
+                dispatch.future.set_exception(error)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self.pending:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                due = self.refreshed is None or time.time() - self.refreshed >= self.refresh_interval
+            if due:
+                self._refresh()
+            with self.condition:
+                if self.refreshed is None:
+                    continue
+                picked = list()
+                while self.budget > 0:
+                    dispatch = self._take()
+                    if dispatch is None:
+                        break
+                    self.budget -= dispatch.agents
+                    self.running[dispatch.plan] += 1
+                    picked.append(dispatch)
+                if not picked:
+                    # woken up early by finished or submitted builds
+                    self.condition.wait(max(self.refreshed + self.refresh_interval - time.time(), 0.1))
+                    continue
+            self._dispatch(picked)
+
+    def _dispatch(self, picked):
+        with self.actions.batch(max_size=0, continues=True):
+            results = [self.actions.send_command(self.actions.queue_build, plan_name=dispatch.plan, **dispatch.kwargs)
+                       for dispatch in picked]
+        for dispatch, batch_result in zip(picked, results):
+            try:
+                dispatch.build = queued_build_key(batch_result.result(), dispatch.plan)
+                with self.condition:
+                    # until the server shows it started the build takes agents the agent list has as free
+                    self.unstarted[dispatch.build] = dispatch
+                self.watcher.watch(dispatch.build, timeout=self.build_timeout,
+                                   callback=functools.partial(self._finished, dispatch))
+            except Exception as dispatch_exception:
+                self._release(dispatch, 'failed', returned_agents=True)
+                dispatch.future.set_exception(dispatch_exception)
+                continue
+            with self.condition:
+                self.counters['dispatched'] += 1
+
+    def _release(self, dispatch, counter, returned_agents):
+        with self.condition:
+            self.running[dispatch.plan] -= 1
+            if not self.running[dispatch.plan]:
+                del self.running[dispatch.plan]
+            self.unstarted.pop(dispatch.build, None)
+            if returned_agents:
+                # a build which finished before the last count is free in it already
+                self.budget = min(self.budget + dispatch.agents, self.capacity)
+            self.counters[counter] += 1
+            self.condition.notify_all()
+
+    def _finished(self, dispatch, watch_future):
+        error = watch_future.exception()
+        self._release(dispatch, 'failed' if error is not None else 'finished', returned_agents=True)
+        if error is not None:
+            dispatch.future.set_exception(error)
+        else:
+            dispatch.future.set_result(BambooDispatchResult(dispatch.plan, dispatch.build, watch_future.result()))
+
+    def stats(self):
+        """Returns the counters, the pending builds per priority, the running builds per plan and the budget"""
+        with self.condition:
+            pending = collections.Counter(DISPATCH_PRIORITIES[item[0]] for item in self.pending)
+            return dict(self.counters, pending=dict(pending), running=dict(self.running), budget=self.budget)
+
+    def close(self, wait=True, timeout=None):
+        """
+        Stops dispatching. With wait the builds already submitted are dispatched and waited for first, otherwise
+        the pending ones are cancelled.
+        """
+        if wait:
+            with self.condition:
+                futures = list(self.futures)
+            concurrent.futures.wait(futures, timeout=timeout)
+        with self.condition:
+            self.closed = True
+            for item in self.pending:
+                item[2].future.cancel()
+            self.pending = list()
+            self.condition.notify_all()
+        self.thread.join()
+        if self.owned_watcher:
+            self.watcher.close()
@@ -0,0 +1,234 @@
+# !/usr/bin/env python
+# title           : BambooSession.py
+# description     : Keeps long running acli "run" processes alive and feeds them action commands through stdin,
+#                   so the JVM startup and the login to the bamboo server are only paid once per session.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : assign a BambooSessionPool to BambooActions.session_pool, send_command will use it.
+# notes           : commands containing line breaks cannot be sent through stdin and are run the usual way.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+from .BambooCLI import BambooException, RUN_ENTRY_PREFIX, kill_process_group
+
+
+class BambooSession(object):
+    """
+    A single acli process running the run action and reading action commands from standard input. After every
+    command a sentinel action carrying a unique token is written, the echo of the sentinel marks the end of
+    the command output.
+    Arguments:
+        actions: BambooActions instance used for rendering the run action.
+        timeout: seconds to wait for the output of a single command before the session is treated as hung.
+    """
+    def __init__(self, actions, timeout=300):
+        self.actions = actions
+        self.timeout = timeout
+        self.uses = 0
+        self.broken = False
+        self.process = actions.open_command(actions.run(continues=True), stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self._read_output, name='bamboo-session-reader')
+        self.reader.daemon = True
+        self.reader.start()
+
+    def _read_output(self):
+        for line in iter(self.process.stdout.readline, b''):
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def alive(self):
+        """Returns True while the acli process is running and has not failed a read"""
+        return not self.broken and self.process.poll() is None
+
+    def _next_line(self, deadline, call_deadline=None, command=None, reply=()):
+        while True:
+            wait = deadline - time.time()
+            if call_deadline is not None and call_deadline.wait_interval() is not None:
+                wait = min(wait, call_deadline.wait_interval())
+            try:
+                line = self.lines.get(timeout=max(wait, 0))
+                break
+            except queue.Empty:
+                if call_deadline is not None and call_deadline.stopped():
+                    # the rest of the reply would be read by the next command, so the session is dropped
+                    self.broken = True
+                    raise call_deadline.error(command, b''.join(reply))
+                if time.time() >= deadline:
+                    self.broken = True
+                    raise BambooException(str.format('acli session did not answer within {0} seconds',
+                                                     self.timeout))
+        if line is None:
+            self.broken = True
+            raise BambooException(str.format('acli session exited with {0}', self.process.wait()))
+        return line
+
+    @staticmethod
+    def _sentinel():
+        return str.format('--action getClientInfo --comment "bamboo-session-{0}"', uuid.uuid4().hex)
+
+    def _write(self, *commands):
+        try:
+            for command in commands:
+                self.process.stdin.write(command.encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+        except (OSError, ValueError) as write_exception:
+            self.broken = True
+            raise BambooException(write_exception)
+
+    def send(self, command):
+        """
+        Sends one action command to the session and returns its reply. ACLI errors reported for the command
+        are raised as BambooException, the session stays usable for the next command. A command stopped by the
+        deadline of the calling thread breaks the session.
+        """
+        call_deadline = self.actions.call_deadline()
+        if call_deadline is not None:
+            call_deadline.check(command)
+        sentinel = self._sentinel()
+        self._write(command, sentinel)
+        sentinel = sentinel.encode('utf-8')
+        self.uses += 1
+        deadline = time.time() + self.timeout
+
+        # skip what is left of the previous sentinel output until the echo of this command
+        while not self._next_line(deadline, call_deadline, command).startswith(RUN_ENTRY_PREFIX):
+            pass
+        reply = list()
+        while True:
+            line = self._next_line(deadline, call_deadline, command, reply)
+            if line.startswith(RUN_ENTRY_PREFIX) and sentinel in line:
+                break
+            reply.append(line)
+        reply = b''.join(reply)
+
+        error = self.actions.find_reply_error(reply)
+        if error is not None:
+            raise BambooException(error)
+        return reply
+
+    def check(self, timeout=30):
+        """Health check which sends only a sentinel and waits for its echo"""
+        sentinel = self._sentinel()
+        self._write(sentinel)
+        deadline = time.time() + timeout
+        while sentinel.encode('utf-8') not in self._next_line(deadline):
+            pass
+        return True
+
+    def close(self, timeout=10):
+        """Closes standard input so acli ends the run, and kills its process group if it does not exit in time"""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_group(self.process, grace=0)
+
+
+class BambooSessionPool(object):
+    """
+    Pool of warm acli sessions shared by all threads using a BambooActions instance. Sessions are started on
+    demand up to size, recycled after max_uses commands and replaced when they crash or hang.
+    Arguments:
+        actions: BambooActions instance the pool sends commands for.
+        size: maximum number of acli sessions running at the same time. (Optional)
+        timeout: seconds to wait for the output of a single command. (Optional)
+        max_uses: number of commands after which a session is restarted. (Optional)
+    Examples:
+        bamboo.session_pool = BambooSessionPool(bamboo, size=4)
+        bamboo.send_command(bamboo.get_plan_list)
+        bamboo.session_pool.close()
+    """
+    def __init__(self, actions, size=2, timeout=300, max_uses=500):
+        self.actions = actions
+        self.size = size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.recycled = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _acquire(self):
+        self.slots.acquire()
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                try:
+                    return BambooSession(self.actions, timeout=self.timeout)
+                except Exception:
+                    self.slots.release()
+                    raise
+            if session.alive():
+                return session
+            self._discard(session)
+
+    def _release(self, session):
+        if self.closed or not session.alive() or session.uses >= self.max_uses:
+            self._discard(session)
+        else:
+            self.idle.put(session)
+        self.slots.release()
+
+    def _discard(self, session):
+        self.recycled += 1
+        session.close(timeout=0 if session.broken else 10)
+
+    def send(self, command):
+        """Sends an action command through an idle session and returns its reply"""
+        if self.closed:
+            raise BambooException('session pool is closed')
+        if '\n' in command or '\r' in command:
+            return self.actions.execute_command(command)
+        session = self._acquire()
+        try:
+            return session.send(command)
+        finally:
+            self._release(session)
+
+    def check(self, timeout=30):
+        """Health checks all idle sessions and replaces the ones which do not answer. Returns the healthy count"""
+        healthy = list()
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if session.alive() and session.check(timeout=timeout):
+                    healthy.append(session)
+                    continue
+            except BambooException:
+                pass
+            self._discard(session)
+        for session in healthy:
+            self.idle.put(session)
+        return len(healthy)
+
+    def close(self):
+        """Stops all idle sessions. Sessions in use are stopped when they are released"""
+        self.closed = True
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
@@ -0,0 +1,199 @@
+# !/usr/bin/env python
+# title           : BambooSnapshot.py
+# description     : Exports the topology of the plans of a project (stages, jobs, tasks, requirements, repositories
+#                   and branches) into one compact local file. Plans are read concurrently with two run actions
+#                   each, and a refresh reports which plans changed since the last snapshot.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : write_snapshot(bamboo, "topology.jsonl"); BambooSnapshot("topology.jsonl").load("XXX-DEF")
+# notes           : the file is a json header line with the index followed by one json line per plan. ACLI has
+#                   no modification time of a plan, a refresh reads every plan again.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import os
+
+from .BambooCLI import BambooException
+from .BambooParser import first_value, iter_partitioned
+from .BambooPlanSpec import fetch_plan_state
+
+SNAPSHOT_FORMAT = 'bamboo-topology'
+SNAPSHOT_VERSION = 1
+
+
+def _json_value(value):
+    if isinstance(value, set):
+        return sorted(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def plan_fingerprint(line):
+    """Returns a digest of the topology line of a plan, it changes whenever its stages, jobs, tasks, requirements,
+    repositories, branches or details do"""
+    return hashlib.sha1(line).hexdigest()
+
+
+class BambooSnapshot(object):
+    """
+    Reads a snapshot file written by write_snapshot. Only the header line with the index is parsed when the
+    snapshot is opened, load seeks straight to the line of the plan.
+    Arguments:
+        path: path of the snapshot file.
+    Examples:
+        with BambooSnapshot("topology.jsonl") as snapshot:
+            for plan in snapshot.plans():
+                print(plan, len(snapshot.load(plan)["jobs"]))
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        header_line = self.file.readline()
+        try:
+            self.header = json.loads(header_line.decode('utf-8'))
+        except ValueError:
+            self.file.close()
+            raise BambooException(str.format('{0} is not a bamboo topology snapshot', path))
+        if self.header.get('format') != SNAPSHOT_FORMAT or self.header.get('version', 0) > SNAPSHOT_VERSION:
+            self.file.close()
+            raise BambooException(str.format('{0} is not a version {1} bamboo topology snapshot', path,
+                                              SNAPSHOT_VERSION))
+        self.data_offset = len(header_line)
+        self.index = self.header['index']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __contains__(self, plan):
+        return plan in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self.file.close()
+
+    def plans(self):
+        """Returns the plan keys in the snapshot, sorted"""
+        return sorted(self.index)
+
+    def fingerprint(self, plan):
+        return self.index[plan][2] if plan in self.index else None
+
+    def raw(self, plan):
+        """Returns the json line of the plan as bytes"""
+        offset, length, _ = self.index[plan]
+        self.file.seek(self.data_offset + offset)
+        return self.file.read(length)
+
+    def load(self, plan):
+        """Returns the topology of the plan as a dict like fetch_plan_state returns, with lists instead of sets"""
+        if plan not in self.index:
+            raise BambooException(str.format('{0} is not in the snapshot {1}', plan, self.path))
+        return json.loads(self.raw(plan).decode('utf-8'))
+
+
+def _fetch_plan(actions, plan, max_size):
+    state = fetch_plan_state(actions, plan, max_size=max_size)
+    if not state['exists']:
+        raise BambooException(str.format('{0} could not be read', plan))
+    return json.dumps(state, sort_keys=True, separators=(',', ':'), default=_json_value).encode('utf-8') + b'\n'
+
+
+def write_snapshot(actions, path, project_name='@all', max_workers=8, max_size=50, prefix='', **kwargs):
+    """
+    Writes the topology of all the plans of a project to path. The plans are listed with iter_partitioned, so
+    projects of any size are read whole, and every plan is read with fetch_plan_state. The getPlanList row of a
+    plan does not change when its stages, jobs or tasks do and ACLI has no modification time of a plan, so a
+    refresh reads every plan again. When path already holds a snapshot the plans whose topology is the same are
+    counted as unchanged, the others as changed. The new file is written next to path and replaces it once
+    complete. Returns a dict with the number of plans written, fetched, changed and unchanged, and the plans
+    which failed, which are kept from the old snapshot if possible.
+    Arguments:
+        actions: BambooActions instance used for sending the actions. (Mandatory)
+        path: path of the snapshot file. (Mandatory)
+        project_name: project whose plans are exported, @all for every project. (Optional)
+        max_workers: number of plans read at the same time. (Optional)
+        max_size: number of actions sent per run action. (Optional)
+        prefix: only export the plans whose key starts with it. (Optional)
+        kwargs: other get_plan_list arguments like labels or exclude_disabled. (Optional)
+    Examples:
+        write_snapshot(bamboo, "topology.jsonl", project_name="XXX", max_workers=16)
+        stats = write_snapshot(bamboo, "topology.jsonl", project_name="XXX", prefix="XXX-NIGHTLY")
+        print(stats["changed"])
+    """
+    previous = None
+    if os.path.exists(path):
+        try:
+            previous = BambooSnapshot(path)
+        except BambooException:
+            previous = None
+    plans = set()
+    for record in iter_partitioned(actions, actions.get_plan_list, prefix=prefix, project_name=project_name,
+                                   **kwargs):
+        plan = first_value(record, 'key', 'plan')
+        if plan is not None:
+            plans.add(plan)
+
+    stats = dict(plans=0, fetched=0, changed=0, unchanged=0, failed=dict())
+    index = dict()
+    data_path = path + '.data'
+    try:
+        with open(data_path, 'wb') as data_file:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = dict((executor.submit(_fetch_plan, actions, plan, max_size), plan)
+                               for plan in sorted(plans))
+                for future in concurrent.futures.as_completed(futures):
+                    plan = futures[future]
+                    error = future.exception()
+                    if error is None:
+                        line = future.result()
+                        fingerprint = plan_fingerprint(line)
+                        index[plan] = (data_file.tell(), len(line), fingerprint)
+                        data_file.write(line)
+                        stats['plans'] += 1
+                        stats['fetched'] += 1
+                        if previous is not None and previous.fingerprint(plan) == fingerprint:
+                            stats['unchanged'] += 1
+                        else:
+                            stats['changed'] += 1
+                        continue
+                    stats['failed'][plan] = error
+                    # an outdated topology is kept rather than dropping the plan, without a fingerprint it
+                    # counts as changed on the next refresh
+                    if previous is not None and plan in previous:
+                        line = previous.raw(plan)
+                        index[plan] = (data_file.tell(), len(line), None)
+                        data_file.write(line)
+                        stats['plans'] += 1
+        if previous is not None:
+            previous.close()
+            previous = None
+
+        header = dict(format=SNAPSHOT_FORMAT, version=SNAPSHOT_VERSION, project=project_name,
+                      created=datetime.datetime.now().isoformat(), index=index)
+        new_path = path + '.new'
+        with open(new_path, 'wb') as snapshot_file, open(data_path, 'rb') as data_file:
+            snapshot_file.write(json.dumps(header, sort_keys=True, separators=(',', ':')).encode('utf-8') + b'\n')
+            while True:
+                chunk = data_file.read(1024 * 1024)
+                if not chunk:
+                    break
+                snapshot_file.write(chunk)
+        os.replace(new_path, path)
+    finally:
+        if previous is not None:
+            previous.close()
+        if os.path.exists(data_path):
+            os.remove(data_path)
+    return stats
@@ -0,0 +1,219 @@
+# !/usr/bin/env python
+# title           : BambooWatcher.py
+# description     : Waits for many queued builds with one shared polling loop instead of one blocked acli process
+#                   per build. The states of the watched builds of a plan are read with a single getBuildList.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : watcher = BuildWatcher(bamboo); future = watcher.watch("XXX-DEF-232"); future.result()
+# notes           : the futures are concurrent.futures.Future objects resolving to the final BuildState.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import concurrent.futures
+import threading
+import time
+
+from .BambooCLI import BambooException
+from .BambooParser import BuildState, get_build_state, iter_records
+
+
+def split_build_key(build):
+    """Splits a build key like XXX-DEF-232 into the plan key XXX-DEF and the build number 232"""
+    plan, separator, number = str(build).rpartition('-')
+    if not separator or not number.isdigit():
+        raise BambooException(str.format('{0} is not a build key with a build number', build))
+    return plan, int(number)
+
+
+class _WatchedBuild(object):
+    __slots__ = ('build', 'plan', 'future', 'deadline', 'expected_duration', 'started', 'interval', 'next_poll')
+
+    def __init__(self, build, plan, future, deadline, expected_duration, interval):
+        self.build = build
+        self.plan = plan
+        self.future = future
+        self.deadline = deadline
+        self.expected_duration = expected_duration
+        self.started = time.time()
+        self.interval = interval
+        self.next_poll = self.started
+
+
+class BuildWatcher(object):
+    """
+    Tracks queued builds until they reach a final state. A single background thread polls the due builds, the
+    builds of the same plan with one getBuildList, and falls back to getBuild for builds missing from the list.
+    The poll interval of a build follows its expected duration: rare polls early on, frequent ones when the build
+    is about to finish, and backing off once it runs longer than expected.
+    Arguments:
+        actions: BambooActions instance used for sending the actions.
+        min_interval: shortest number of seconds between two polls of a build. (Optional)
+        max_interval: longest number of seconds between two polls of a build. (Optional)
+        max_workers: number of plans polled at the same time. (Optional)
+        history: BambooBuildHistory whose average plan duration, in seconds, is used as expected duration of
+                 builds watched without one. (Optional)
+    Examples:
+        with BuildWatcher(bamboo, min_interval=10) as watcher:
+            futures = watcher.watch_all(["XXX-DEF-232", "XXX-GHI-17"], timeout=3600)
+            for future in concurrent.futures.as_completed(futures.values(), timeout=7200):
+                print(future.result())
+    """
+    def __init__(self, actions, min_interval=5.0, max_interval=120.0, max_workers=4, history=None):
+        self.actions = actions
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.history = history
+        self.watched = dict()
+        self.closed = False
+        self.condition = threading.Condition()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.thread = threading.Thread(target=self._run, name='bamboo-build-watcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _expected_duration(self, plan):
+        if self.history is None:
+            return None
+        return self.history.duration_stats(plan).get('average')
+
+    def watch(self, build, timeout=None, callback=None, expected_duration=None):
+        """
+        Starts watching a build and returns a future resolving to its final BuildState. The future fails with a
+        BambooException when the build is not final within timeout seconds.
+        Arguments:
+            build: build key with the build number, like XXX-DEF-232. (Mandatory)
+            timeout: seconds to wait for this build. (Optional)
+            callback: called with the future once it is done. (Optional)
+            expected_duration: typical duration of the build in seconds. (Optional)
+        """
+        plan, _ = split_build_key(build)
+        with self.condition:
+            if self.closed:
+                raise BambooException('build watcher is closed')
+            watched = self.watched.get(build)
+            if watched is None:
+                if expected_duration is None:
+                    expected_duration = self._expected_duration(plan)
+                deadline = None if timeout is None else time.time() + timeout
+                watched = _WatchedBuild(build, plan, concurrent.futures.Future(), deadline, expected_duration,
+                                        self.min_interval)
+                self.watched[build] = watched
+                self.condition.notify()
+        if callback is not None:
+            watched.future.add_done_callback(callback)
+        return watched.future
+
+    def watch_all(self, builds, timeout=None, callback=None):
+        """Watches all builds and returns a dict of build key to future"""
+        return dict((build, self.watch(build, timeout=timeout, callback=callback)) for build in builds)
+
+    def wait(self, builds=None, timeout=None):
+        """
+        Blocks until the given builds, or all watched ones, are done or the overall timeout elapsed. Returns a
+        dict of build key to final BuildState, or to the exception of builds which failed or did not finish.
+        """
+        with self.condition:
+            futures = dict((build, self.watched[build].future if build in self.watched else self.watch(build))
+                           for build in (builds if builds is not None else list(self.watched)))
+        concurrent.futures.wait(futures.values(), timeout=timeout)
+        results = dict()
+        for build, future in futures.items():
+            if future.done():
+                results[build] = future.exception() or future.result()
+            else:
+                results[build] = BambooException(str.format('{0} is still running', build))
+        return results
+
+    def _schedule(self, watched, now):
+        elapsed = now - watched.started
+        if watched.expected_duration and elapsed < watched.expected_duration:
+            interval = (watched.expected_duration - elapsed) / 2.0
+        else:
+            interval = watched.interval * 1.5
+        watched.interval = min(max(interval, self.min_interval), self.max_interval)
+        watched.next_poll = now + watched.interval
+        if watched.deadline is not None:
+            # a build running into its timeout fails at the deadline, not at the poll after it
+            watched.next_poll = min(watched.next_poll, watched.deadline)
+
+    def _plan_states(self, plan, builds):
+        states = dict()
+        try:
+            limit = max(25, 2 * len(builds))
+            for record in iter_records(self.actions, self.actions.get_build_list, plan_name=plan,
+                                       columns='build,number,state', limit=limit):
+                if getattr(record, 'build', None) in builds and isinstance(record.state, BuildState):
+                    states[record.build] = record.state
+        except BambooException:
+            pass
+        for build in builds:
+            if build not in states:
+                try:
+                    states[build] = get_build_state(self.actions, build)
+                except BambooException:
+                    states[build] = None
+        return states
+
+    def _poll(self, due):
+        by_plan = dict()
+        for watched in due:
+            by_plan.setdefault(watched.plan, list()).append(watched.build)
+        futures = [self.executor.submit(self._plan_states, plan, builds) for plan, builds in by_plan.items()]
+        states = dict()
+        for future in futures:
+            states.update(future.result())
+
+        now = time.time()
+        with self.condition:
+            for watched in due:
+                if self.watched.get(watched.build) is not watched:
+                    continue
+                state = states.get(watched.build)
+                if state is not None and state.final:
+                    del self.watched[watched.build]
+                    watched.future.set_result(state)
+                elif watched.deadline is not None and now >= watched.deadline:
+                    del self.watched[watched.build]
+                    watched.future.set_exception(BambooException(str.format(
+                        '{0} did not finish in time, last state {1}', watched.build, state)))
+                else:
+                    self._schedule(watched, now)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self.watched:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                now = time.time()
+                due = [watched for watched in self.watched.values() if watched.next_poll <= now]
+                if not due:
+                    self.condition.wait(min(watched.next_poll for watched in self.watched.values()) - now)
+                    continue
+            try:
+                self._poll(due)
+            except Exception:
+                # keep the loop alive, the builds are polled again after their next interval
+                with self.condition:
+                    for watched in due:
+                        self._schedule(watched, time.time())
+
+    def close(self):
+        """Stops the polling loop. Builds still watched get a BambooException"""
+        with self.condition:
+            self.closed = True
+            watched_builds, self.watched = list(self.watched.values()), dict()
+            self.condition.notify_all()
+        for watched in watched_builds:
+            watched.future.set_exception(BambooException(str.format('stopped watching {0}', watched.build)))
+        self.thread.join()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,112 @@
+# !/usr/bin/env python
+# title           : __main__.py
+# description     : Command line entry point. "daemon" serves BambooActions over a Unix socket with warm acli
+#                   sessions, "call" sends a single action through a running daemon or straight to acli.
+# author          : monkey-coder
+# creation date   : 18/10/2026
+# last updated    : 18/10/2026
+# version         : 1.0
+# usage           : python -m atlassian_bamboo_cli daemon --acli-directory /opt/acli --server realbamboo
+#                   python -m atlassian_bamboo_cli call get_plan_list project_name=XXX
+# notes           : call arguments are key=value pairs, values are read as json and taken as text otherwise.
+# python_version  : 3.9.2
+# ==============================================================================
+
+import argparse
+import json
+import os
+import signal
+import sys
+
+from .BambooCLI import ACTION_NAMES, BambooActions, BambooException
+from .BambooDaemon import BambooClient, BambooDaemon
+
+
+def _action_arguments(pairs):
+    kwargs = dict()
+    for pair in pairs:
+        key, separator, value = pair.partition('=')
+        if not separator:
+            raise BambooException(str.format('{0} is not a key=value argument', pair))
+        try:
+            kwargs[key] = json.loads(value)
+        except ValueError:
+            kwargs[key] = value
+    return kwargs
+
+
+def _actions(options):
+    if not options.acli_directory:
+        raise BambooException('--acli-directory or BAMBOO_CLI_ACLI_DIRECTORY is needed to run acli')
+    if not options.server:
+        raise BambooException('--server or BAMBOO_CLI_SERVER is needed to run acli')
+    return BambooActions(options.project, options.acli_directory, options.server, use_shell=False)
+
+
+def run_daemon(options):
+    daemon = BambooDaemon(_actions(options), socket_path=options.socket, pool_size=options.pool_size,
+                          timeout=options.timeout, max_uses=options.max_uses)
+    # a terminated daemon removes its socket and stops the acli sessions like an interrupted one
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+    with daemon:
+        print(str.format('bamboo daemon listening on {0}', daemon.socket_path), file=sys.stderr)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def run_call(options):
+    kwargs = _action_arguments(options.arguments)
+    if options.direct:
+        actions = _actions(options)
+        reply = actions.send_command(getattr(actions, options.action), **kwargs)
+    else:
+        with BambooClient(options.socket, timeout=options.timeout) as client:
+            reply = client.send_command(options.action, **kwargs)
+    output = getattr(sys.stdout, 'buffer', None)
+    if output is None:
+        sys.stdout.write(reply.decode('utf-8', 'replace'))
+    else:
+        output.write(reply)
+        output.flush()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m atlassian_bamboo_cli',
+                                     description='Send Atlassian CLI actions for Bamboo.')
+    # resolved by the daemon or the client when needed, call --direct never needs a socket
+    parser.add_argument('--socket', default=None,
+                        help='Unix socket of the daemon, BAMBOO_CLI_SOCKET or a per user path by default')
+    parser.add_argument('--acli-directory', default=os.environ.get('BAMBOO_CLI_ACLI_DIRECTORY'),
+                        help='directory of the acli executable')
+    parser.add_argument('--server', default=os.environ.get('BAMBOO_CLI_SERVER'),
+                        help='bamboo server name of the ACLI.properties file')
+    parser.add_argument('--project', default=os.environ.get('BAMBOO_CLI_PROJECT'), help='bamboo project name')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for a single action')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    daemon_parser = commands.add_parser('daemon', help='serve actions over the socket with warm acli sessions')
+    daemon_parser.add_argument('--pool-size', type=int, default=2, help='number of warm acli sessions')
+    daemon_parser.add_argument('--max-uses', type=int, default=500,
+                               help='number of actions after which a session is restarted')
+    daemon_parser.set_defaults(handler=run_daemon)
+
+    call_parser = commands.add_parser('call', help='send one action and write its reply to stdout')
+    call_parser.add_argument('action', choices=ACTION_NAMES, metavar='action', help='BambooActions method name')
+    call_parser.add_argument('arguments', nargs='*', help='key=value arguments of the action')
+    call_parser.add_argument('--direct', action='store_true', help='run acli directly instead of via the daemon')
+    call_parser.set_defaults(handler=run_call)
+
+    options = parser.parse_args(args)
+    try:
+        options.handler(options)
+    except BambooException as main_exception:
+        print(main_exception, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions, write_emulator_acli  # noqa: E402
+
+
+@pytest.fixture
+def emulator():
+    emulator = BambooEmulator(seed=7)
+    emulator.populate(plans=3, builds=5, agents=2)
+    yield emulator
+    emulator.close()
+
+
+@pytest.fixture
+def bamboo(emulator):
+    return EmulatedBambooActions(emulator)
+
+
+@pytest.fixture
+def acli_directory(tmp_path):
+    """Directory of an emulated acli executable, see write_emulator_acli"""
+    state_path = str(tmp_path / 'bamboo.db')
+    emulator = BambooEmulator(state_path, seed=7)
+    emulator.populate(plans=3, builds=5, agents=2)
+    emulator.close()
+    write_emulator_acli(str(tmp_path), state_path)
+    return str(tmp_path)
@@ -0,0 +1,24 @@
+from atlassian_bamboo_cli.BambooAgents import BambooCapabilityIndex, REQUIREMENT_UNKNOWN, requirement_type
+
+
+def test_capable_agents(emulator, bamboo):
+    emulator.add_agent('agent-mac', {'os.name': 'Mac OS X', 'xcode': '15'})
+    index = BambooCapabilityIndex(bamboo, chunk_size=2)
+    assert index.refresh() == dict()
+    assert sorted(index.capable_agents([{'requirement': 'os.name'}])) == ['agent-1', 'agent-2', 'agent-mac']
+    assert index.capable_agents([('os.name', 'equals', 'Mac OS X')]) == ['agent-mac']
+    assert sorted(index.capable_agents([{'requirement': 'os.name', 'req_type': 'matches', 'value': 'L.*'},
+                                        {'requirement': 'system.jdk.JDK'}])) == ['agent-1', 'agent-2']
+    assert index.capable_agents([{'requirement': 'docker'}]) == list()
+
+
+def test_unmatched_jobs_reports_unknown_requirement_types(bamboo):
+    index = BambooCapabilityIndex(bamboo)
+    index.refresh()
+    assert requirement_type('NOT_EQUALS') == REQUIREMENT_UNKNOWN
+    states = [dict(plan='EMU0-P0', jobs=dict(JOB1=dict(requirements=[dict(key='docker', type='exists')]),
+                                             JOB2=dict(requirements=[dict(key='os.name', type='not_equals',
+                                                                          value='Windows')])))]
+    unknown = list()
+    assert index.unmatched_jobs(states, unknown=unknown) == [('EMU0-P0', 'JOB1')]
+    assert unknown == [('EMU0-P0', 'JOB2', 'os.name', 'not_equals')]
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooActions
+
+pytestmark = pytest.mark.skipif(os.sys.platform.startswith('win'), reason='runs the sh acli script')
+
+# characters a shell would expand or strip inside double quotes
+AWKWARD_VALUE = 'say "hi" to $HOME `id` \\n and \\$PATH'
+
+
+@pytest.mark.parametrize('use_shell', [True, False])
+def test_values_reach_acli_verbatim(acli_directory, use_shell):
+    bamboo = BambooActions("EMU0", acli_directory, "emulator", use_shell=use_shell)
+    bamboo.send_command(bamboo.add_stage, plan_name="EMU0-P0", stage="AWKWARD", description=AWKWARD_VALUE)
+    reply = bamboo.send_command(bamboo.get_stage, plan_name="EMU0-P0", stage="AWKWARD")
+    assert AWKWARD_VALUE.encode('utf-8') in reply
+
+
+def test_argv_keeps_values_verbatim():
+    bamboo = BambooActions("EMU0", os.curdir, "emulator", use_shell=False)
+    command = bamboo.add_stage(plan_name="EMU0-P0", stage="AWKWARD", description=AWKWARD_VALUE)
+    argv = bamboo.render_argv(command)
+    assert argv[:2] == [bamboo.acli_executable, "emulator"]
+    assert argv[argv.index('--description') + 1] == AWKWARD_VALUE
@@ -0,0 +1,41 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from atlassian_bamboo_cli.BambooAsync import AsyncBambooActions
+from atlassian_bamboo_cli.BambooCLI import BambooException
+
+pytestmark = pytest.mark.skipif(os.sys.platform.startswith('win'), reason='runs the sh acli script')
+
+
+def test_actions_run_concurrently(acli_directory):
+    bamboo = AsyncBambooActions("EMU0", acli_directory, "emulator", concurrency=3)
+
+    async def read_plans():
+        return await asyncio.gather(*[bamboo.get_plan(plan_name=str.format("EMU0-P{0}", index))
+                                      for index in range(3)])
+    for index, reply in enumerate(asyncio.run(read_plans())):
+        assert str.format("EMU0-P{0}", index).encode('utf-8') in reply
+
+
+def test_failed_action_raises(acli_directory):
+    bamboo = AsyncBambooActions("EMU0", acli_directory, "emulator")
+    with pytest.raises(BambooException):
+        asyncio.run(bamboo.get_plan(plan_name="EMU0-MISSING"))
+
+
+def test_cancelled_action_terminates_acli_first(tmp_path):
+    # acli cleaning up on SIGTERM, which SIGKILL would not let it do
+    script = tmp_path / 'acli'
+    script.write_text('#!/bin/sh\ntrap \'echo cleaned > "$(dirname "$0")/cleaned"; exit 1\' TERM\n'
+                      'sleep 30 &\nwait\n')
+    script.chmod(0o755)
+    bamboo = AsyncBambooActions("EMU0", str(tmp_path), "emulator")
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(bamboo.get_plan_list(), 0.5))
+    assert time.monotonic() - start < 5
+    assert (tmp_path / 'cleaned').read_text().strip() == 'cleaned'
+    assert not bamboo.processes
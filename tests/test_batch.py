@@ -0,0 +1,59 @@
+import threading
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+
+
+def _queue_plan(bamboo):
+    with bamboo.batch():
+        results = [bamboo.send_command(bamboo.create_plan, plan_name="EMU-NEW"),
+                   bamboo.send_command(bamboo.add_stage, stage="FIRST"),
+                   bamboo.send_command(bamboo.add_job, stage="FIRST", job="JOB")]
+    return results
+
+
+def _errors(results):
+    errors = list()
+    for batch_result in results:
+        try:
+            batch_result.result()
+            errors.append(None)
+        except BambooException as batch_exception:
+            errors.append(str(batch_exception))
+    return errors
+
+
+def test_batch_sends_one_run_action(emulator, bamboo):
+    processes = emulator.stats()['processes']
+    results = _queue_plan(bamboo)
+    assert _errors(results) == [None, None, None]
+    assert emulator.stats()['processes'] == processes + 1
+    assert b'JOB' in bamboo.send_command(bamboo.get_job_list, plan_name="EMU-NEW")
+
+
+def test_batch_flushes_at_max_size(emulator, bamboo):
+    processes = emulator.stats()['processes']
+    with bamboo.batch(max_size=2):
+        for index in range(5):
+            bamboo.send_command(bamboo.get_plan, plan_name=str.format("EMU0-P{0}", index % 3))
+    assert emulator.stats()['processes'] == processes + 3
+
+
+def test_batch_invalidates_the_cache_once_run(bamboo):
+    bamboo.enable_cache()
+    with bamboo.batch():
+        bamboo.send_command(bamboo.add_job, plan_name="EMU0-P0", stage="Stage 1", job="NEWJOB")
+        # a read while the mutation is queued caches the reply before it
+        reader = threading.Thread(target=bamboo.send_command, args=(bamboo.get_job_list, ),
+                                  kwargs=dict(plan_name="EMU0-P0"))
+        reader.start()
+        reader.join()
+    assert b'NEWJOB' in bamboo.send_command(bamboo.get_job_list, plan_name="EMU0-P0")
+
+
+def test_quotes_in_values_survive_the_run_input(bamboo):
+    with bamboo.batch():
+        stage = bamboo.send_command(bamboo.add_stage, plan_name="EMU0-P0", stage="QUOTED",
+                                    description='say "hi" to $USER')
+    stage.result()
+    reply = bamboo.send_command(bamboo.get_stage, plan_name="EMU0-P0", stage="QUOTED")
+    assert b'say "hi" to $USER' in reply
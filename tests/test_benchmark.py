@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from atlassian_bamboo_cli.BambooBenchmark import (PER_SECOND, SECONDS, benchmark_parsing, benchmark_throughput,
+                                                  compare_results, main)
+
+
+def _results(**metrics):
+    return dict(version=1, metrics=dict((name.replace('_', '.', 1), dict(value=value, unit=unit))
+                                        for name, (value, unit) in metrics.items()))
+
+
+def _throughput_results(throughput, factor):
+    return _results(**dict((str.format('throughput_{0}', name), (value * factor, PER_SECOND))
+                           for name, value in throughput.items()))
+
+
+def test_compare_results():
+    baseline = _results(render_get_plan=(0.001, SECONDS), parse_build_list=(1000.0, PER_SECOND),
+                        throughput_serial=(10.0, PER_SECOND), kill_after_deadline=(0.0, SECONDS))
+    current = _results(render_get_plan=(0.0012, SECONDS), parse_build_list=(950.0, PER_SECOND),
+                       throughput_serial=(20.0, PER_SECOND), kill_after_deadline=(0.5, SECONDS),
+                       throughput_batched=(30.0, PER_SECOND))
+    rows = dict((row[0], row[3:]) for row in compare_results(baseline, current, threshold=0.1))
+    # new metrics and metrics without a baseline value are left out, rates are better higher
+    assert sorted(rows) == ['parse.build_list', 'render.get_plan', 'throughput.serial']
+    assert rows['render.get_plan'][0] == pytest.approx(0.2) and rows['render.get_plan'][1]
+    assert rows['parse.build_list'][0] == pytest.approx(0.05) and not rows['parse.build_list'][1]
+    assert rows['throughput.serial'][0] == pytest.approx(-1.0) and not rows['throughput.serial'][1]
+
+
+def test_parsing_benchmark():
+    results = benchmark_parsing(200)
+    assert sorted(results) == ['build_list', 'build_log'] and min(results.values()) > 0
+
+
+@pytest.mark.skipif(os.sys.platform.startswith('win'), reason='the emulated acli is a shell script')
+def test_compare_throughput_against_the_emulator(tmp_path, capsys):
+    throughput = benchmark_throughput(str(tmp_path), 4, max_workers=2, max_size=2)
+    assert sorted(throughput) == ['batched', 'serial', 'threaded'] and min(throughput.values()) > 0
+    current, slower, faster = (_throughput_results(throughput, factor) for factor in (1, 0.5, 2))
+    paths = dict()
+    for name, results in (('current', current), ('slower', slower), ('faster', faster)):
+        paths[name] = str(tmp_path / str.format('{0}.json', name))
+        with open(paths[name], 'w', encoding='utf-8') as result_file:
+            json.dump(results, result_file)
+
+    assert main(['--compare', paths['slower'], paths['current']]) == 0
+    assert '0 regressions' in capsys.readouterr().out
+    assert main(['--compare', paths['faster'], paths['current'], '--threshold', '0.4']) == 1
+    output = capsys.readouterr().out
+    assert output.count('REGRESSION') == 3 and '3 regressions over 40%' in output
+    with pytest.raises(SystemExit):
+        main(['--compare', paths['slower'], paths['current'], paths['faster']])
@@ -0,0 +1,18 @@
+def test_reads_are_cached(emulator, bamboo):
+    bamboo.enable_cache()
+    first = bamboo.send_command(bamboo.get_plan_list, project_name="@all")
+    actions = emulator.stats()['actions']
+    assert bamboo.send_command(bamboo.get_plan_list, project_name="@all") == first
+    assert emulator.stats()['actions'] == actions
+    assert bamboo.cache.stats()['hits'] == 1
+
+
+def test_mutation_invalidates_the_plan(bamboo):
+    bamboo.enable_cache()
+    before = bamboo.send_command(bamboo.get_job_list, plan_name="EMU0-P0")
+    other = bamboo.send_command(bamboo.get_job_list, plan_name="EMU0-P1")
+    bamboo.send_command(bamboo.add_job, plan_name="EMU0-P0", stage="Stage 1", job="NEWJOB")
+    after = bamboo.send_command(bamboo.get_job_list, plan_name="EMU0-P0")
+    assert b'NEWJOB' not in before and b'NEWJOB' in after
+    assert bamboo.send_command(bamboo.get_job_list, plan_name="EMU0-P1") == other
+    assert bamboo.cache.stats()['hits'] == 1
@@ -0,0 +1,43 @@
+import os
+import threading
+
+import pytest
+
+from atlassian_bamboo_cli.__main__ import main
+from atlassian_bamboo_cli.BambooCLI import BambooActions, BambooException
+from atlassian_bamboo_cli.BambooDaemon import BambooClient, BambooDaemon
+
+pytestmark = pytest.mark.skipif(os.sys.platform.startswith('win'), reason='the daemon serves a Unix socket')
+
+
+def test_daemon_serves_clients(acli_directory, tmp_path):
+    socket_path = str(tmp_path / 'bamboo.sock')
+    daemon = BambooDaemon(BambooActions("EMU0", acli_directory, "emulator", use_shell=False), socket_path=socket_path,
+                          pool_size=1, timeout=60)
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    try:
+        with BambooClient(socket_path, timeout=60) as client:
+            assert client.ping()
+            assert b'EMU0-P1' in client.send_command('get_plan', plan_name='EMU0-P1')
+            assert b'EMU0-P2' in client.get_plan(plan_name='EMU0-P2')
+            with pytest.raises(BambooException):
+                client.send_command('get_plan', plan_name='EMU0-P9')
+            stats = client.stats()
+            assert stats['requests'] >= 4 and stats['errors'] == 1 and stats['pool_size'] == 1
+    finally:
+        daemon.close()
+        thread.join()
+    assert not os.path.exists(socket_path)
+
+
+def test_call_needs_a_server(acli_directory, monkeypatch, capsys):
+    monkeypatch.delenv('BAMBOO_CLI_SERVER', raising=False)
+    assert main(['--acli-directory', acli_directory, 'call', 'get_plan', 'plan_name=EMU0-P0', '--direct']) == 1
+    assert 'BAMBOO_CLI_SERVER' in capsys.readouterr().err
+
+
+def test_direct_call(acli_directory, capsysbinary):
+    assert main(['--acli-directory', acli_directory, '--server', 'emulator', '--project', 'EMU0', 'call',
+                 'get_plan', 'plan_name=EMU0-P0', '--direct']) == 0
+    assert b'EMU0-P0' in capsysbinary.readouterr().out
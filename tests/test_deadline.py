@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooCancelledError, BambooException, BambooTimeoutError
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+
+
+@pytest.fixture
+def slow_bamboo():
+    emulator = BambooEmulator(action_latency=5.0)
+    emulator.populate(plans=1, builds=1, agents=1)
+    return EmulatedBambooActions(emulator)
+
+
+def test_deadline_stops_the_action(slow_bamboo):
+    start = time.monotonic()
+    with pytest.raises(BambooTimeoutError):
+        with slow_bamboo.deadline(0.2):
+            slow_bamboo.send_command(slow_bamboo.get_plan_list, project_name="@all")
+    assert time.monotonic() - start < 2
+
+
+def test_cancel_event_stops_the_action(slow_bamboo):
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    start = time.monotonic()
+    with pytest.raises(BambooCancelledError) as raised:
+        with slow_bamboo.deadline(cancel=cancel):
+            slow_bamboo.send_command(slow_bamboo.get_plan_list, project_name="@all")
+    assert not isinstance(raised.value, BambooTimeoutError)
+    assert time.monotonic() - start < 2
+
+
+def test_call_timeout_is_retryable(slow_bamboo):
+    slow_bamboo.call_timeout = 0.2
+    with pytest.raises(BambooTimeoutError) as raised:
+        slow_bamboo.send_command(slow_bamboo.get_plan_list, project_name="@all")
+    assert raised.value.retryable
+
+
+def test_coalesced_follower_keeps_its_deadline(slow_bamboo):
+    slow_bamboo.enable_coalescing()
+    leader = threading.Thread(target=slow_bamboo.send_command, args=(slow_bamboo.get_plan_list, ),
+                              kwargs=dict(project_name="@all"))
+    leader.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    with pytest.raises(BambooTimeoutError):
+        with slow_bamboo.deadline(0.2):
+            slow_bamboo.send_command(slow_bamboo.get_plan_list, project_name="@all")
+    assert time.monotonic() - start < 2
+    assert slow_bamboo.coalescer.stats()['coalesced'] == 1
+    leader.join()
+
+
+def test_batch_timeout_fails_the_unfinished_actions():
+    emulator = BambooEmulator(action_latencies={'addJob': 5.0})
+    bamboo = EmulatedBambooActions(emulator)
+    with bamboo.batch(timeout=0.5):
+        plan = bamboo.send_command(bamboo.create_plan, plan_name="EMU-NEW")
+        job = bamboo.send_command(bamboo.add_job, stage="Default Stage", job="JOB")
+    assert plan.result() is not None
+    # every action of the batch fails with its own error message
+    with pytest.raises(BambooException, match='timed out after 0.5 seconds'):
+        job.result()
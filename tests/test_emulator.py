@@ -0,0 +1,9 @@
+from atlassian_bamboo_cli.BambooParser import parse_list_output
+
+
+def test_emulated_lists_default_to_25_rows(emulator, bamboo):
+    emulator.populate(plans=30, prefix='MANY')
+    reply = bamboo.send_command(bamboo.get_plan_list, project_name="MANY0", output_type="csv")
+    assert len(list(parse_list_output(reply.splitlines()))) == 25
+    reply = bamboo.send_command(bamboo.get_plan_list, project_name="MANY0", output_type="csv", limit=100)
+    assert len(list(parse_list_output(reply.splitlines()))) == 30
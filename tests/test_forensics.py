@@ -0,0 +1,29 @@
+import gzip
+
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooForensics import BambooFailureHarvester
+from atlassian_bamboo_cli.BambooParser import BuildState, iter_records
+
+
+def test_harvest_failed_builds(tmp_path):
+    emulator = BambooEmulator(seed=5, failure_rate=0.5)
+    emulator.populate(plans=2, builds=8, agents=1)
+    bamboo = EmulatedBambooActions(emulator)
+    failed = [build.build for plan in ('EMU0-P0', 'EMU0-P1')
+              for build in iter_records(bamboo, bamboo.get_build_list, plan_name=plan, limit=100)
+              if build.state is BuildState.FAILED]
+    assert failed
+
+    harvester = BambooFailureHarvester(bamboo, str(tmp_path), plan_workers=2, log_workers=3, queue_size=2)
+    stats = harvester.run(['EMU0-P0', 'EMU0-P1'])
+    assert (stats['builds'], stats['reports'], stats['failed']) == (len(failed), len(failed), dict())
+    assert sorted(harvester.harvested()) == sorted(failed)
+    with gzip.open(harvester.report_path(failed[0]), 'rt', encoding='utf-8') as report:
+        text = report.read()
+    # both jobs of the plan, each with its error lines only
+    assert text.count('\nJob: JOB') == 2 and text.count('(3 lines)') == 2
+    assert 'ERROR' in text and 'Finished building' not in text and 'step' not in text
+
+    stats = harvester.run(['EMU0-P0', 'EMU0-P1'])
+    assert (stats['builds'], stats['skipped'], stats['reports']) == (0, len(failed), 0)
+    emulator.close()
@@ -0,0 +1,38 @@
+import time
+
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooHistory import BambooBuildHistory
+
+
+def test_sync_stores_builds_once(bamboo):
+    history = BambooBuildHistory(bamboo, ':memory:')
+    assert history.sync('EMU0-P0') == 5
+    assert history.build_count('EMU0-P0') == 5
+    assert all(row['started'].endswith('+00:00') and row['final'] == 1 for row in history.builds('EMU0-P0'))
+    assert history.watermark('EMU0-P0').endswith('+00:00')
+    history.sync('EMU0-P0')
+    assert history.build_count('EMU0-P0') == 5
+    assert history.duration_stats('EMU0-P0')['count'] == 5
+    history.close()
+
+
+def test_sync_completes_open_builds_older_than_the_watermark():
+    emulator = BambooEmulator(build_duration=0.5, failure_rate=0.0)
+    emulator.populate(plans=1, builds=2, agents=2)
+    bamboo = EmulatedBambooActions(emulator)
+    history = BambooBuildHistory(bamboo, ':memory:')
+    history.sync('EMU0-P0')
+    bamboo.send_command(bamboo.queue_build, plan_name='EMU0-P0')
+    time.sleep(0.05)
+    bamboo.send_command(bamboo.queue_build, plan_name='EMU0-P0')
+    history.sync('EMU0-P0')
+    older = history.builds('EMU0-P0', limit=2)[1]
+    assert older['final'] == 0 and older['completed'] is None and older['duration'] is None
+    time.sleep(0.8)
+    # the watermark moved past the older build, it is only read again as an open build
+    history.sync('EMU0-P0')
+    finished = history.builds('EMU0-P0', limit=2)[1]
+    assert finished['build'] == older['build'] and finished['state'] == 'SUCCESSFUL'
+    assert finished['final'] == 1 and finished['completed'].endswith('+00:00') and finished['duration'] is not None
+    history.close()
+    emulator.close()
@@ -0,0 +1,79 @@
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooLog import follow_build_log, iter_build_log, parse_log_line
+
+
+class ScriptedLog(EmulatedBambooActions):
+    """Emulated actions printing scripted build logs, every getBuild moves on to the next log"""
+    def __init__(self, logs):
+        super(ScriptedLog, self).__init__(BambooEmulator())
+        self.logs = list(logs)
+        self.step = 0
+        self.full_reads = 0
+
+    def execute_command(self, command, stderr=None):
+        argv = command.argv
+        if argv[1] == 'getBuild':
+            self.step = min(self.step + 1, len(self.logs) - 1)
+            return b'State . . . . : ' + (b'Successful' if self.step == len(self.logs) - 1 else b'InProgress')
+        lines = self.logs[self.step]
+        if '--limit' in argv:
+            lines = lines[-int(argv[argv.index('--limit') + 1]):]
+        else:
+            self.full_reads += 1
+        return ''.join(line + '\n' for line in lines).encode('utf-8')
+
+    def stream_command(self, function_name, **kwargs):
+        for line in self.execute_command(function_name(**kwargs)).splitlines(True):
+            yield line
+
+
+def _lines(details):
+    return [str.format('simple\t18-Oct-2026 10:00:00\t{0}', detail) for detail in details]
+
+
+def test_build_log_entries(bamboo):
+    entries = list(iter_build_log(bamboo, build="EMU0-P0-5", job="JOB1"))
+    assert len(entries) == 50
+    assert entries[0].type == 'build' and 'started building' in entries[0].detail
+    assert 'Finished building EMU0-P0-5' in entries[-1].detail
+    assert parse_log_line(b'not a log line\n') is None
+
+
+def test_follow_yields_a_running_log_once(emulator, bamboo):
+    emulator = BambooEmulator(build_duration=1.5, log_lines=60, failure_rate=0.0)
+    emulator.populate(plans=1, builds=0, agents=1)
+    bamboo = EmulatedBambooActions(emulator)
+    reply = bamboo.send_command(bamboo.queue_build, plan_name="EMU0-P0")
+    build = reply.decode('utf-8').split()[1]
+    entries = list(follow_build_log(bamboo, build=build, job="JOB1", window=8, min_interval=0.05,
+                                    max_interval=0.1, timeout=30))
+    assert entries == list(iter_build_log(bamboo, build=build, job="JOB1"))
+    assert len(entries) == 60
+
+
+def test_follow_keeps_new_lines_repeating_the_tail():
+    heartbeat = _lines(['waiting'] * 6)
+    logs = [_lines(['start']) + heartbeat, _lines(['start']) + heartbeat * 3]
+    bamboo = ScriptedLog(logs)
+    entries = list(follow_build_log(bamboo, build="EMU0-P0-1", window=4, max_window=8, min_interval=0,
+                                    max_interval=0))
+    assert [entry.detail for entry in entries] == ['start'] + ['waiting'] * 18
+
+
+def test_follow_starts_on_an_empty_log():
+    logs = [[], _lines(['one', 'two']), _lines(['one', 'two', 'three'])]
+    bamboo = ScriptedLog(logs)
+    entries = list(follow_build_log(bamboo, build="EMU0-P0-1", window=10, min_interval=0, max_interval=0))
+    assert [entry.detail for entry in entries] == ['one', 'two', 'three']
+    # only the first read streamed the whole log, the polls read tails
+    assert bamboo.full_reads == 1
+
+
+def test_follow_reads_only_tails_of_a_long_log():
+    lines = [str.format('simple\t18-Oct-2026 10:{0:02d}:{1:02d}\tstep {2}', index // 60, index % 60, index)
+             for index in range(150)]
+    logs = [lines[:100], lines[:130], lines]
+    bamboo = ScriptedLog(logs)
+    entries = list(follow_build_log(bamboo, build="EMU0-P0-1", window=40, min_interval=0, max_interval=0))
+    assert [entry.detail for entry in entries] == [str.format('step {0}', index) for index in range(150)]
+    assert bamboo.full_reads == 1
@@ -0,0 +1,36 @@
+import pytest
+
+from atlassian_bamboo_cli.BambooLogArchive import BambooLogArchive, regex_literals
+
+
+@pytest.fixture
+def archive(bamboo):
+    archive = BambooLogArchive(bamboo, ':memory:', chunk_lines=20)
+    builds = [(str.format('EMU0-P{0}-{1}', plan, number), 'JOB1') for plan in range(3) for number in range(1, 6)]
+    results = archive.archive_all(builds, max_workers=3)
+    assert set(results.values()) == {50}
+    yield archive
+    archive.close()
+
+
+def test_search_archived_logs(archive):
+    assert archive.stats()['logs'] == 15 and archive.stats()['chunks'] == 45
+    matches = list(archive.search(r'Finished building EMU0-P1-\d', plan_name='EMU0-P1'))
+    assert [match.build for match in matches] == ['EMU0-P1-1', 'EMU0-P1-2', 'EMU0-P1-3', 'EMU0-P1-4', 'EMU0-P1-5']
+    assert all(match.line_number == 49 and match.job == 'JOB1' for match in matches)
+    assert list(archive.search('Finished building', regex=False, plan_name='EMU0_P1')) == list()
+    assert archive.archive('EMU0-P1-1', 'JOB1') is None
+
+
+def test_search_many_builds(archive):
+    builds = [str.format('EMU0-P{0}-{1}', plan, number) for plan in range(3) for number in range(1, 500)]
+    matches = list(archive.search('Finished building', regex=False, builds=reversed(builds)))
+    assert [match.build for match in matches] == sorted(build for build in builds if int(build.split('-')[2]) <= 5)
+
+
+def test_regex_literals():
+    assert regex_literals(r'OutOfMemoryError: .* heap') == ['OutOfMemoryError: ', ' heap']
+    assert regex_literals(r'\x41BCD état') == ['BCD état']
+    assert regex_literals(r'a\N{LATIN SMALL LETTER E WITH ACUTE}bcd') == ['a', 'bcd']
+    assert regex_literals(r'exit\0120 code\12') == ['exit', '0 code']
+    assert regex_literals(r'one|two') == list()
@@ -0,0 +1,31 @@
+import itertools
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+
+
+def test_map_sends_every_action(bamboo):
+    plans = [str.format("EMU0-P{0}", index) for index in range(3)] * 4
+    progress = list()
+    results = list(bamboo.map("get_plan", [dict(plan_name=plan) for plan in plans], max_workers=4,
+                              progress=lambda finished, total: progress.append((finished, total))))
+    assert sorted(result.index for result in results) == list(range(len(plans)))
+    for result in results:
+        assert result.error is None
+        assert result.kwargs["plan_name"].encode('utf-8') in result.reply
+    assert progress[-1] == (len(plans), len(plans))
+
+
+def test_map_reports_failures_per_action(bamboo):
+    results = dict((result.kwargs["plan_name"], result)
+                   for result in bamboo.map(bamboo.get_plan, [dict(plan_name="EMU0-P0"),
+                                                              dict(plan_name="EMU0-MISSING")]))
+    assert results["EMU0-P0"].error is None
+    assert isinstance(results["EMU0-MISSING"].error, BambooException)
+
+
+def test_map_consumes_endless_iterables_lazily(emulator, bamboo):
+    kwargs = (dict(plan_name=str.format("EMU0-P{0}", index % 3)) for index in itertools.count())
+    results = list(itertools.islice(bamboo.map("get_plan", kwargs, max_workers=2), 5))
+    assert len(results) == 5
+    # at most twice max_workers actions are queued ahead of the consumer
+    assert emulator.stats()['actions'] <= 5 + 2 * 2
@@ -0,0 +1,43 @@
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooMigration import JOURNAL_DONE, JOURNAL_FAILED, BambooMigration
+from atlassian_bamboo_cli.BambooPlanSpec import fetch_plan_state
+
+
+def _topology(bamboo, plan):
+    state = fetch_plan_state(bamboo, plan)
+    return state['exists'], state['stages'], dict(
+        (job, (job_state['stage'], [task['description'] for task in job_state['tasks']]))
+        for job, job_state in state['jobs'].items())
+
+
+def test_migrate_project(bamboo, tmp_path):
+    target_emulator = BambooEmulator()
+    target = EmulatedBambooActions(target_emulator)
+    migration = BambooMigration(bamboo, target, str(tmp_path / 'migration.journal'), max_workers=2, max_size=4)
+    stats = migration.migrate(project_name='EMU0')
+    assert (stats['plans'], stats['migrated'], stats['failed']) == (3, 3, dict())
+    for plan in ('EMU0-P0', 'EMU0-P1', 'EMU0-P2'):
+        assert _topology(target, plan) == _topology(bamboo, plan)
+    assert set(entry['status'] for entry in migration.journal().values()) == {JOURNAL_DONE}
+
+    stats = migration.migrate(project_name='EMU0')
+    assert (stats['migrated'], stats['skipped'], stats['actions']) == (0, 3, 0)
+    target_emulator.close()
+
+
+def test_failed_plans_are_journaled_and_retried(bamboo, tmp_path):
+    target_emulator = BambooEmulator(error_rates={'addTask': 1.0})
+    target = EmulatedBambooActions(target_emulator)
+    journal_path = str(tmp_path / 'migration.journal')
+    stats = BambooMigration(bamboo, target, journal_path).migrate(plans=['EMU0-P0'])
+    assert list(stats['failed']) == ['EMU0-P0'] and 'task' in str(stats['failed']['EMU0-P0'])
+    assert BambooMigration(bamboo, target, journal_path).journal()['EMU0-P0']['status'] == JOURNAL_FAILED
+
+    target_emulator.error_rates.clear()
+    migration = BambooMigration(bamboo, target, journal_path)
+    assert migration.migrate(plans=['EMU0-P0'], retry_failed=False)['skipped'] == 1
+    # the plan was created up to the failing task, only the rest is sent again
+    stats = migration.migrate(plans=['EMU0-P0'])
+    assert stats['migrated'] == 1 and 0 < stats['actions'] < 6
+    assert _topology(target, 'EMU0-P0') == _topology(bamboo, 'EMU0-P0')
+    target_emulator.close()
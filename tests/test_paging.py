@@ -0,0 +1,64 @@
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooHistory import BambooBuildHistory
+from atlassian_bamboo_cli.BambooParser import BuildState, first_value, iter_builds, iter_partitioned, iter_records
+
+
+@pytest.fixture
+def builds_bamboo():
+    emulator = BambooEmulator(seed=3, failure_rate=0.4)
+    emulator.populate(plans=1, builds=30, agents=1)
+    yield EmulatedBambooActions(emulator)
+    emulator.close()
+
+
+def _all_builds(bamboo, **kwargs):
+    return list(iter_records(bamboo, bamboo.get_build_list, plan_name='EMU0-P0', limit=1000, **kwargs))
+
+
+def test_builds_are_paged_in_fixed_windows(builds_bamboo):
+    processes = builds_bamboo.emulator.stats()['processes']
+    builds = list(iter_builds(builds_bamboo, 'EMU0-P0', window=7, columns='number,state'))
+    # one getBuildList and four run actions of at most 7 getBuild actions
+    assert builds_bamboo.emulator.stats()['processes'] - processes == 5
+    assert [build.number for build in builds] == list(range(30, 0, -1))
+    assert [build.build for build in builds] == [build.build for build in _all_builds(builds_bamboo)]
+
+
+def test_paged_builds_are_filtered(builds_bamboo):
+    failed = list(iter_builds(builds_bamboo, 'EMU0-P0', window=4, field='state=FAILED'))
+    expected = [build.build for build in _all_builds(builds_bamboo) if build.state is BuildState.FAILED]
+    assert len(expected) > 4 and [build.build for build in failed] == expected
+
+    started = _all_builds(builds_bamboo)[11].started
+    recent = list(iter_builds(builds_bamboo, 'EMU0-P0', window=4, started_after=started))
+    assert [build.number for build in recent] == list(range(30, 18, -1))
+
+    with pytest.raises(BambooException):
+        list(iter_builds(builds_bamboo, 'EMU0-P0', window=4, labels='nightly'))
+
+
+def test_history_syncs_in_windows(builds_bamboo):
+    history = BambooBuildHistory(builds_bamboo, ':memory:', limit=8)
+    assert history.sync('EMU0-P0') == 30
+    assert history.build_count('EMU0-P0') == 30
+    history.close()
+
+
+def test_partitions_are_read_one_by_one(emulator, bamboo):
+    emulator.populate(plans=60, prefix='MANY')
+    replies = list()
+    stream_command = bamboo.stream_command
+
+    def counting_stream(function_name, **kwargs):
+        replies.append(kwargs['regex'])
+        return stream_command(function_name, **kwargs)
+
+    bamboo.stream_command = counting_stream
+    plans = [first_value(plan, 'key', 'plan')
+             for plan in iter_partitioned(bamboo, bamboo.get_plan_list, window=10, project_name='@all')]
+    assert sorted(plans) == sorted(['EMU0-P0', 'EMU0-P1', 'EMU0-P2'] +
+                                   [str.format('MANY0-P{0}', index) for index in range(60)])
+    assert '' not in replies and replies[0] == '.*'
@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+from atlassian_bamboo_cli.BambooParser import BuildRecord, BuildState, check_full_list, first_value, \
+    format_timestamp, iter_records, parse_key_value_output, parse_list_output, read_all_records, read_table
+
+LIST_REPLY = b'''2 builds in list
+"Build","Number","State","Started","Completed","Duration","Agent"
+"XXX-DEF-2","2","Failed","2026-01-01T10:00:00.000+0000","","","agent 1"
+"XXX-DEF-1","1","Successful","2026-01-01T09:00:00.000+0000","2026-01-01T09:01:00.500+0000","60",""
+'''
+
+
+def test_list_output_is_typed():
+    builds = list(parse_list_output(LIST_REPLY.splitlines(), BuildRecord))
+    assert [build.number for build in builds] == [2, 1]
+    assert builds[0].state is BuildState.FAILED and builds[1].state is BuildState.SUCCESSFUL
+    assert builds[0].completed is None and builds[0].agent == "agent 1"
+    assert builds[1].completed == datetime.datetime(2026, 1, 1, 9, 1, 0, 500000, tzinfo=datetime.timezone.utc)
+    assert builds[1].duration == 60
+
+
+def test_build_states_are_parsed_from_any_spelling():
+    assert BuildState.parse("In Progress") is BuildState.IN_PROGRESS
+    assert BuildState.parse("NOT_BUILT") is BuildState.NOT_BUILT
+    assert BuildState.FAILED.final and not BuildState.QUEUED.final
+    with pytest.raises(ValueError):
+        BuildState.parse("Exploded")
+
+
+def test_key_value_output():
+    values = parse_key_value_output(b'Build key . . . . : XXX-DEF-2\nState . . . . . . : Failed\n'
+                                    b'Started . . . . . : 2026-01-01T10:00:00\n')
+    assert values == {'build_key': 'XXX-DEF-2', 'state': 'Failed', 'started': '2026-01-01T10:00:00'}
+
+
+def test_format_timestamp_round_trips():
+    timestamp = datetime.datetime(2026, 3, 4, 5, 6, 7, 891000, tzinfo=datetime.timezone.utc)
+    assert format_timestamp(timestamp) == '2026-03-04T05:06:07.891+0000'
+
+
+def test_records_are_streamed_from_the_emulator(bamboo):
+    builds = list(iter_records(bamboo, bamboo.get_build_list, plan_name="EMU0-P0", limit=10))
+    assert [build.number for build in builds] == [5, 4, 3, 2, 1]
+    assert all(isinstance(build.started, datetime.datetime) for build in builds)
+    plans = [first_value(plan, 'key', 'plan') for plan in iter_records(bamboo, bamboo.get_plan_list,
+                                                                        project_name="@all", limit=10)]
+    assert sorted(plans) == ["EMU0-P0", "EMU0-P1", "EMU0-P2"]
+
+
+def test_table_reads_columns(bamboo):
+    table = read_table(bamboo, bamboo.get_build_list, plan_name="EMU0-P0", limit=10)
+    assert len(table) == 5
+    assert table.column("number") == [5, 4, 3, 2, 1]
+
+
+def test_full_lists_are_checked(emulator, bamboo):
+    emulator.populate(plans=30, prefix='MANY')
+    assert len(read_all_records(bamboo, bamboo.get_plan_list, project_name="MANY0")) == 30
+    with pytest.raises(BambooException):
+        read_all_records(bamboo, bamboo.get_plan_list, limit=20, project_name="MANY0")
+    with pytest.raises(BambooException):
+        check_full_list([1, 2, 3], 'get_plan_list', limit=2)
@@ -0,0 +1,41 @@
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooPlanSpec import fetch_plan_state, reconcile_plan
+
+SCRIPT_TASK = 'com.atlassian.bamboo.plugins.scripttask:task.builder.script'
+
+
+def _spec(requirements, stages=('Stage 1', )):
+    spec = dict(plan='EMU0-P0', stages=[dict(stage=stage, jobs=list()) for stage in stages])
+    spec['stages'][0]['jobs'] = [
+        dict(job='JOB1', name='Job JOB1', requirements=requirements,
+             tasks=[dict(task_key=SCRIPT_TASK, description='script 1'), dict(task_key=SCRIPT_TASK,
+                                                                              description='script 2')]),
+        dict(job='JOB2', name='Job JOB2', tasks=[dict(task_key=SCRIPT_TASK, description='script 1'),
+                                                 dict(task_key=SCRIPT_TASK, description='script 2')])]
+    return spec
+
+
+def test_reconcile_adds_missing_and_changed_requirements(bamboo):
+    spec = _spec([dict(requirement='os', req_type='equals', value='linux')])
+    changes = reconcile_plan(bamboo, spec)
+    assert [change.action for change, _ in changes] == ['add_requirement']
+    assert all(result.result() for _, result in changes)
+    assert reconcile_plan(bamboo, spec, dry_run=True) == list()
+
+    spec = _spec([dict(requirement='os', req_type='matches', value='linux')])
+    changes = reconcile_plan(bamboo, spec)
+    assert [change.action for change, _ in changes] == ['remove_requirement', 'add_requirement']
+    requirements = fetch_plan_state(bamboo, 'EMU0-P0')['jobs']['JOB1']['requirements']
+    assert [(requirement['key'], requirement['type']) for requirement in requirements] == [('os', 'matches')]
+
+
+def test_reconcile_stops_after_a_failed_chunk():
+    emulator = BambooEmulator(error_rates={'addRequirement': 1.0})
+    emulator.populate(plans=1, builds=1, agents=1)
+    bamboo = EmulatedBambooActions(emulator)
+    spec = _spec([dict(requirement='os', value='linux')], stages=('Stage 1', 'Stage 2'))
+    changes = reconcile_plan(bamboo, spec, max_size=1)
+    assert [change.action for change, _ in changes] == ['add_requirement', 'add_stage']
+    assert changes[0][1].error is not None and changes[1][1] is None
+    assert fetch_plan_state(bamboo, 'EMU0-P0')['stages'] == ['Stage 1']
+    emulator.close()
@@ -0,0 +1,85 @@
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooPolicy import BambooCircuitOpenError, BambooPolicy, BambooRetryableError
+
+
+def _bamboo(**config):
+    emulator = BambooEmulator(seed=3, **config)
+    emulator.populate(plans=2, builds=1, agents=1)
+    return emulator, EmulatedBambooActions(emulator)
+
+
+def test_transient_reads_are_retried():
+    emulator, bamboo = _bamboo(error_rates={'getPlanList': 0.5})
+    bamboo.policy = BambooPolicy(max_attempts=20, base_delay=0.001, retry_burst=100)
+    for _ in range(5):
+        assert b'EMU0-P0' in bamboo.send_command(bamboo.get_plan_list, project_name="@all")
+    stats = bamboo.policy.stats()
+    assert stats['retries'] == stats['failures'] == emulator.stats()['injected'] > 0
+
+
+def test_transient_mutations_are_not_retried():
+    emulator, bamboo = _bamboo(error_rates={'addStage': 1.0})
+    bamboo.policy = BambooPolicy(base_delay=0.001)
+    with pytest.raises(BambooRetryableError):
+        bamboo.send_command(bamboo.add_stage, plan_name="EMU0-P0", stage="NEW")
+    assert bamboo.policy.stats()['attempts'] == 1
+
+
+def test_unreachable_mutations_are_retried():
+    emulator, bamboo = _bamboo(error_rates={'addStage': 1.0}, error_message='Remote error: Connection refused')
+    bamboo.policy = BambooPolicy(max_attempts=3, base_delay=0.001, failure_threshold=None)
+    with pytest.raises(BambooRetryableError) as raised:
+        bamboo.send_command(bamboo.add_stage, plan_name="EMU0-P0", stage="NEW")
+    assert raised.value.attempts == 3
+
+
+def test_fatal_errors_are_raised_unchanged(bamboo):
+    bamboo.policy = BambooPolicy(base_delay=0.001)
+    with pytest.raises(BambooException) as raised:
+        bamboo.send_command(bamboo.get_plan, plan_name="EMU0-MISSING")
+    assert not isinstance(raised.value, BambooRetryableError)
+    assert bamboo.policy.stats()['fatal'] == 1
+
+
+def test_circuit_opens_after_failures():
+    emulator, bamboo = _bamboo(error_rate=1.0)
+    bamboo.policy = BambooPolicy(max_attempts=1, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(BambooRetryableError):
+            bamboo.send_command(bamboo.get_plan_list, project_name="@all")
+    actions = emulator.stats()['actions']
+    with pytest.raises(BambooCircuitOpenError):
+        bamboo.send_command(bamboo.get_plan_list, project_name="@all")
+    assert emulator.stats()['actions'] == actions
+    assert bamboo.policy.stats()['circuit'] == 'open'
+
+
+def _queue_plan(bamboo):
+    with bamboo.batch():
+        results = [bamboo.send_command(bamboo.create_plan, plan_name="EMU-NEW"),
+                   bamboo.send_command(bamboo.add_stage, stage="FIRST"),
+                   bamboo.send_command(bamboo.add_job, stage="FIRST", job="JOB")]
+    errors = list()
+    for batch_result in results:
+        try:
+            batch_result.result()
+            errors.append(None)
+        except BambooException as batch_exception:
+            errors.append(str(batch_exception))
+    return errors
+
+
+@pytest.mark.parametrize('error_message', ['Remote error: 503 Service Unavailable',
+                                           'Remote error: Connection refused'])
+def test_failed_run_keeps_replies_under_policy(error_message):
+    emulator = BambooEmulator(error_rates={'addJob': 1.0}, error_message=error_message)
+    bamboo = EmulatedBambooActions(emulator)
+    bamboo.policy = BambooPolicy(base_delay=0.01)
+    errors = _queue_plan(bamboo)
+    assert errors[:2] == [None, None]
+    assert error_message in errors[2]
+    # the plan and its stage were created, running the batch again would create them twice
+    assert bamboo.policy.stats()['attempts'] == 1
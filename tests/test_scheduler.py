@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooParser import BuildState
+from atlassian_bamboo_cli.BambooScheduler import BambooDispatcher, _Dispatch
+from atlassian_bamboo_cli.BambooWatcher import BuildWatcher
+
+
+def _emulated(build_duration, **kwargs):
+    emulator = BambooEmulator(build_duration=build_duration, failure_rate=0.0, **kwargs)
+    emulator.populate(plans=2, builds=2, agents=2)
+    return EmulatedBambooActions(emulator)
+
+
+def _close(dispatcher, wait=True):
+    thread = threading.Thread(target=dispatcher.close, kwargs=dict(wait=wait))
+    thread.start()
+    thread.join(10)
+    return not thread.is_alive()
+
+
+def test_dispatch_builds():
+    bamboo = _emulated(0.2)
+    watcher = BuildWatcher(bamboo, min_interval=0.05, max_interval=0.2)
+    with BambooDispatcher(bamboo, watcher=watcher, plan_limit=1, refresh_interval=0.2) as dispatcher:
+        futures = [dispatcher.submit(plan) for plan in ('EMU0-P0', 'EMU0-P0', 'EMU0-P1')]
+        results = [future.result(timeout=10) for future in futures]
+    assert sorted(result.build for result in results) == ['EMU0-P0-3', 'EMU0-P0-4', 'EMU0-P1-3']
+    assert set(result.state for result in results) == {BuildState.SUCCESSFUL}
+    assert dispatcher.stats()['finished'] == 3 and not dispatcher.unstarted
+    watcher.close()
+    bamboo.emulator.close()
+
+
+def test_queued_builds_keep_their_agents():
+    bamboo = _emulated(30.0)
+    # two builds take both agents, the third one waits for an agent
+    for _ in range(3):
+        bamboo.send_command(bamboo.queue_build, plan_name='EMU0-P0')
+    dispatcher = BambooDispatcher(bamboo, refresh_interval=60)
+    for build in ('EMU0-P0-3', 'EMU0-P0-5'):
+        dispatch = _Dispatch('EMU0-P0', 0, 1, dict())
+        dispatch.build = build
+        dispatcher.unstarted[build] = dispatch
+    dispatcher._refresh()
+    assert list(dispatcher.unstarted) == ['EMU0-P0-5']
+    assert (dispatcher.capacity, dispatcher.budget) == (2, -1)
+    assert _close(dispatcher)
+    bamboo.emulator.close()
+
+
+def test_failed_first_count_fails_the_pending_builds():
+    bamboo = _emulated(0.2, error_rates={'getAgentList': 1.0})
+    watcher = BuildWatcher(bamboo, min_interval=0.05, max_interval=0.2)
+    dispatcher = BambooDispatcher(bamboo, watcher=watcher, refresh_interval=0.2)
+    future = dispatcher.submit('EMU0-P0')
+    with pytest.raises(BambooException):
+        future.result(timeout=10)
+
+    bamboo.emulator.error_rates.clear()
+    assert dispatcher.submit('EMU0-P1').result(timeout=10).state is BuildState.SUCCESSFUL
+    assert _close(dispatcher)
+    watcher.close()
+    bamboo.emulator.close()
@@ -0,0 +1,34 @@
+import concurrent.futures
+import os
+
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooActions
+from atlassian_bamboo_cli.BambooSession import BambooSessionPool
+
+pytestmark = pytest.mark.skipif(os.sys.platform.startswith('win'), reason='sessions run the sh acli script')
+
+
+@pytest.fixture
+def acli_bamboo(acli_directory):
+    return BambooActions("EMU0", acli_directory, "emulator", use_shell=False)
+
+
+def test_sessions_answer_concurrent_actions(acli_bamboo):
+    with BambooSessionPool(acli_bamboo, size=2, timeout=60) as pool:
+        acli_bamboo.session_pool = pool
+        plans = [str.format("EMU0-P{0}", index % 3) for index in range(12)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            replies = list(executor.map(lambda plan: acli_bamboo.send_command(acli_bamboo.get_plan, plan_name=plan),
+                                        plans))
+        for plan, reply in zip(plans, replies):
+            assert plan.encode('utf-8') in reply
+        assert pool.recycled == 0
+
+
+def test_sessions_are_recycled_after_max_uses(acli_bamboo):
+    with BambooSessionPool(acli_bamboo, size=1, timeout=60, max_uses=2) as pool:
+        acli_bamboo.session_pool = pool
+        for _ in range(5):
+            assert b'EMU0-P0' in acli_bamboo.send_command(acli_bamboo.get_plan, plan_name="EMU0-P0")
+        assert pool.recycled == 2
@@ -0,0 +1,28 @@
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+from atlassian_bamboo_cli.BambooSnapshot import BambooSnapshot, write_snapshot
+
+
+def test_snapshot_round_trip_and_refresh(bamboo, tmp_path):
+    path = str(tmp_path / 'topology.jsonl')
+    stats = write_snapshot(bamboo, path, max_workers=2)
+    assert (stats['plans'], stats['changed'], stats['unchanged'], stats['failed']) == (3, 3, 0, dict())
+    with BambooSnapshot(path) as snapshot:
+        assert snapshot.plans() == ['EMU0-P0', 'EMU0-P1', 'EMU0-P2']
+        plan = snapshot.load('EMU0-P1')
+        assert plan['stages'] == ['Stage 1'] and sorted(plan['jobs']) == ['JOB1', 'JOB2']
+        assert [task['description'] for task in plan['jobs']['JOB1']['tasks']] == ['script 1', 'script 2']
+
+    bamboo.send_command(bamboo.add_stage, plan_name='EMU0-P2', stage='Stage 2')
+    stats = write_snapshot(bamboo, path, max_workers=2)
+    assert (stats['plans'], stats['changed'], stats['unchanged']) == (3, 1, 2)
+    with BambooSnapshot(path) as snapshot:
+        assert snapshot.load('EMU0-P2')['stages'] == ['Stage 1', 'Stage 2']
+
+
+def test_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.jsonl'
+    path.write_text('{"format": "something else"}\n')
+    with pytest.raises(BambooException):
+        BambooSnapshot(str(path))
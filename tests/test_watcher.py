@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from atlassian_bamboo_cli.BambooCLI import BambooException
+from atlassian_bamboo_cli.BambooEmulator import BambooEmulator, EmulatedBambooActions
+from atlassian_bamboo_cli.BambooParser import BuildState
+from atlassian_bamboo_cli.BambooWatcher import BuildWatcher, split_build_key
+
+
+def _emulated(build_duration):
+    emulator = BambooEmulator(build_duration=build_duration, failure_rate=0.0)
+    emulator.populate(plans=1, builds=2, agents=2)
+    return EmulatedBambooActions(emulator)
+
+
+def test_watch_finished_and_queued_builds():
+    bamboo = _emulated(0.3)
+    bamboo.send_command(bamboo.queue_build, plan_name='EMU0-P0')
+    with BuildWatcher(bamboo, min_interval=0.05, max_interval=0.2) as watcher:
+        results = watcher.wait(['EMU0-P0-2', 'EMU0-P0-3'], timeout=5)
+    assert results['EMU0-P0-2'].final
+    assert results['EMU0-P0-3'] is BuildState.SUCCESSFUL
+    assert split_build_key('EMU0-P0-3') == ('EMU0-P0', 3)
+    bamboo.emulator.close()
+
+
+def test_watch_times_out_at_the_deadline():
+    bamboo = _emulated(30.0)
+    bamboo.send_command(bamboo.queue_build, plan_name='EMU0-P0')
+    with BuildWatcher(bamboo, min_interval=5.0, max_interval=60.0) as watcher:
+        started = time.time()
+        future = watcher.watch('EMU0-P0-3', timeout=0.3)
+        with pytest.raises(BambooException, match='did not finish in time'):
+            future.result(timeout=5)
+        assert time.time() - started < 2.0
+    bamboo.emulator.close()